@@ -1,74 +1,1113 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """推广模块放量打点数据看板生成器 - 读取CSV埋点数据，生成交互式HTML看板"""
-import csv, json, os
-from collections import defaultdict
+import argparse, codecs, cProfile, csv, glob, hashlib, heapq, html, importlib, json, mmap, os, re, sqlite3, sys, tempfile, time, \
+    tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain, groupby, islice
+from json.encoder import encode_basestring
+from statistics import median
+from math import log, log1p, sqrt
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CSV_PATH = os.path.join(BASE_DIR, '夸克弹窗推广数据0224.csv')
 OUTPUT_PATH = os.path.join(BASE_DIR, 'promotion_dashboard.html')
+CHUNK_SIZE = 1 << 20  # 流式读取块大小（字节）
+CACHE_SUFFIX = '.colcache'  # 列式缓存旁路文件后缀
+CACHE_MAGIC = b'PCOL0002'
+CACHE_COLUMNS = (('id', 'q'), ('date', 'I'), ('type', 'I'), ('action', 'I'), ('pv', 'q'), ('uv', 'q'))
+SPILL_ROWS = 1 << 16  # 冷启动建缓存时每批落盘行数
+STATE_SUFFIX = '.state.json'  # 增量模式状态文件后缀
+TAIL_BYTES = 4096  # 水位前用于校验文件未被改写的字节数
+STATE_VERSION = 4
+ALL_TYPES = '全部'  # 多 Type 时的汇总视图标签
+RENDER_SUFFIX = '.render.json'  # 看板输出旁路的渲染指纹记录
 
-def parse_csv(path):
-    daily = defaultdict(lambda: defaultdict(lambda: {'pv': 0, 'uv': 0}))
-    with open(path, 'r', encoding='gb18030', errors='replace') as f:
-        reader = csv.reader(f)
-        next(reader)
-        for row in reader:
-            if len(row) < 7 or not row[3].strip():
-                continue
-            date, action = row[1].strip(), row[3].strip()
-            if not date or not date.startswith('202'):
-                continue
-            pv = int(row[5]) if row[5].strip() else 0
-            uv = int(row[6]) if row[6].strip() else 0
-            daily[date][action]['pv'] += pv
-            daily[date][action]['uv'] += uv
-    return daily
-
-def get_uv(daily, d, a):
-    return daily[d].get(a, {}).get('uv', 0)
-
-def classify_phase(start_uv):
-    if start_uv < 500: return '灰测期'
-    if start_uv < 5000: return '灰度扩量'
-    if start_uv < 30000: return '稳定期'
-    return '正式放量'
+def _iter_chunks(path, chunk_size=CHUNK_SIZE, stats=None, start=0, end=None):
+    """按固定字节块读取 [start, end)"""
+    with open(path, 'rb') as f:
+        pos = f.seek(start)
+        while end is None or pos < end:
+            t0 = time.perf_counter()
+            chunk = f.read(chunk_size if end is None else min(chunk_size, end - pos))
+            if not chunk:
+                break
+            pos += len(chunk)
+            if stats is not None:
+                stats['bytes'] = stats.get('bytes', 0) + len(chunk)
+                stats['io_seconds'] = stats.get('io_seconds', 0) + time.perf_counter() - t0
+            yield chunk
+
+def iter_lines(path, chunk_size=CHUNK_SIZE, stats=None, start=0, end=None):
+    """按固定字节块读取 [start, end) 并增量解码 gb18030，逐行产出；内存占用只与块大小有关"""
+    decoder = codecs.getincrementaldecoder('gb18030')(errors='replace')
+    tail = ''
+    for chunk in _iter_chunks(path, chunk_size, stats, start, end):
+        lines = (tail + decoder.decode(chunk)).split('\n')
+        tail = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    tail += decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+def iter_rows(path, chunk_size=CHUNK_SIZE, stats=None, start=0, end=None):
+    """通用 csv 模块行迭代器（从文件头开始时跳过表头）"""
+    reader = csv.reader(iter_lines(path, chunk_size, stats, start, end))
+    if start == 0:
+        next(reader, None)
+    return reader
+
+def _to_int(s):
+    s = s.strip()
+    try:
+        return int(s) if s else 0
+    except ValueError:
+        return 0
+
+def _is_report_date(d):
+    return d.startswith('202')
+
+def _intern(table, s):
+    return table.setdefault(s, len(table))
+
+def _records_from_rows(rows):
+    """csv 行 → (id, date, type, action, pv, uv)；无 id 记为 -1"""
+    for row in rows:
+        if len(row) >= 7:
+            yield (_to_int(row[0]) or -1, row[1].strip(), row[2].strip(), row[3].strip(),
+                   _to_int(row[5]), _to_int(row[6]))
+
+BATCH_FIELDS = ('id', 'date', 'type', 'action', 'pv', 'uv')
+EXPORT_LINE = re.compile(rb'"\d*","[^",]*","[^",]*","[^",]*","[^",]*","\d*","\d*"\r?')
+
+def _ints(col, empty):
+    return [int(x) if x else empty for x in col] if b'' in col else list(map(int, col))
+
+def _texts(col, names):
+    """字节列 → 字符串列；每个不同取值只解码一次（intern）"""
+    for b in dict.fromkeys(col):
+        if b not in names:
+            names[b] = b.decode('gb18030', 'replace').strip()
+    return list(map(names.__getitem__, col))
+
+def _split_block(lines, names):
+    """整块快速路径：拼接后去引号一次 split，按步长切出各列；结构不符时返回 None"""
+    n = len(lines)
+    data = b','.join(lines)
+    if b'\r' in data:
+        data = data.replace(b'\r', b'')
+    if data.count(b'"') != 14 * n or data.count(b'","') != 7 * n - 1:
+        return None
+    f = data.replace(b'"', b'').split(b',')
+    if len(f) != 7 * n:
+        return None
+    try:
+        return {'id': _ints(f[0::7], -1), 'date': _texts(f[1::7], names), 'type': _texts(f[2::7], names),
+                'action': _texts(f[3::7], names), 'pv': _ints(f[5::7], 0), 'uv': _ints(f[6::7], 0)}
+    except ValueError:
+        return None
+
+def _split_lines(lines):
+    """逐行慢速路径：交给 csv 模块解析"""
+    records = list(_records_from_rows(csv.reader([line.decode('gb18030', 'replace') for line in lines if line])))
+    return dict(zip(BATCH_FIELDS, map(list, zip(*records)))) if records else dict.fromkeys(BATCH_FIELDS, [])
+
+def _concat(parts):
+    return {k: list(chain.from_iterable(p[k] for p in parts)) for k in BATCH_FIELDS}
+
+def _parse_block(lines, names):
+    """整块快速路径失败时，用行级正则挑出不符合导出格式的行交给 csv 模块，其余连续段仍走快速路径"""
+    batch = _split_block(lines, names)
+    if batch is not None:
+        return batch
+    parts, pos = [], 0
+    for good, run in groupby(map(bool, map(EXPORT_LINE.fullmatch, lines))):
+        seg = lines[pos:pos + sum(1 for _ in run)]
+        pos += len(seg)
+        parts.append(good and _split_block(seg, names) or _split_lines(seg))
+    return _concat(parts)
+
+def iter_batches(path, chunk_size=CHUNK_SIZE, stats=None, start=0, end=None):
+    """按导出格式直接在字节上成块解析，每块产出一批列 {id, date, type, action, pv, uv}"""
+    names, tail, header = {}, b'', start == 0
+    for chunk in _iter_chunks(path, chunk_size, stats, start, end):
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        if header and lines:
+            del lines[0]
+            header = False
+        if lines:
+            yield _parse_block(lines, names)
+    if tail and not header:
+        yield _parse_block([tail], names)
+
+def iter_records(path, chunk_size=CHUNK_SIZE, stats=None, start=0, end=None):
+    """逐行产出 (id, date, type, action, pv, uv)，底层为 iter_batches 快速路径"""
+    for batch in iter_batches(path, chunk_size, stats, start, end):
+        yield from zip(*(batch[k] for k in BATCH_FIELDS))
+
+def _align8(n):
+    return (n + 7) & ~7
+
+def _file_digest(path, chunk_size=CHUNK_SIZE):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _open_cache(cache_path):
+    """mmap 打开列式缓存，返回 (meta, columns)，各列为零拷贝 memoryview"""
+    with open(cache_path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:8] != CACHE_MAGIC:
+        raise ValueError(f'not a column cache: {cache_path}')
+    hlen = int.from_bytes(mm[8:16], 'little')
+    meta = json.loads(mm[16:16 + hlen].decode('utf-8'))
+    view, off, n = memoryview(mm), _align8(16 + hlen), meta['rows']
+    cols = {'rows': n, 'strings': meta['strings']}
+    for name, fmt in CACHE_COLUMNS:
+        size = n * array(fmt).itemsize
+        cols[name] = view[off:off + size].cast(fmt)
+        off += _align8(size)
+    return meta, cols
+
+def _build_cache(path, cache_path, st, stats=None):
+    """流式解析 CSV，分批落盘各列后拼装为缓存文件；内存占用与文件大小无关"""
+    strings = {'date': {}, 'type': {}, 'action': {}}
+    bufs = {name: array(fmt) for name, fmt in CACHE_COLUMNS}
+    spills = {name: tempfile.TemporaryFile() for name, _ in CACHE_COLUMNS}
+
+    def flush():
+        for name, buf in bufs.items():
+            buf.tofile(spills[name])
+            del buf[:]
+
+    n = 0
+    for batch in iter_batches(path, stats=stats):
+        if '' in batch['action']:  # 合计行等无 Action 的行
+            keep = [i for i, a in enumerate(batch['action']) if a]
+            batch = {k: [col[i] for i in keep] for k, col in batch.items()}
+        for name in ('date', 'type', 'action'):
+            codes = strings[name]
+            for v in dict.fromkeys(batch[name]):
+                _intern(codes, v)
+            bufs[name].extend(map(codes.__getitem__, batch[name]))
+        for name in ('id', 'pv', 'uv'):
+            bufs[name].extend(batch[name])
+        n += len(batch['id'])
+        if len(bufs['id']) >= SPILL_ROWS:
+            flush()
+    flush()
+
+    meta = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': _file_digest(path),
+            'rows': n, 'strings': {k: list(v) for k, v in strings.items()}}
+    header = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        out = open(tmp_path, 'wb')
+    except OSError:  # 数据目录只读：写到系统临时目录，mmap 后即删除
+        out = tempfile.NamedTemporaryFile(suffix=CACHE_SUFFIX, delete=False)
+        tmp_path, cache_path = out.name, None
+    with out:
+        out.write(CACHE_MAGIC + len(header).to_bytes(8, 'little') + header)
+        out.write(b'\0' * (_align8(16 + len(header)) - 16 - len(header)))
+        for name, _ in CACHE_COLUMNS:
+            spill = spills.pop(name)
+            spill.seek(0)
+            size = 0
+            for chunk in iter(lambda: spill.read(CHUNK_SIZE), b''):
+                out.write(chunk)
+                size += len(chunk)
+            spill.close()
+            out.write(b'\0' * (_align8(size) - size))
+    if cache_path is None:
+        cols = _open_cache(tmp_path)[1]
+        os.unlink(tmp_path)
+        return cols
+    os.replace(tmp_path, cache_path)
+    return _open_cache(cache_path)[1]
+
+def load_columns(path, stats=None):
+    """读取 (date, type, action, pv, uv) 列；文件大小/mtime/内容哈希未变时直接 mmap 旁路缓存"""
+    st = os.stat(path)
+    cache_path = path + CACHE_SUFFIX
+    try:
+        meta, cols = _open_cache(cache_path)
+        if meta['size'] == st.st_size and (meta['mtime_ns'] == st.st_mtime_ns
+                                            or meta['hash'] == _file_digest(path)):
+            if stats is not None:
+                stats['cache'] = 'hit'
+            return cols
+    except (OSError, ValueError, KeyError):
+        pass
+    if stats is not None:
+        stats['cache'] = 'miss'
+    return _build_cache(path, cache_path, st, stats)
+
+def _fold_records(records):
+    """一次遍历按 Type 分桶折叠：{type: {(date, action): [pv, uv]}}"""
+    by_type = {}
+    n = 0
+    for _, date, typ, action, pv, uv in records:
+        n += 1
+        if not action or not _is_report_date(date):
+            continue
+        daily = by_type.get(typ)
+        if daily is None:
+            daily = by_type[typ] = {}
+        cell = daily.get((date, action))
+        if cell is None:
+            daily[(date, action)] = [pv, uv]
+        else:
+            cell[0] += pv
+            cell[1] += uv
+    return by_type, n
+
+def parse_csv(path, stats=None, use_cache=True):
+    """解析导出文件为 {type: {(date, action): [pv, uv]}}（默认经列式缓存）"""
+    t0 = time.perf_counter()
+    if use_cache:
+        cols = load_columns(path, stats)
+        dates, types, actions = (cols['strings'][k] for k in ('date', 'type', 'action'))
+        keep = [_is_report_date(d) for d in dates]
+        n_act = len(actions)
+        accs = [{} for _ in types]
+        for tc, dc, ac, pv, uv in zip(cols['type'], cols['date'], cols['action'], cols['pv'], cols['uv']):
+            if keep[dc]:
+                acc = accs[tc]
+                cell = acc.get(dc * n_act + ac)
+                if cell is None:
+                    acc[dc * n_act + ac] = [pv, uv]
+                else:
+                    cell[0] += pv
+                    cell[1] += uv
+        by_type = {types[tc]: {(dates[k // n_act], actions[k % n_act]): cell for k, cell in acc.items()}
+                   for tc, acc in enumerate(accs) if acc}
+        n = cols['rows']
+    else:
+        by_type, n = _fold_records(iter_records(path, stats=stats))
+    if stats is not None:
+        stats['rows'] = n
+        stats['seconds'] = time.perf_counter() - t0
+    return by_type
+
+def _add_cells(acc, daily):
+    """把 {(date, action): [pv, uv]} 累加进 acc（不复用 daily 的单元格）"""
+    for key, (pv, uv) in daily.items():
+        cell = acc.get(key)
+        if cell is None:
+            acc[key] = [pv, uv]
+        else:
+            cell[0] += pv
+            cell[1] += uv
+    return acc
+
+def merge_types(by_type):
+    """把各 Type 的累加器合并为一个 {(date, action): [pv, uv]}"""
+    merged = {}
+    for daily in by_type.values():
+        _add_cells(merged, daily)
+    return merged
+
+def expand_inputs(specs):
+    """把文件 / 目录 / glob 展开为去重、排序后的 CSV 路径列表"""
+    paths = []
+    for spec in specs:
+        if os.path.isdir(spec):
+            paths += glob.glob(os.path.join(spec, '*.csv'))
+        elif any(c in spec for c in '*?['):
+            paths += glob.glob(spec)
+        else:
+            paths.append(spec)
+    seen, out = set(), []
+    for p in sorted(paths):
+        real = os.path.realpath(p)
+        if real not in seen:
+            seen.add(real)
+            out.append(p)
+    return out
+
+def _parse_shard(path):
+    """子进程：解析单个分片，返回 ({(type, date, action): {id: [pv, uv]}}, 行数, 字节数)"""
+    cols = load_columns(path)
+    dates, types, actions = (cols['strings'][k] for k in ('date', 'type', 'action'))
+    part = {}
+    for rid, tc, dc, ac, pv, uv in zip(cols['id'], cols['type'], cols['date'], cols['action'],
+                                       cols['pv'], cols['uv']):
+        ids = part.setdefault((types[tc], dates[dc], actions[ac]), {})
+        key = rid if rid >= 0 else path  # 无 id 的行在分片内合并，跨分片不去重
+        cell = ids.get(key)
+        if cell is None:
+            ids[key] = [pv, uv]
+        elif rid < 0:
+            cell[0] += pv
+            cell[1] += uv
+    return part, cols['rows'], os.path.getsize(path)
+
+def merge_partials(acc, part):
+    """按 id 合并分片结果（重叠分片中的同一 id 只计一次），不修改 part"""
+    for key, ids in part.items():
+        cell = acc.get(key)
+        if cell is None:
+            acc[key] = dict(ids)
+        else:
+            cell.update(ids)
+    return acc
+
+def iter_shard_parts(paths, jobs=None):
+    """多进程并行解析各分片，按完成顺序产出 (path, partial, 行数, 字节数)"""
+    if jobs == 1 or len(paths) == 1:
+        for path in paths:
+            yield (path,) + _parse_shard(path)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(_parse_shard, p): p for p in paths}
+        for fut in as_completed(futures):
+            yield (futures[fut],) + fut.result()
+
+def fold_partials(acc, keep_date=_is_report_date):
+    """合并后的 {(type, date, action): {id: [pv, uv]}} → {type: {(date, action): [pv, uv]}}"""
+    by_type = {}
+    for (t, d, a), ids in acc.items():
+        if keep_date(d):
+            by_type.setdefault(t, {})[(d, a)] = [sum(c[0] for c in ids.values()),
+                                                  sum(c[1] for c in ids.values())]
+    return by_type
+
+def parse_shards(paths, jobs=None, stats=None, keep_date=_is_report_date):
+    """多进程并行解析多个分片，父进程合并为 {type: {(date, action): [pv, uv]}}"""
+    t0 = time.perf_counter()
+    acc, n, size = {}, 0, 0
+    for _, part, rows, nbytes in iter_shard_parts(paths, jobs):
+        merge_partials(acc, part)
+        n += rows
+        size += nbytes
+    by_type = fold_partials(acc, keep_date)
+    if stats is not None:
+        stats.update(rows=n, bytes=size, seconds=time.perf_counter() - t0, shards=len(paths))
+    return by_type
+
+def split_ranges(path, parts):
+    """把导出文件（跳过表头）按行边界切成至多 parts 段字节区间 [(start, end)]"""
+    size = os.path.getsize(path)
+    if not size:
+        return []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        bounds = [mm.find(b'\n') + 1 or size]
+        step = (size - bounds[0]) / max(parts, 1)
+        for k in range(1, parts):  # gb18030 的多字节字符不含 0x0A，向后找最近的换行即为行边界
+            cut = mm.find(b'\n', max(bounds[0] + int(k * step), bounds[-1]) - 1) + 1 or size
+            if bounds[-1] < cut < size:
+                bounds.append(cut)
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def _iter_range_batches(mm, start, end, names):
+    """在 mmap 上按 CHUNK_SIZE（向后对齐到行尾）切块解析 [start, end)；每次只拷贝当前块"""
+    pos = start
+    while pos < end:
+        stop = min(pos + CHUNK_SIZE, end)
+        if stop < end:
+            stop = mm.find(b'\n', stop - 1, end) + 1 or end
+        lines = mm[pos:stop].split(b'\n')
+        if not lines[-1]:
+            lines.pop()
+        if lines:
+            yield _parse_block(lines, names)
+        pos = stop
+
+def _parse_range(path, start, end):
+    """子进程：mmap 整个文件，只解析并折叠自己的字节区间"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        batches = _iter_range_batches(mm, start, end, {})
+        return _fold_records(chain.from_iterable(zip(*(b[k] for k in BATCH_FIELDS)) for b in batches))
+
+def iter_range_parts(path, ranges):
+    """多进程并行解析各字节区间，按完成顺序产出 (partial, 行数)"""
+    if len(ranges) <= 1:
+        for a, b in ranges:
+            yield _parse_range(path, a, b)
+        return
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        for fut in as_completed([pool.submit(_parse_range, path, a, b) for a, b in ranges]):
+            yield fut.result()
+
+def parse_ranges(path, jobs=None, stats=None):
+    """单个大文件按字节区间多进程并行解析，结果与 parse_csv 相同"""
+    t0 = time.perf_counter()
+    ranges = split_ranges(path, jobs or os.cpu_count() or 1)
+    by_type, n = {}, 0
+    for part, rows in iter_range_parts(path, ranges):
+        n += rows
+        for typ, daily in part.items():
+            if typ in by_type:
+                _add_cells(by_type[typ], daily)
+            else:
+                by_type[typ] = daily
+    if stats is not None:
+        stats.update(rows=n, bytes=os.path.getsize(path), seconds=time.perf_counter() - t0, ranges=len(ranges))
+    return by_type
+
+def report_throughput(stats):
+    """输出解析吞吐（行/秒、MB/秒）"""
+    sec = stats.get('seconds') or 1e-9
+    rows, mb = stats.get('rows', 0), stats.get('bytes', 0) / 1e6
+    cache = ({'hit': '列式缓存命中，', 'miss': '列式缓存重建，', 'agg': '读取聚合文件，',
+              'store': '读取聚合库，'}.get(stats.get('cache'))
+             or {'resume': '增量续读，', 'head': '增量续读（表头后插入），',
+                 'rebuild': '增量状态重建，'}.get(stats.get('append'))
+             or (f"字节区间并行（{stats['ranges']} 段），" if stats.get('ranges') else ''))
+    size = f" / {mb:.1f} MB" if mb else ''
+    speed = f"，{mb/sec:.1f} MB/秒" if mb else ''
+    print(f"{cache}解析 {rows:,} 行{size}，耗时 {sec:.2f}s（{rows/sec:,.0f} 行/秒{speed}）")
+
+class StageProfiler:
+    """按阶段记录 wall / CPU / 内存分配 / 行数（可选 cProfile 与 Chrome trace 输出）；未启用时各阶段为空操作"""
+
+    def __init__(self, enabled=False, pstats_path=None, trace_path=None):
+        self.enabled = enabled or bool(pstats_path or trace_path)
+        self.pstats_path, self.trace_path = pstats_path, trace_path
+        self.stages = []
+        self._profile = cProfile.Profile() if pstats_path else None
+        self._t0 = time.perf_counter()
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        """with profiler.stage('parse') as rec: ...；可在 rec 里补充 rows 等计数"""
+        rec = {'name': name}
+        if not self.enabled:
+            yield rec
+            return
+        tracemalloc.reset_peak()
+        m0 = tracemalloc.get_traced_memory()[0]
+        w0, c0 = time.perf_counter(), time.process_time()
+        if self._profile:
+            self._profile.enable()
+        try:
+            yield rec
+        finally:
+            if self._profile:
+                self._profile.disable()
+            cur, peak = tracemalloc.get_traced_memory()
+            rec.update(start=w0 - self._t0, wall=time.perf_counter() - w0, cpu=time.process_time() - c0,
+                       alloc_kb=(cur - m0) // 1024, peak_kb=(peak - m0) // 1024)
+            self.stages.append(rec)
+
+    def finish(self, out=None):
+        """输出阶段汇总到 stderr，并按需写出 pstats / Chrome trace 文件"""
+        if not self.enabled:
+            return
+        tracemalloc.stop()
+        out = out or sys.stderr
+        total = sum(r['wall'] for r in self.stages) or 1e-9
+        print(f"{'阶段':<8}{'wall':>9}{'cpu':>9}{'占比':>5}{'净分配':>9}{'峰值':>10}{'行数':>10}", file=out)
+        for r in self.stages:
+            rows = f"{r['rows']:,}" if 'rows' in r else '-'
+            io = f"  （其中读盘 {r['io']:.3f}s）" if r.get('io') else ''
+            print(f"{r['name']:<10}{r['wall']:8.3f}s{r['cpu']:8.3f}s{r['wall'] / total:7.1%}"
+                  f"{r['alloc_kb']:>9,} KB{r['peak_kb']:>9,} KB{rows:>12}{io}", file=out)
+        if self._profile:
+            self._profile.dump_stats(self.pstats_path)
+            print(f"cProfile 结果: {self.pstats_path}（python -m pstats 查看）", file=out)
+        if self.trace_path:
+            pid = os.getpid()
+            events = [{'name': r['name'], 'ph': 'X', 'pid': pid, 'tid': 0, 'ts': r['start'] * 1e6, 'dur': r['wall'] * 1e6,
+                       'args': {k: v for k, v in r.items() if k not in ('name', 'start', 'wall')}}
+                      for r in self.stages]
+            with open(self.trace_path, 'w', encoding='utf-8') as f:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+            print(f"Chrome trace: {self.trace_path}（chrome://tracing 或 Perfetto 打开）", file=out)
+
+def add_profile_args(parser):
+    """两个看板生成器共用的性能分析开关"""
+    parser.add_argument('--profile', action='store_true', help='各阶段耗时/内存汇总输出到 stderr')
+    parser.add_argument('--pstats', metavar='PATH', help='写出 cProfile 结果（隐含 --profile）')
+    parser.add_argument('--trace', metavar='PATH', help='写出 Chrome trace-event JSON（隐含 --profile）')
+
+def profiler_from_args(args):
+    return StageProfiler(args.profile, args.pstats, args.trace)
+
+# 明细行字段 → 对应 Action（取 uv 平面）
+ROW_FIELDS = (
+    ('start', 'start'), ('trigger', 'promotion_trigger'), ('show', 'pop_show'),
+    ('click', 'pop_click'), ('close', 'pop_close'), ('notips', 'pop_notips'),
+    ('timeout', 'kk_pop_timeout'), ('down_start', 'down_start'), ('down_suc', 'down_suc'),
+    ('down_fail', 'down_fail'), ('down_end_suc', 'down_end_suc'),
+    ('down_end_fail', 'down_end_fail'), ('break_count', 'break'),
+)
+# 派生率字段：(字段, 分子, 分母)
+RATE_FIELDS = (
+    ('show_rate', 'show', 'start'), ('ctr', 'click', 'show'),
+    ('install_rate', 'down_end_suc', 'click'), ('brk_rate', 'break_count', 'start'),
+)
+ROW_KEYS = ('date', 'phase') + tuple(f for f, _ in ROW_FIELDS) + tuple(f for f, _, _ in RATE_FIELDS)
+PHASES = ('灰测期', '灰度扩量', '稳定期', '正式放量')
+# 阶段由 start 人数序列的变点分段决定，不依赖绝对流量：各 Type 各自分段，合并水平相近的相邻段后按增长贴标签
+PHASE_STABLE = 1.3  # 相邻段水平相差不足 30% 时合并为同一段
+PHASE_PEAK = 0.7  # 水平达到峰值 70% 以上即正式放量
+PHASE_MIN_DAYS = 3  # 短于此天数的段视为尖峰 / 回落：不参与峰值，夹在两侧之间时不改变阶段
+
+def build_matrix(daily):
+    """把 {(date, action): [pv, uv]} 展开为稠密 date × action 矩阵，pv / uv 两个平面按 action 分列"""
+    dates = sorted({d for d, _ in daily})
+    pos = {d: i for i, d in enumerate(dates)}
+    actions = {a for _, a in daily} | {a for _, a in ROW_FIELDS}
+    zeros = array('q', [0]) * len(dates)
+    pv = {a: array('q', zeros) for a in actions}
+    uv = {a: array('q', zeros) for a in actions}
+    for (d, a), (p, u) in daily.items():
+        pv[a][pos[d]] += p
+        uv[a][pos[d]] += u
+    return {'dates': dates, 'pv': pv, 'uv': uv}
+
+def change_points(xs, penalty, min_len=1):
+    """二分分段（均值漂移，前缀和使每段代价 O(1)），返回各段起点下标（含 0），升序"""
+    s1 = list(accumulate(xs, initial=0))
+    s2 = list(accumulate((x * x for x in xs), initial=0))
+
+    def cost(a, b):
+        return s2[b] - s2[a] - (s1[b] - s1[a]) ** 2 / (b - a)
+
+    starts, stack = [0], [(0, len(xs))]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2 * min_len:
+            continue
+        whole = cost(a, b)
+        gain, k = max((whole - cost(a, k) - cost(k, b), k) for k in range(a + min_len, b - min_len + 1))
+        if gain > penalty:
+            starts.append(k)
+            stack += [(a, k), (k, b)]
+    return sorted(starts)
+
+def _phase_penalty(xs):
+    """切分门槛：日间噪声（一阶差分的 MAD 估计）的 BIC 式惩罚"""
+    diffs = [b - a for a, b in zip(xs, xs[1:])]
+    noise = 0.0
+    if diffs:
+        mid = median(diffs)
+        noise = 1.4826 * median(abs(d - mid) for d in diffs) / sqrt(2)
+    # 没有噪声时（序列平滑）单日至少偏离约 30% 才单独成段
+    return max(2 * noise * noise * log(max(len(xs), 2)), log(PHASE_STABLE) ** 2)
+
+def merge_levels(xs, bounds, gap):
+    """相邻段均值相差不足 gap 时合并，每次合并最接近的一对；返回 [(起点, 终点, 均值)]"""
+    s1 = list(accumulate(xs, initial=0))
+    segs = {a: b for a, b in zip(bounds, bounds[1:])}
+    prev = dict(zip(bounds[1:-1], bounds))
+
+    def level(a):
+        return (s1[segs[a]] - s1[a]) / (segs[a] - a)
+
+    heap = [(abs(level(b) - level(a)), a, b) for a, b in zip(bounds, bounds[1:-1])]
+    heapq.heapify(heap)
+    while heap and heap[0][0] < gap:
+        diff, a, b = heapq.heappop(heap)
+        if segs.get(a) != b or b not in segs or diff != abs(level(b) - level(a)):  # 条目已过期
+            continue
+        segs[a] = segs.pop(b)
+        prev.pop(b, None)
+        nxt = segs[a]
+        if nxt in segs:
+            prev[nxt] = a
+            heapq.heappush(heap, (abs(level(nxt) - level(a)), a, nxt))
+        if a in prev:
+            heapq.heappush(heap, (abs(level(a) - level(prev[a])), prev[a], a))
+    return [(a, segs[a], level(a)) for a in sorted(segs)]
+
+def segment_phases(start):
+    """每日 start 人数 → 每日阶段"""
+    n = len(start)
+    if not n:
+        return []
+    xs = [log1p(max(v, 0)) for v in start]
+    gap = log(PHASE_STABLE)
+    segs = merge_levels(xs, change_points(xs, _phase_penalty(xs)) + [n], gap)
+    levels = [lv for _, _, lv in segs]
+    peak = max([lv for a, b, lv in segs if b - a >= PHASE_MIN_DAYS] or levels)
+    # 灰度扩量：较前一段增长；首轮增长前、且回落到本轮增长起点水平时为灰测期，到过峰值后的回落为稳定期
+    labels, base, before = [], None, PHASES[0]
+    for i, (a, b, lv) in enumerate(segs):
+        rising = i > 0 and lv >= levels[i - 1] + gap
+        if rising and not (i > 1 and levels[i - 1] >= levels[i - 2] + gap):
+            base, before = levels[i - 1], labels[-1] if labels[-1] == PHASES[0] else PHASES[2]
+        if peak > 0 and lv >= peak + log(PHASE_PEAK):
+            label = PHASES[3]
+        elif i == 0 or peak <= 0:
+            label = PHASES[0]
+        elif rising:
+            label = PHASES[1]
+        else:
+            label = before if base is None or lv < base + gap else PHASES[2]
+        if label == PHASES[3] and b - a >= PHASE_MIN_DAYS:
+            before = PHASES[2]  # 到过峰值后的回落不再是灰测期
+        labels.append(label)
+    for i in range(1, len(segs) - 1):
+        a, b, lv = segs[i]
+        if b - a < PHASE_MIN_DAYS and labels[i] != PHASES[3] and (lv - levels[i - 1]) * (lv - levels[i + 1]) > 0:
+            labels[i] = labels[i - 1]
+    return [label for label, (a, b, _) in zip(labels, segs) for _ in range(b - a)]
+
+def _pct(a, b):
+    return round(a / b * 100, 2) if b else 0
+
+def _rate(num, den):
+    """逐元素百分比，分母为 0 的位置置 0"""
+    return [_pct(a, b) for a, b in zip(num, den)]
 
 def compute_metrics(daily):
-    dates = sorted(daily.keys())
-    rows = []
-    for d in dates:
-        g = lambda a: get_uv(daily, d, a)
-        s, sh, cl = g('start'), g('pop_show'), g('pop_click')
-        ds, desuc = g('down_start'), g('down_end_suc')
-        brk = g('break')
-        rows.append({
-            'date': d, 'phase': classify_phase(s),
-            'start': s, 'trigger': g('promotion_trigger'), 'show': sh,
-            'click': cl, 'close': g('pop_close'), 'notips': g('pop_notips'),
-            'timeout': g('kk_pop_timeout'), 'down_start': ds,
-            'down_suc': g('down_suc'), 'down_fail': g('down_fail'),
-            'down_end_suc': desuc, 'down_end_fail': g('down_end_fail'),
-            'break_count': brk,
-            'show_rate': round(sh/s*100, 2) if s else 0,
-            'ctr': round(cl/sh*100, 2) if sh else 0,
-            'install_rate': round(desuc/cl*100, 2) if cl else 0,
-            'brk_rate': round(brk/s*100, 2) if s else 0,
-        })
-    return rows
+    """按列计算每日指标：计数列直接取 uv 平面，派生率与阶段整列计算"""
+    return metrics_from_matrix(build_matrix(daily))
+
+def metrics_from_matrix(mx):
+    """由稠密矩阵 {dates, pv, uv} 派生每日指标（ROW_FIELDS 的 Action 必须都在矩阵里）"""
+    m = {'dates': mx['dates'], 'matrix': mx}
+    for field, action in ROW_FIELDS:
+        m[field] = mx['uv'][action]
+    m['phase'] = segment_phases(m['start'])
+    for field, num, den in RATE_FIELDS:
+        m[field] = _rate(m[num], m[den])
+    return m
+
+def to_rows(m):
+    """渲染时才构建的行视图（list of dict），字段顺序与 ROW_KEYS 一致"""
+    cols = [m['dates'], m['phase']] + [m[k] for k in ROW_KEYS[2:]]
+    return [dict(zip(ROW_KEYS, vals)) for vals in zip(*cols)]
+
+_ROW_FORMAT = '{' + ', '.join(f'"{k}": %s' for k in ROW_KEYS) + '}'
+
+def rows_json(m):
+    """ROWS 的 JSON 文本（与 json.dumps(to_rows(m)) 逐字节一致，不构建行字典）"""
+    cols = [map(encode_basestring, m['dates']), map(encode_basestring, m['phase'])]
+    cols += [map(repr, m[k]) for k in ROW_KEYS[2:]]
+    return '[' + ', '.join(map(_ROW_FORMAT.__mod__, zip(*cols))) + ']'
+
+ROWS_WIRES = ('columnar', 'rows')
+ROWS_WIRE = 'columnar'  # 页面内嵌 ROWS 的编码：columnar 每字段一列（页面首次切到该视图时展开），rows 为行字典数组
+
+def _int_col(col):
+    """整数列 → (JSON 文本, 是否差分)；差分编码更短时用差分（页面按前缀和还原）"""
+    plain = '[' + ','.join(map(str, col)) + ']'
+    if len(col) < 2:
+        return plain, False
+    delta = '[' + ','.join(map(str, [col[0]] + [b - a for a, b in zip(col, col[1:])])) + ']'
+    return (delta, True) if len(delta) < len(plain) else (plain, False)
+
+def rows_columnar_json(m):
+    """ROWS 的列式 JSON：{"n", "phases", "delta", "cols"}"""
+    phases = list(dict.fromkeys(m['phase']))
+    index = {p: i for i, p in enumerate(phases)}
+    cols = ['"date":[' + ','.join(map(encode_basestring, m['dates'])) + ']',
+            '"phase":[' + ','.join(str(index[p]) for p in m['phase']) + ']']
+    delta = []
+    for k, _ in ROW_FIELDS:
+        text, is_delta = _int_col(m[k])
+        cols.append(f'"{k}":{text}')
+        if is_delta:
+            delta.append(k)
+    cols += [f'"{k}":[' + ','.join(map(repr, m[k])) + ']' for k, _, _ in RATE_FIELDS]
+    return '{"n":%d,"phases":%s,"delta":%s,"cols":{%s}}' % (
+        len(m['dates']), json.dumps(phases, ensure_ascii=False), json.dumps(delta), ','.join(cols))
+
+def select_days(m, mask):
+    """按布尔掩码筛选日期，返回同结构的列字典"""
+    idx = [i for i, keep in enumerate(mask) if keep]
+    return {k: [m[k][i] for i in idx] for k in ('dates',) + ROW_KEYS[1:]}
+
+def valid_days(m):
+    """排除灰测期"""
+    return select_days(m, [p != PHASES[0] for p in m['phase']])
+
+def matrix_to_daily(mx):
+    """稠密矩阵还原为 {(date, action): [pv, uv]}（只保留非零单元）"""
+    pv, uv = mx['pv'], mx['uv']
+    return {(d, a): [pv[a][i], uv[a][i]]
+            for a in pv for i, d in enumerate(mx['dates']) if pv[a][i] or uv[a][i]}
+
+def refresh_metrics(m, delta):
+    """把增量 {(date, action): [pv, uv]} 折叠进已有指标（乱序补数时全量重算）"""
+    mx, dates = m['matrix'], m['dates']
+    m.pop('index', None)
+    pos = {d: i for i, d in enumerate(dates)}
+    new = sorted({d for d, _ in delta} - pos.keys())
+    if new and dates and new[0] < dates[-1]:
+        daily = matrix_to_daily(mx)
+        for key, (p, u) in delta.items():
+            cell = daily.setdefault(key, [0, 0])
+            cell[0] += p
+            cell[1] += u
+        return compute_metrics(daily)
+    for a in {a for _, a in delta} - mx['pv'].keys():
+        mx['pv'][a] = array('q', [0]) * len(dates)
+        mx['uv'][a] = array('q', [0]) * len(dates)
+    for d in new:
+        pos[d] = len(dates)
+        dates.append(d)
+        for plane in (mx['pv'], mx['uv']):
+            for col in plane.values():
+                col.append(0)
+        for field, _, _ in RATE_FIELDS:
+            m[field].append(0)
+    for (d, a), (p, u) in delta.items():
+        mx['pv'][a][pos[d]] += p
+        mx['uv'][a][pos[d]] += u
+    for i in sorted({pos[d] for d, _ in delta}):
+        for field, num, den in RATE_FIELDS:
+            m[field][i] = _pct(m[num][i], m[den][i])
+    m['phase'] = segment_phases(m['start'])
+    return m
+
+def _dump_metrics(m):
+    mx = m['matrix']
+    out = {k: list(m[k]) for k in ('dates', 'phase') + tuple(f for f, _, _ in RATE_FIELDS)}
+    out['pv'] = {a: list(col) for a, col in mx['pv'].items()}
+    out['uv'] = {a: list(col) for a, col in mx['uv'].items()}
+    return out
+
+def _load_metrics(obj):
+    mx = {'dates': obj['dates'],
+          'pv': {a: array('q', col) for a, col in obj['pv'].items()},
+          'uv': {a: array('q', col) for a, col in obj['uv'].items()}}
+    m = {'dates': mx['dates'], 'matrix': mx, 'phase': obj['phase']}
+    for field, action in ROW_FIELDS:
+        m[field] = mx['uv'][action]
+    for field, _, _ in RATE_FIELDS:
+        m[field] = obj[field]
+    return m
+
+def _complete_end(path):
+    """最后一个换行符之后的字节偏移；末尾尚未写完的半行留到下次"""
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - CHUNK_SIZE)
+            f.seek(start)
+            i = f.read(end - start).rfind(b'\n')
+            if i >= 0:
+                return start + i + 1
+            end = start
+    return 0
+
+def _tail_digest(path, offset):
+    with open(path, 'rb') as f:
+        f.seek(max(0, offset - TAIL_BYTES))
+        return hashlib.blake2b(f.read(min(offset, TAIL_BYTES)), digest_size=16).hexdigest()
+
+def _head_digest(path, offset, end):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return hashlib.blake2b(f.read(min(end - offset, TAIL_BYTES)), digest_size=16).hexdigest()
+
+def _body_start(path):
+    """首个报表日期数据行的字节偏移（跳过表头与合计行）"""
+    pos = 0
+    with open(path, 'rb') as f:
+        for i, line in enumerate(f):
+            fields = line.split(b',', 2)
+            if i and len(fields) > 1 and _is_report_date(fields[1].strip(b'" ').decode('ascii', 'replace')):
+                break
+            pos += len(line)
+    return pos
+
+def append_state(path, state=None, stats=None):
+    """增量折叠核心：从文件尾水位续读，或只解析表头后插入的新行；其余改写从头重建，返回新 state"""
+    end = _complete_end(path)
+    start, stop, mode, metrics = 0, end, 'rebuild', {}
+    if state is not None:
+        moved = end - (state['offset'] - state['body'])  # 原数据区在新文件中的起点
+        if end >= state['offset'] and _tail_digest(path, state['offset']) == state['tail']:
+            start, mode, metrics = state['offset'], 'resume', state['metrics']
+        elif (state['body'] <= moved < end and _tail_digest(path, end) == state['tail']
+              and _head_digest(path, moved, end) == state['head']):
+            stop, mode, metrics = moved, 'head', state['metrics']
+    delta, n = _fold_records(iter_records(path, stats=stats, start=start, end=stop)) if stop > start else ({}, 0)
+    for t, daily in delta.items():
+        metrics[t] = refresh_metrics(metrics.get(t) or compute_metrics({}), daily)
+    if stats is not None:
+        stats.update(rows=n, append=mode)
+    body = _body_start(path)
+    return {'offset': end, 'tail': _tail_digest(path, end), 'body': body, 'head': _head_digest(path, body, end),
+            'metrics': metrics}
+
+def parse_append(path, stats=None):
+    """增量模式：状态持久化在 <csv>.state.json，只解析上次水位之后追加、或表头后插入的新行；返回 {type: metrics}"""
+    t0 = time.perf_counter()
+    state_path = path + STATE_SUFFIX
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            state = json.load(f)
+        state = (None if state.get('version') != STATE_VERSION else
+                 {'offset': state['offset'], 'tail': state['tail'], 'body': state['body'], 'head': state['head'],
+                  'metrics': {t: _load_metrics(obj) for t, obj in state['metrics'].items()}})
+    except (OSError, ValueError, KeyError):
+        state = None
+    state = append_state(path, state, stats)
+
+    dump = {'version': STATE_VERSION, 'offset': state['offset'], 'tail': state['tail'],
+            'body': state['body'], 'head': state['head'],
+            'metrics': {t: _dump_metrics(m) for t, m in state['metrics'].items()}}
+    tmp_path = f'{state_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dump, f, ensure_ascii=False)
+    os.replace(tmp_path, state_path)
+    if stats is not None:
+        stats['seconds'] = time.perf_counter() - t0
+    return state['metrics']
+
+def view_metrics(metrics):
+    """{type: metrics} → {标签: metrics}；多于一个 Type 时在最前加“全部”汇总视图"""
+    views = {} if metrics else {ALL_TYPES: compute_metrics({})}
+    if len(metrics) > 1 and all('sketches' in m for m in metrics.values()):
+        from events_promotion import merge_sketch_views
+        views[ALL_TYPES] = merge_sketch_views(metrics)
+    elif len(metrics) > 1:
+        views[ALL_TYPES] = compute_metrics(merge_types({t: matrix_to_daily(m['matrix']) for t, m in metrics.items()}))
+    views.update(sorted(metrics.items()))
+    return views
+
+def annotate_views(views):
+    """{标签: metrics} → {标签: (metrics, insights, suggestions)}"""
+    return {t: (m, gen_insights(m), gen_suggestions(m)) for t, m in views.items()}
+
+def build_views(metrics):
+    """{type: metrics} → {标签: (metrics, insights, suggestions)}"""
+    return annotate_views(view_metrics(metrics))
+
+# 聚合结果导出 / 导入：每个 (Type, 日期) 一行，pv_<action> / uv_<action> 计数列 + 阶段与派生率列。
+# pyarrow 为可选依赖，只在读写这类文件时导入
+AGG_FORMATS = {'.parquet': 'parquet', '.arrow': 'ipc', '.feather': 'ipc', '.ipc': 'ipc'}
+AGG_ROW_GROUP = 1 << 14  # Parquet 行组行数；按日期排序写出，行组的 min/max 统计可跳过区间外的数据
+
+def agg_format(path):
+    """文件扩展名 → 'parquet' / 'ipc'；不是聚合文件时返回 None"""
+    return AGG_FORMATS.get(os.path.splitext(path)[1].lower())
+
+def _pyarrow():
+    try:
+        import pyarrow, pyarrow.dataset, pyarrow.feather, pyarrow.parquet
+    except ImportError as e:
+        raise ImportError('读写 Parquet / Arrow 聚合文件需要 pyarrow（pip install pyarrow）') from e
+    return pyarrow
+
+def metrics_table(metrics):
+    """{type: metrics} → pyarrow.Table，按 (日期, Type) 排序；date 为 date32，计数为 int64，比率为 float64"""
+    pa = _pyarrow()
+    actions = sorted(set().union(*(m['matrix']['pv'] for m in metrics.values())))
+    keys = sorted((d, t, i) for t, m in metrics.items() for i, d in enumerate(m['dates']))
+    zeros = {t: array('q', [0]) * len(m['dates']) for t, m in metrics.items()}
+    cols = {'date': pa.array([datetime.fromisoformat(d).date() for d, _, _ in keys], pa.date32()),
+            'type': pa.array([t for _, t, _ in keys]).dictionary_encode(),
+            'phase': pa.array([metrics[t]['phase'][i] for _, t, i in keys]).dictionary_encode()}
+    for plane in ('pv', 'uv'):
+        for a in actions:
+            cols[f'{plane}_{a}'] = pa.array([metrics[t]['matrix'][plane].get(a, zeros[t])[i] for _, t, i in keys],
+                                            pa.int64())
+    for field, _, _ in RATE_FIELDS:
+        cols[field] = pa.array([float(metrics[t][field][i]) for _, t, i in keys], pa.float64())
+    return pa.table(cols)
+
+def export_metrics(metrics, path):
+    """写出 Parquet（.parquet）或 Arrow IPC 文件（.arrow / .feather / .ipc）；返回行数"""
+    fmt = agg_format(path)
+    if fmt is None:
+        raise ValueError(f'不支持的聚合文件格式: {path}（可选 {" / ".join(AGG_FORMATS)}）')
+    pa = _pyarrow()
+    table = metrics_table(metrics)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    if fmt == 'parquet':
+        pa.parquet.write_table(table, tmp_path, row_group_size=AGG_ROW_GROUP, compression='zstd')
+    else:
+        pa.feather.write_feather(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    return table.num_rows
+
+def load_metrics(path, start=None, end=None, stats=None):
+    """读取 export_metrics 写出的文件为 {type: metrics}，日期过滤下推到读取层"""
+    t0 = time.perf_counter()
+    pa = _pyarrow()
+    dataset = pa.dataset.dataset(path, format=agg_format(path))
+    names = dataset.schema.names
+    counts = [n for n in names if n.startswith(('pv_', 'uv_'))]
+    expr = None
+    for bound, op in ((start, '__ge__'), (end, '__le__')):
+        if bound:
+            cond = getattr(pa.dataset.field('date'), op)(pa.scalar(datetime.fromisoformat(bound).date(), pa.date32()))
+            expr = cond if expr is None else expr & cond
+    table = dataset.to_table(columns=['date', 'type'] + counts, filter=expr)
+    dates = [d.isoformat() for d in table.column('date').to_pylist()]
+    rows_by_type = {}
+    for i, t in enumerate(table.column('type').to_pylist()):
+        rows_by_type.setdefault(t, []).append(i)
+    cols = {n: table.column(n).to_pylist() for n in counts}
+    metrics = {}
+    for t, idx in rows_by_type.items():
+        idx.sort(key=dates.__getitem__)
+        mx = {'dates': [dates[i] for i in idx], 'pv': {}, 'uv': {}}
+        for n in counts:
+            plane, action = n.split('_', 1)
+            mx[plane][action] = array('q', [cols[n][i] for i in idx])
+        for _, action in ROW_FIELDS:
+            for plane in ('pv', 'uv'):
+                mx[plane].setdefault(action, array('q', [0]) * len(idx))
+        metrics[t] = metrics_from_matrix(mx)
+    if stats is not None:
+        stats.update(rows=table.num_rows, bytes=os.path.getsize(path), cache='agg',
+                     seconds=time.perf_counter() - t0)
+    return metrics
 
-def gen_insights(rows):
+# 嵌入式 SQLite 聚合库：(type, date, action) 为主键的无 rowid 表（主键即聚簇索引，按 Type 查询天然覆盖），
+# 另有 (date, action, type, pv, uv) 覆盖索引：跨 Type 的日期区间合计按索引顺序流式分组。重新下发的日期按 UPSERT 覆盖旧值
+STORE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+STORE_BATCH = 50_000  # executemany 每批行数
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily (
+    type TEXT NOT NULL, date TEXT NOT NULL, action TEXT NOT NULL,
+    pv INTEGER NOT NULL, uv INTEGER NOT NULL,
+    PRIMARY KEY (type, date, action)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS daily_by_date ON daily (date, action, type, pv, uv);
+"""
+
+def is_store(path):
+    return os.path.splitext(path)[1].lower() in STORE_SUFFIXES
+
+def open_store(path):
+    """打开（必要时创建）聚合库：WAL 日志，读写互不阻塞；NORMAL 同步在 WAL 下仍保证一致性"""
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(STORE_SCHEMA)
+    return conn
+
+def store_upsert(conn, by_type, stats=None, dates=None):
+    """把 {type: {(date, action): [pv, uv]}} 在单个事务内写入聚合库，返回写入行数"""
+    t0 = time.perf_counter()
+    if dates is None:
+        dates = {t: {d for d, _ in daily} for t, daily in by_type.items()}
+    rows = ((t, d, a, pv, uv) for t, daily in by_type.items() for (d, a), (pv, uv) in daily.items())
+    sql = ('INSERT INTO daily (type, date, action, pv, uv) VALUES (?, ?, ?, ?, ?) '
+           'ON CONFLICT (type, date, action) DO UPDATE SET pv = excluded.pv, uv = excluded.uv')
+    n = 0
+    with conn:
+        conn.executemany('DELETE FROM daily WHERE type = ? AND date = ?', ((t, d) for t, ds in dates.items() for d in ds))
+        while True:
+            batch = list(islice(rows, STORE_BATCH))
+            if not batch:
+                break
+            conn.executemany(sql, batch)
+            n += len(batch)
+    if stats is not None:
+        stats.update(store_rows=n, store_seconds=time.perf_counter() - t0)
+    return n
+
+def _date_filter(start, end):
+    where, args = [], []
+    if start:
+        where.append('date >= ?')
+        args.append(start)
+    if end:
+        where.append('date <= ?')
+        args.append(end)
+    return (' WHERE ' + ' AND '.join(where) if where else ''), args
+
+def store_daily(conn, start=None, end=None):
+    """一次查询取回 {type: {(date, action): [pv, uv]}}（日期区间含端点）"""
+    where, args = _date_filter(start, end)
+    # 按主键顺序扫描即已按 Type 分好组，无需 GROUP BY
+    cur = conn.execute(f'SELECT type, date, action, pv, uv FROM daily{where} ORDER BY type, date, action', args)
+    return {t: {(d, a): [pv, uv] for _, d, a, pv, uv in rows} for t, rows in groupby(cur, key=lambda r: r[0])}
+
+def store_totals(conn, start=None, end=None):
+    """跨 Type 合计：一次 GROUP BY (date, action) 分组查询 → {(date, action): [pv, uv]}，走日期覆盖索引"""
+    where, args = _date_filter(start, end)
+    return {(d, a): [pv, uv] for d, a, pv, uv in conn.execute(
+        f'SELECT date, action, SUM(pv), SUM(uv) FROM daily{where} GROUP BY date, action', args)}
+
+def load_store(path, start=None, end=None, stats=None):
+    """从聚合库读出 {type: metrics}"""
+    t0 = time.perf_counter()
+    conn = open_store(path)
+    try:
+        by_type = store_daily(conn, start, end)
+    finally:
+        conn.close()
+    if stats is not None:
+        stats.update(rows=sum(map(len, by_type.values())), cache='store', seconds=time.perf_counter() - t0)
+    return {t: compute_metrics(daily) for t, daily in by_type.items()}
+
+def load_inputs(paths, jobs=None, start=None, end=None, append=False, stats=None, ranges=False):
+    """统一读取入口 → {type: metrics}，所有渲染器共用一次解析"""
+    if len(paths) == 1 and agg_format(paths[0]) is not None:
+        return load_metrics(paths[0], start, end, stats)
+    if len(paths) == 1 and is_store(paths[0]):
+        return load_store(paths[0], start, end, stats)
+    if len(paths) == 1:
+        from events_promotion import is_event_log, parse_events, sketch_metrics
+        if is_event_log(paths[0]):
+            return sketch_metrics(parse_events(paths[0], stats))
+    if append:
+        return parse_append(paths[0], stats)
+    by_type = (parse_shards(paths, jobs, stats) if len(paths) > 1 else
+               parse_ranges(paths[0], jobs, stats) if ranges else parse_csv(paths[0], stats))
+    return {t: compute_metrics(daily) for t, daily in by_type.items()}
+
+# 渲染器：(views, path, stats) → 是否写出；views 为 view_metrics() 的结果（标签 → metrics），
+# 同一次解析的结果可依次交给多个渲染器。值为 '模块:函数'，用到时才导入
+RENDERERS = {'analysis': 'analyze_promotion:write_analysis', 'overview': 'generate_dashboard:write_overview'}
+
+def get_renderer(name):
+    module, func = RENDERERS[name].split(':')
+    main = sys.modules.get('__main__')
+    if os.path.splitext(os.path.basename(getattr(main, '__file__', None) or ''))[0] == module:
+        return getattr(main, func)  # 渲染器所在模块正作为脚本运行时不再重复导入
+    return getattr(importlib.import_module(module), func)
+
+def _render_spec(text):
+    name, sep, path = text.partition('=')
+    if not sep or not path or name not in RENDERERS:
+        raise argparse.ArgumentTypeError(f'应为 NAME=PATH，NAME 可选 {" / ".join(RENDERERS)}')
+    return name, path
+
+def add_render_args(parser):
+    parser.add_argument('--render', action='append', default=[], type=_render_spec, metavar='NAME=PATH',
+                        help=f'同一次解析再交给其他渲染器输出（可重复；NAME 可选 {" / ".join(RENDERERS)}）')
+
+def run_renderers(specs, views, prof):
+    """按 --render 依次调用渲染器，每个渲染器一个 profiler 阶段"""
+    for name, path in specs:
+        with prof.stage(f'render:{name}'):
+            written = get_renderer(name)(views, path, {})
+        print(f"[{name}] 看板已生成: {path}" if written is not False else f"[{name}] 看板未变化，跳过写出: {path}")
+
+def write_analysis(views, path, stats=None, wire=ROWS_WIRE):
+    """分析看板渲染器：逐视图生成洞察与建议后写出（带渲染缓存，命中时返回 False）"""
+    return write_dashboard(annotate_views(views), path, stats, wire)
+
+def gen_insights(m):
     """生成关键洞察"""
     insights = []
     # 排除灰测期
-    valid = [r for r in rows if r['phase'] != '灰测期']
-    if not valid:
+    idx = range_index(m)
+    n = idx.days(plane='valid')
+    if not n:
         return insights
+    valid = valid_days(m)
+    tot = idx.totals(SUM_FIELDS, plane='valid')
+    start = valid['start']
 
     # 1. CTR 瓶颈
-    avg_ctr = sum(r['ctr'] for r in valid) / len(valid)
-    total_show = sum(r['show'] for r in valid)
-    total_click = sum(r['click'] for r in valid)
+    avg_ctr = tot['ctr'] / n
+    total_show = tot['show']
+    total_click = tot['click']
     if avg_ctr < 2:
         insights.append({
             'tag': '核心瓶颈', 'color': '#ef4444',
@@ -78,10 +1117,10 @@ def gen_insights(rows):
         })
 
     # 2. 流量增长
-    if len(valid) >= 3:
-        first3 = sum(r['start'] for r in valid[:3]) / 3
-        last3 = sum(r['start'] for r in valid[-3:]) / 3
-        if last3 > first3 * 2:
+    if n >= 3:
+        first3 = sum(start[:3]) / 3
+        last3 = sum(start[-3:]) / 3
+        if first3 > 0 and last3 > first3 * 2:
             insights.append({
                 'tag': '流量增长', 'color': '#3b82f6',
                 'metric': f'{last3/first3:.1f}x',
@@ -90,9 +1129,9 @@ def gen_insights(rows):
             })
 
     # 3. 安装成功率亮点
-    install_valid = [r for r in valid if r['click'] > 0]
+    install_valid = [r for r, c in zip(valid['install_rate'], valid['click']) if c > 0]
     if install_valid:
-        avg_install = sum(r['install_rate'] for r in install_valid) / len(install_valid)
+        avg_install = sum(install_valid) / len(install_valid)
         if avg_install > 85:
             insights.append({
                 'tag': '亮点', 'color': '#10b981',
@@ -101,19 +1140,23 @@ def gen_insights(rows):
                 'desc': f'点击后安装成功率平均 {avg_install:.1f}%，下载链路健康，无需重点优化。'
             })
 
-    # 4. break 率关注
-    avg_brk = sum(r['brk_rate'] for r in valid) / len(valid)
-    total_brk = sum(r['break_count'] for r in valid)
+    # 4. break 率关注（有时延数据时附上弹窗超时与下载耗时的 p90，区分慢弹窗 / 慢下载）
+    avg_brk = tot['brk_rate'] / n
+    total_brk = tot['break_count']
     if avg_brk > 15:
+        latency = m.get('latency')
+        slow = '' if latency is None else '；' + '，'.join(
+            f'{pair} p90 {t[2]:.1f} 秒' for pair, t in zip(latency['pairs'], latency['total'])
+            if pair in ('show→timeout', '下载→成功') and t[2] is not None)
         insights.append({
             'tag': '关注', 'color': '#f59e0b',
             'metric': f'{avg_brk:.1f}%',
             'title': 'break 中断率偏高',
-            'desc': f'平均 break 率 {avg_brk:.1f}%，累计 {total_brk:,} 人中断退出。建议细化埋点区分弹窗前/后中断。'
+            'desc': f'平均 break 率 {avg_brk:.1f}%，累计 {total_brk:,} 人中断退出。建议细化埋点区分弹窗前/后中断{slow}。'
         })
 
     # 5. 不再提示累计
-    total_notips = sum(r['notips'] for r in valid)
+    total_notips = tot['notips']
     if total_notips > 1000:
         insights.append({
             'tag': '关注', 'color': '#f59e0b',
@@ -123,54 +1166,55 @@ def gen_insights(rows):
         })
 
     # 6. 趋势：最近持续放量
-    if len(valid) >= 4:
-        last4 = valid[-4:]
-        increasing = all(last4[i]['start'] <= last4[i+1]['start'] for i in range(3))
+    if n >= 4:
+        last4 = start[-4:]
+        increasing = all(last4[i] <= last4[i+1] for i in range(3))
         if increasing:
             insights.append({
                 'tag': '趋势', 'color': '#3b82f6',
-                'metric': f'{last4[-1]["start"]:,}',
+                'metric': f'{last4[-1]:,}',
                 'title': '连续放量中',
-                'desc': f'最近 4 天 start 量持续增长，最新一天达 {last4[-1]["start"]:,} 人。'
+                'desc': f'最近 4 天 start 量持续增长，最新一天达 {last4[-1]:,} 人。'
             })
 
     return insights[:6]
 
-def gen_suggestions(rows):
+def gen_suggestions(m):
     """生成优化建议"""
-    valid = [r for r in rows if r['phase'] != '灰测期']
-    if not valid:
+    idx = range_index(m)
+    n = idx.days(plane='valid')
+    if not n:
         return []
+    valid = valid_days(m)
     suggestions = []
-    avg_ctr = sum(r['ctr'] for r in valid) / len(valid)
-    total_show = sum(r['show'] for r in valid)
-    total_click = sum(r['click'] for r in valid)
-    lost = total_show - total_click
+    tot = idx.totals(SUM_FIELDS, plane='valid')
+    avg_ctr = tot['ctr'] / n
+    lost = tot['show'] - tot['click']
 
     suggestions.append({
         'priority': 'P0', 'title': '突破弹窗 CTR',
         'desc': f'当前平均 CTR {avg_ctr:.2f}%，累计 {lost:,} 人看到弹窗但未点击。建议：A/B 测试不同文案（利益点前置）、优化视觉 CTA 按钮、调整触发时机（如用户空闲时弹出）。'
     })
 
-    avg_brk = sum(r['brk_rate'] for r in valid) / len(valid)
-    total_brk = sum(r['break_count'] for r in valid)
+    avg_brk = tot['brk_rate'] / n
+    total_brk = tot['break_count']
     if avg_brk > 15:
         suggestions.append({
             'priority': 'P1', 'title': '治理 break 中断',
             'desc': f'平均 break 率 {avg_brk:.1f}%，累计 {total_brk:,} 人。建议细化埋点区分「弹窗前中断」和「弹窗后中断」，针对性优化触发场景和页面加载性能。'
         })
 
-    total_notips = sum(r['notips'] for r in valid)
+    total_notips = tot['notips']
     if total_notips > 500:
         suggestions.append({
             'priority': 'P1', 'title': '管理"不再提示"用户',
             'desc': f'累计 {total_notips:,} 人勾选不再提示。建议：加入免推名单避免无效曝光，分析这部分用户画像，评估是否需要调整弹窗频率策略。'
         })
 
-    install_valid = [r for r in valid if r['down_start'] > 0]
-    if install_valid:
-        total_fail = sum(r['down_fail'] + r['down_end_fail'] for r in install_valid)
-        total_ds = sum(r['down_start'] for r in install_valid)
+    has_ds = [ds > 0 for ds in valid['down_start']]
+    if any(has_ds):
+        total_fail = sum(f + e for f, e, k in zip(valid['down_fail'], valid['down_end_fail'], has_ds) if k)
+        total_ds = tot['down_start']
         fail_rate = total_fail / total_ds * 100 if total_ds else 0
         if fail_rate > 5:
             suggestions.append({
@@ -178,59 +1222,229 @@ def gen_suggestions(rows):
                 'desc': f'下载+安装失败率 {fail_rate:.1f}%（{total_fail} 次失败）。建议排查具体失败原因（网络超时、包损坏、存储空间不足等）。'
             })
 
-    suggestions.append({
-        'priority': 'P2', 'title': '优化触发→展示转化',
-        'desc': f'start→pop_show 整体转化约 {sum(r["show"] for r in valid)/sum(r["start"] for r in valid)*100:.1f}%，约 {sum(r["start"] for r in valid)-sum(r["show"] for r in valid):,} 人未看到弹窗。建议检查触发条件是否过严、频控策略是否合理。'
-    })
+    if tot['start']:
+        suggestions.append({
+            'priority': 'P2', 'title': '优化触发→展示转化',
+            'desc': f'start→pop_show 整体转化约 {tot["show"]/tot["start"]*100:.1f}%，约 {tot["start"]-tot["show"]:,} 人未看到弹窗。建议检查触发条件是否过严、频控策略是否合理。'
+        })
 
     return suggestions[:5]
 
 
-def generate_html(rows, insights, suggestions):
-    """生成单文件 HTML 看板，所有 CSS/JS 内联，无外部依赖（字体除外）"""
-    import json as _json
+FUNNEL_FIELDS = ('start', 'trigger', 'show', 'click', 'down_start', 'down_suc', 'down_end_suc')
+CLOSE_FIELDS = ('close', 'timeout', 'notips', 'click')
+SUM_FIELDS = tuple(f for f, _ in ROW_FIELDS) + tuple(f for f, _, _ in RATE_FIELDS)
 
-    dates = [r['date'] for r in rows]
-    date_range = f"{dates[0]} ~ {dates[-1]}" if dates else '-'
+class RangeIndex:
+    """日期 × 指标的前缀和索引：任意日期区间的合计、漏斗、关闭行为与分阶段小计"""
 
-    # 全周期汇总
-    total_start  = sum(r['start'] for r in rows)
-    total_show   = sum(r['show'] for r in rows)
-    total_click  = sum(r['click'] for r in rows)
-    total_install= sum(r['down_end_suc'] for r in rows)
-    total_brk    = sum(r['break_count'] for r in rows)
-
-    # 全周期漏斗（排除灰测期）
-    valid = [r for r in rows if r['phase'] != '灰测期']
-    f_start   = sum(r['start']       for r in valid)
-    f_trigger = sum(r['trigger']     for r in valid)
-    f_show    = sum(r['show']        for r in valid)
-    f_click   = sum(r['click']       for r in valid)
-    f_ds      = sum(r['down_start']  for r in valid)
-    f_dsuc    = sum(r['down_suc']    for r in valid)
-    f_desuc   = sum(r['down_end_suc']for r in valid)
-
-    # 关闭行为
-    f_close   = sum(r['close']   for r in valid)
-    f_timeout = sum(r['timeout'] for r in valid)
-    f_notips  = sum(r['notips']  for r in valid)
-    f_bclick  = sum(r['click']   for r in valid)
-
-    rows_json       = _json.dumps(rows,        ensure_ascii=False)
-    insights_json   = _json.dumps(insights,    ensure_ascii=False)
-    suggestions_json= _json.dumps(suggestions, ensure_ascii=False)
+    def __init__(self, m):
+        self.m, self.dates = m, m['dates']
+        self.planes = {}
 
-    def pct(a, b): return f"{a/b*100:.1f}%" if b else "-"
+    def _mask(self, name):
+        phase = self.m['phase']
+        return ([True] * len(phase) if name == 'all' else [p != PHASES[0] for p in phase] if name == 'valid'
+                else [p == name for p in phase])
+
+    def _plane(self, name):
+        plane = self.planes.get(name)
+        if plane is None:
+            mask = self._mask(name)
+            plane = {f: list(accumulate((v if k else 0 for v, k in zip(self.m[f], mask)), initial=0))
+                     for f in SUM_FIELDS}
+            plane['days'] = list(accumulate(mask, initial=0))
+            self.planes[name] = plane
+        return plane
+
+    def span(self, start=None, end=None):
+        """日期区间 → 下标半开区间 [i, j)；start 晚于 end 时为空区间"""
+        i = 0 if start is None else bisect_left(self.dates, start)
+        j = len(self.dates) if end is None else bisect_right(self.dates, end)
+        return i, max(i, j)
+
+    def totals(self, fields, start=None, end=None, plane='all'):
+        i, j = self.span(start, end)
+        p = self._plane(plane)
+        return {f: p[f][j] - p[f][i] for f in fields}
+
+    def sum(self, field, start=None, end=None, plane='all'):
+        return self.totals((field,), start, end, plane)[field]
+
+    def days(self, start=None, end=None, plane='all'):
+        return self.sum('days', start, end, plane)
+
+    def funnel(self, start=None, end=None):
+        t = self.totals(FUNNEL_FIELDS, start, end, 'valid')
+        return [t[f] for f in FUNNEL_FIELDS]
 
-    # Phase badge colors
-    phase_colors = {
-        '灰测期':   ('gray',   '#6b7280', '#1f2937'),
-        '灰度扩量': ('blue',   '#3b82f6', '#1e3a5f'),
-        '稳定期':   ('amber',  '#f59e0b', '#3d2e00'),
-        '正式放量': ('green',  '#10b981', '#052e16'),
+    def close(self, start=None, end=None):
+        t = self.totals(CLOSE_FIELDS, start, end, 'valid')
+        return [t[f] for f in CLOSE_FIELDS]
+
+    def phase_totals(self, fields, start=None, end=None):
+        """{阶段: {字段: 合计, 'days': 天数}}（只列出出现过的阶段）"""
+        return {p: self.totals(tuple(fields) + ('days',), start, end, p) for p in PHASES if p in self.m['phase']}
+
+    def unique(self, fields, start=None, end=None, plane='all'):
+        """区间内各字段的跨日去重人数（草图并集）；没有草图时返回 None"""
+        sketches = self.m.get('sketches')
+        if sketches is None:
+            return None
+        from events_promotion import HyperLogLog
+        i, j = self.span(start, end)
+        dates = [d for d, keep in zip(self.dates[i:j], self._mask(plane)[i:j]) if keep]
+        actions = dict(ROW_FIELDS)
+        return {f: HyperLogLog.union([h for h in (sketches.get((d, actions[f])) for d in dates) if h]).count()
+                for f in fields}
+
+    def query(self, start=None, end=None):
+        """区间查询 API：{dates, days, total, funnel, close, phases}；有草图时另附跨日去重人数 unique"""
+        i, j = self.span(start, end)
+        fields = tuple(f for f, _ in ROW_FIELDS)
+        out = {'dates': [self.dates[i], self.dates[j - 1]] if j > i else [], 'days': j - i,
+               'valid_days': self.days(start, end, 'valid'), 'total': self.totals(fields, start, end),
+               'funnel': self.funnel(start, end), 'close': self.close(start, end),
+               'phases': self.phase_totals(fields, start, end)}
+        unique = self.unique(fields, start, end)
+        if unique is not None:
+            out['unique'] = unique
+        return out
+
+def range_index(m):
+    """m 的 RangeIndex（缓存在 m['index']；refresh_metrics 原地改动 m 时会丢弃）"""
+    idx = m.get('index')
+    if idx is None:
+        idx = m['index'] = RangeIndex(m)
+    return idx
+
+# 长周期图表：超过 CHART_MAX_POINTS 天时由服务端降采样并预生成 path，页面不再逐天建节点
+CHART_MAX_POINTS = 120
+CHART_MAX_LABELS = 16
+TABLE_VIRTUAL_ROWS = 200  # 明细表超过此行数时页面改为虚拟滚动，只渲染可见窗口
+
+def lttb(ys, threshold):
+    """Largest-Triangle-Three-Buckets 降采样（x 为下标、等距）：返回保留点的下标，首尾必留"""
+    n = len(ys)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    out, a = [0], 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        avg_x = (end + nxt_end - 1) / 2
+        avg_y = sum(ys[end:nxt_end]) / (nxt_end - end)
+        ay = ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((a - avg_x) * (ys[j] - ay) - (a - j) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(best)
+        a = best
+    out.append(n - 1)
+    return out
+
+def thin_labels(n, max_labels=CHART_MAX_LABELS):
+    """x 轴标签抽稀：等步长取不超过 max_labels 个下标"""
+    step = max(1, -(-n // max_labels))
+    return list(range(0, n, step))
+
+def _num(v):
+    return ('%.1f' % v).rstrip('0').rstrip('.')
+
+def svg_path(points, base=None):
+    """[(x, y)] → 紧凑 path 数据；给出 base（基线 y）时闭合为面积图"""
+    d = 'M' + 'L'.join(f'{_num(x)},{_num(y)}' for x, y in points)
+    if base is not None and points:
+        d += f'L{_num(points[-1][0])},{_num(base)}L{_num(points[0][0])},{_num(base)}Z'
+    return d
+
+def _phase_bands(phases, x0, width, max_bands=CHART_MAX_POINTS):
+    """连续同阶段的日期合并为背景带 [x, 宽, 阶段]；阶段频繁切换时先按 max_bands 个等宽桶取桶首阶段，带数有上界"""
+    n = len(phases)
+    if n > max_bands:
+        phases = [phases[i * n // max_bands] for i in range(max_bands)]
+    slot_w = width / len(phases)
+    bands, start = [], 0
+    for i in range(1, len(phases) + 1):
+        if i == len(phases) or phases[i] != phases[start]:
+            bands.append([round(x0 + start * slot_w, 1), round((i - start) * slot_w, 1), phases[start]])
+            start = i
+    return bands
+
+def chart_specs(m):
+    """长周期视图的每日趋势图预渲染规格；不超过 CHART_MAX_POINTS 天时返回 None"""
+    n = len(m['dates'])
+    if n <= CHART_MAX_POINTS:
+        return None
+    W, l, r, t, b = 1200, 60, 20, 20, 50
+
+    def series(h, ys, y_max, idx=None):
+        c_h = h - t - b
+        slot = (W - l - r) / len(ys)
+        idx = lttb(ys, CHART_MAX_POINTS) if idx is None else idx
+        return [(l + (i + 0.5) * slot, t + c_h - ys[i] / y_max * c_h) for i in idx]
+
+    def axis(h, dates):
+        slot = (W - l - r) / len(dates)
+        return [[round(l + (i + 0.5) * slot, 1), dates[i][5:]] for i in thin_labels(len(dates))]
+
+    def grid(h, ticks):
+        c_h = h - t - b
+        return [[round(t + c_h * (1 - f), 1), label] for f, label in ticks]
+
+    specs = {}
+    # 流量：start / show 面积 + click×10 折线
+    h = 320
+    y_max = max(max(max(m['start']), max(m['show'])), max(m['click']) * 10) * 1.1 or 1
+    base = h - b
+    specs['traffic'] = {
+        'h': h, 'bands': _phase_bands(m['phase'], l, W - l - r),
+        'grid': grid(h, [(k / 4, f'{y_max * k / 4 / 1000:.0f}K') for k in range(5)]),
+        'paths': [[svg_path(series(h, m['start'], y_max), base), {'fill': '#3b82f6', 'opacity': '0.55'}],
+                  [svg_path(series(h, m['show'], y_max), base), {'fill': '#8b5cf6', 'opacity': '0.55'}],
+                  [svg_path(series(h, [c * 10 for c in m['click']], y_max)),
+                   {'fill': 'none', 'stroke': '#10b981', 'stroke-width': '1.5', 'stroke-linejoin': 'round'}]],
+        'labels': axis(h, m['dates'])}
+    # CTR：面积 + 折线 + 1% 参考线
+    h = 280
+    y_max = max(max(m['ctr']), 3) * 1.2 or 5
+    pts = series(h, m['ctr'], y_max)
+    specs['ctr'] = {
+        'h': h, 'bands': [],
+        'grid': grid(h, [(k / 4, f'{y_max * k / 4:.1f}%') for k in range(5)]),
+        'refs': [[round(t + (h - t - b) * (1 - 1 / y_max), 1), '1%', '#ef4444']],
+        'paths': [[svg_path(pts, h - b), {'fill': '#3b82f6', 'fill-opacity': '0.15'}],
+                  [svg_path(pts), {'fill': 'none', 'stroke': '#3b82f6', 'stroke-width': '1.5', 'stroke-linejoin': 'round'}]],
+        'labels': axis(h, m['dates'])}
+    # 点击→安装：仅有点击的日期；80% / 60% 参考线
+    h = 280
+    keep = [i for i, c in enumerate(m['click']) if c > 0]
+    rates = [m['install_rate'][i] for i in keep]
+    specs['install'] = {
+        'h': h, 'bands': [],
+        'grid': grid(h, [(v / 100, f'{v}%') for v in (0, 25, 50, 75, 100)]),
+        'refs': [[round(t + (h - t - b) * (1 - v / 100), 1), f'{v}%', c] for v, c in ((80, '#10b981'), (60, '#f59e0b'))],
+        'paths': [[svg_path(series(h, rates, 100)), {'fill': 'none', 'stroke': '#10b981', 'stroke-width': '1.5',
+                                                     'stroke-linejoin': 'round'}]] if rates else [],
+        'labels': axis(h, [m['dates'][i] for i in keep]) if rates else []}
+    return specs
+
+def summarize(m, start=None, end=None):
+    """看板汇总：区间合计 + 排除灰测期后的漏斗与关闭行为"""
+    idx = range_index(m)
+    return {
+        'total': idx.totals(('start', 'show', 'click', 'down_end_suc', 'break_count'), start, end),
+        'unique': idx.unique(('start',), start, end),
+        'funnel': (m['ordered_funnel'] if 'ordered_funnel' in m and start is None and end is None else
+                   idx.funnel(start, end)),
+        'close': idx.close(start, end),
     }
 
-    html = f"""<!DOCTYPE html>
+# 看板页面外壳：CSS 与图表 / 表格 JS 均为静态文本，@@name@@ 为渲染时填入的数据槽
+DASHBOARD_TEMPLATE = """<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
 <meta charset="UTF-8">
@@ -239,73 +1453,84 @@ def generate_html(rows, insights, suggestions):
 <link rel="preconnect" href="https://fonts.googleapis.com">
 <link href="https://fonts.googleapis.com/css2?family=IBM+Plex+Mono:wght@400;600&family=Noto+Sans+SC:wght@400;500;700&display=swap" rel="stylesheet">
 <style>
-:root{{
+:root{
   --bg:#07090d;--surface:#0e1117;--surface2:#151820;--border:#1a1f2c;
   --c1:#3b82f6;--c2:#8b5cf6;--c3:#10b981;--c4:#f59e0b;--c5:#ef4444;
   --text:#e2e8f0;--muted:#4b5563;
-}}
-*{{box-sizing:border-box;margin:0;padding:0}}
-body{{background:var(--bg);color:var(--text);font-family:'Noto Sans SC',sans-serif;font-size:14px;line-height:1.6}}
-.mono{{font-family:'IBM Plex Mono',monospace}}
-.container{{max-width:1400px;margin:0 auto;padding:24px 20px}}
+}
+*{box-sizing:border-box;margin:0;padding:0}
+body{background:var(--bg);color:var(--text);font-family:'Noto Sans SC',sans-serif;font-size:14px;line-height:1.6}
+.mono{font-family:'IBM Plex Mono',monospace}
+.container{max-width:1400px;margin:0 auto;padding:24px 20px}
 /* Header */
-.header{{background:var(--surface);border:1px solid var(--border);border-radius:12px;padding:28px 32px;margin-bottom:24px}}
-.header h1{{font-size:22px;font-weight:700;color:var(--text);margin-bottom:6px}}
-.header .sub{{color:var(--muted);font-size:13px;margin-bottom:16px}}
-.header-kpi{{display:flex;gap:32px;flex-wrap:wrap}}
-.header-kpi-item{{display:flex;flex-direction:column;gap:2px}}
-.header-kpi-item .label{{font-size:11px;color:var(--muted);text-transform:uppercase;letter-spacing:.05em}}
-.header-kpi-item .val{{font-size:18px;font-weight:600;font-family:'IBM Plex Mono',monospace}}
+.header{background:var(--surface);border:1px solid var(--border);border-radius:12px;padding:28px 32px;margin-bottom:24px}
+.header h1{font-size:22px;font-weight:700;color:var(--text);margin-bottom:6px}
+.header .sub{color:var(--muted);font-size:13px;margin-bottom:16px}
+.header-kpi{display:flex;gap:32px;flex-wrap:wrap}
+.header-kpi-item{display:flex;flex-direction:column;gap:2px}
+.header-kpi-item .label{font-size:11px;color:var(--muted);text-transform:uppercase;letter-spacing:.05em}
+.header-kpi-item .val{font-size:18px;font-weight:600;font-family:'IBM Plex Mono',monospace}
+.tabs{display:flex;gap:8px;flex-wrap:wrap;margin-bottom:16px}
+.tab{background:var(--surface2);border:1px solid var(--border);border-radius:6px;color:var(--muted);padding:4px 12px;font-size:12px;font-family:'IBM Plex Mono',monospace;cursor:pointer}
+.tab.active{color:var(--text);border-color:var(--c1)}
 /* KPI cards */
-.kpi-grid{{display:grid;grid-template-columns:repeat(5,1fr);gap:16px;margin-bottom:24px}}
-@media(max-width:900px){{.kpi-grid{{grid-template-columns:repeat(3,1fr)}}}}
-.kpi-card{{background:var(--surface);border:1px solid var(--border);border-radius:10px;padding:20px;position:relative;overflow:hidden}}
-.kpi-card::before{{content:'';position:absolute;top:0;left:0;right:0;height:3px}}
-.kpi-card.c1::before{{background:var(--c1)}}
-.kpi-card.c2::before{{background:var(--c2)}}
-.kpi-card.c3::before{{background:var(--c3)}}
-.kpi-card.c4::before{{background:var(--c4)}}
-.kpi-card.c5::before{{background:var(--c5)}}
-.kpi-card .kpi-label{{font-size:12px;color:var(--muted);margin-bottom:8px}}
-.kpi-card .kpi-val{{font-size:28px;font-weight:700;font-family:'IBM Plex Mono',monospace;line-height:1}}
-.kpi-card .kpi-sub{{font-size:11px;color:var(--muted);margin-top:6px}}
+.kpi-grid{display:grid;grid-template-columns:repeat(5,1fr);gap:16px;margin-bottom:24px}
+@media(max-width:900px){.kpi-grid{grid-template-columns:repeat(3,1fr)}}
+.kpi-card{background:var(--surface);border:1px solid var(--border);border-radius:10px;padding:20px;position:relative;overflow:hidden}
+.kpi-card::before{content:'';position:absolute;top:0;left:0;right:0;height:3px}
+.kpi-card.c1::before{background:var(--c1)}
+.kpi-card.c2::before{background:var(--c2)}
+.kpi-card.c3::before{background:var(--c3)}
+.kpi-card.c4::before{background:var(--c4)}
+.kpi-card.c5::before{background:var(--c5)}
+.kpi-card .kpi-label{font-size:12px;color:var(--muted);margin-bottom:8px}
+.kpi-card .kpi-val{font-size:28px;font-weight:700;font-family:'IBM Plex Mono',monospace;line-height:1}
+.kpi-card .kpi-sub{font-size:11px;color:var(--muted);margin-top:6px}
 /* Chart sections */
-.section{{background:var(--surface);border:1px solid var(--border);border-radius:10px;padding:24px;margin-bottom:24px}}
-.section-title{{font-size:15px;font-weight:600;margin-bottom:20px;color:var(--text)}}
-.chart-wrap{{width:100%;overflow-x:auto}}
-svg.chart{{display:block;width:100%;height:auto}}
+.section{background:var(--surface);border:1px solid var(--border);border-radius:10px;padding:24px;margin-bottom:24px}
+.section-title{font-size:15px;font-weight:600;margin-bottom:20px;color:var(--text)}
+.chart-wrap{width:100%;overflow-x:auto}
+svg.chart{display:block;width:100%;height:auto}
 /* Table */
-.tbl-wrap{{overflow-x:auto}}
-table{{width:100%;border-collapse:collapse;font-size:13px}}
-th{{background:var(--surface2);color:var(--muted);font-weight:500;padding:10px 12px;text-align:right;border-bottom:1px solid var(--border);white-space:nowrap}}
-th:first-child{{text-align:left}}
-td{{padding:9px 12px;text-align:right;border-bottom:1px solid var(--border);font-family:'IBM Plex Mono',monospace;font-size:12px}}
-td:first-child{{text-align:left;font-family:'Noto Sans SC',sans-serif;font-size:13px}}
-tr:hover td{{background:var(--surface2)}}
-.badge{{display:inline-block;padding:2px 8px;border-radius:4px;font-size:11px;font-family:'Noto Sans SC',sans-serif;font-weight:500}}
-.ctr-blue{{color:#93c5fd}}.ctr-green{{color:#6ee7b7}}.ctr-amber{{color:#fcd34d}}
-.inst-green{{color:#6ee7b7}}.inst-amber{{color:#fcd34d}}.inst-red{{color:#fca5a5}}
-.brk-red{{color:#fca5a5}}.brk-amber{{color:#fcd34d}}
+.tbl-wrap{overflow-x:auto}
+.tbl-wrap.virtual{max-height:640px;overflow-y:auto}
+.tbl-wrap.virtual th{position:sticky;top:0;z-index:1}
+.tbl-wrap.virtual tr{height:37px}
+.tbl-wrap.virtual td{white-space:nowrap}
+table{width:100%;border-collapse:collapse;font-size:13px}
+th{background:var(--surface2);color:var(--muted);font-weight:500;padding:10px 12px;text-align:right;border-bottom:1px solid var(--border);white-space:nowrap}
+th:first-child{text-align:left}
+td{padding:9px 12px;text-align:right;border-bottom:1px solid var(--border);font-family:'IBM Plex Mono',monospace;font-size:12px}
+td:first-child{text-align:left;font-family:'Noto Sans SC',sans-serif;font-size:13px}
+tr:hover td{background:var(--surface2)}
+.badge{display:inline-block;padding:2px 8px;border-radius:4px;font-size:11px;font-family:'Noto Sans SC',sans-serif;font-weight:500}
+.ctr-blue{color:#93c5fd}.ctr-green{color:#6ee7b7}.ctr-amber{color:#fcd34d}
+.inst-green{color:#6ee7b7}.inst-amber{color:#fcd34d}.inst-red{color:#fca5a5}
+.brk-red{color:#fca5a5}.brk-amber{color:#fcd34d}
 /* Insights */
-.insights-grid{{display:grid;grid-template-columns:repeat(3,1fr);gap:16px;margin-bottom:24px}}
-@media(max-width:900px){{.insights-grid{{grid-template-columns:1fr 1fr}}}}
-.insight-card{{background:var(--surface);border:1px solid var(--border);border-radius:10px;padding:20px;border-left:3px solid}}
-.insight-tag{{font-size:11px;font-weight:600;text-transform:uppercase;letter-spacing:.05em;margin-bottom:8px}}
-.insight-metric{{font-size:32px;font-weight:700;font-family:'IBM Plex Mono',monospace;line-height:1;margin-bottom:8px}}
-.insight-title{{font-size:14px;font-weight:600;margin-bottom:6px}}
-.insight-desc{{font-size:12px;color:var(--muted);line-height:1.7}}
+.insights-grid{display:grid;grid-template-columns:repeat(3,1fr);gap:16px;margin-bottom:24px}
+@media(max-width:900px){.insights-grid{grid-template-columns:1fr 1fr}}
+.insight-card{background:var(--surface);border:1px solid var(--border);border-radius:10px;padding:20px;border-left:3px solid}
+.insight-tag{font-size:11px;font-weight:600;text-transform:uppercase;letter-spacing:.05em;margin-bottom:8px}
+.insight-metric{font-size:32px;font-weight:700;font-family:'IBM Plex Mono',monospace;line-height:1;margin-bottom:8px}
+.insight-title{font-size:14px;font-weight:600;margin-bottom:6px}
+.insight-desc{font-size:12px;color:var(--muted);line-height:1.7}
 /* Suggestions */
-.sugg-list{{display:flex;flex-direction:column;gap:12px}}
-.sugg-item{{background:var(--surface2);border:1px solid var(--border);border-radius:8px;padding:16px 20px;display:flex;gap:16px;align-items:flex-start}}
-.sugg-priority{{font-size:11px;font-weight:700;font-family:'IBM Plex Mono',monospace;padding:3px 8px;border-radius:4px;white-space:nowrap;margin-top:2px}}
-.p0{{background:#3f0f0f;color:#fca5a5}}.p1{{background:#3d2e00;color:#fcd34d}}.p2{{background:#052e16;color:#6ee7b7}}
-.sugg-body .sugg-title{{font-size:14px;font-weight:600;margin-bottom:4px}}
-.sugg-body .sugg-desc{{font-size:12px;color:var(--muted);line-height:1.7}}
+.sugg-list{display:flex;flex-direction:column;gap:12px}
+.sugg-item{background:var(--surface2);border:1px solid var(--border);border-radius:8px;padding:16px 20px;display:flex;gap:16px;align-items:flex-start}
+.sugg-priority{font-size:11px;font-weight:700;font-family:'IBM Plex Mono',monospace;padding:3px 8px;border-radius:4px;white-space:nowrap;margin-top:2px}
+.p0{background:#3f0f0f;color:#fca5a5}.p1{background:#3d2e00;color:#fcd34d}.p2{background:#052e16;color:#6ee7b7}
+.sugg-body .sugg-title{font-size:14px;font-weight:600;margin-bottom:4px}
+.sugg-body .sugg-desc{font-size:12px;color:var(--muted);line-height:1.7}
+/* Range picker */
+.range-picker{display:flex;gap:8px;align-items:center;flex-wrap:wrap;margin:-8px 0 16px;font-size:12px;color:var(--muted)}
+.range-picker input{background:var(--surface2);border:1px solid var(--border);border-radius:6px;color:var(--text);padding:3px 8px;font-family:'IBM Plex Mono',monospace;font-size:12px;color-scheme:dark}
+.range-picker .tab{padding:3px 10px}
 /* Legend */
-.legend{{display:flex;gap:16px;flex-wrap:wrap;margin-bottom:12px;font-size:12px;color:var(--muted)}}
-.legend-item{{display:flex;align-items:center;gap:6px}}
-.legend-dot{{width:10px;height:10px;border-radius:2px}}
-.legend-line{{width:20px;height:2px}}
+.legend{display:flex;gap:16px;flex-wrap:wrap;margin-bottom:12px;font-size:12px;color:var(--muted)}
+.legend-item{display:flex;align-items:center;gap:6px}
+.legend-dot{width:10px;height:10px;border-radius:2px}
+.legend-line{width:20px;height:2px}
 </style>
 </head>
 <body>
@@ -313,44 +1538,11 @@ tr:hover td{{background:var(--surface2)}}
 <!-- Header -->
 <div class="header">
   <h1>推广模块放量数据看板</h1>
-  <div class="sub">数据周期：{date_range} &nbsp;|&nbsp; 生成时间：{__import__('datetime').datetime.now().strftime('%Y-%m-%d %H:%M')}</div>
-  <div class="header-kpi">
-    <div class="header-kpi-item"><span class="label">总启动</span><span class="val mono">{total_start:,}</span></div>
-    <div class="header-kpi-item"><span class="label">总展示</span><span class="val mono">{total_show:,}</span></div>
-    <div class="header-kpi-item"><span class="label">总点击</span><span class="val mono">{total_click:,}</span></div>
-    <div class="header-kpi-item"><span class="label">总安装</span><span class="val mono">{total_install:,}</span></div>
-    <div class="header-kpi-item"><span class="label">整体CTR</span><span class="val mono">{pct(total_click,total_show)}</span></div>
-    <div class="header-kpi-item"><span class="label">点击→安装</span><span class="val mono">{pct(total_install,total_click)}</span></div>
-  </div>
+  <div class="sub">数据周期：@@date_range@@ &nbsp;|&nbsp; 生成时间：@@generated_at@@</div>
+@@tabs@@@@header_kpi_html@@
 </div>
 <!-- KPI Cards -->
-<div class="kpi-grid">
-  <div class="kpi-card c1">
-    <div class="kpi-label">总启动 start</div>
-    <div class="kpi-val">{total_start:,}</div>
-    <div class="kpi-sub">全周期累计用户</div>
-  </div>
-  <div class="kpi-card c2">
-    <div class="kpi-label">总展示 pop_show</div>
-    <div class="kpi-val">{total_show:,}</div>
-    <div class="kpi-sub">展示率 {pct(total_show,total_start)}</div>
-  </div>
-  <div class="kpi-card c3">
-    <div class="kpi-label">总点击 pop_click</div>
-    <div class="kpi-val">{total_click:,}</div>
-    <div class="kpi-sub">CTR {pct(total_click,total_show)}</div>
-  </div>
-  <div class="kpi-card c4">
-    <div class="kpi-label">总安装 down_end_suc</div>
-    <div class="kpi-val">{total_install:,}</div>
-    <div class="kpi-sub">点击→安装 {pct(total_install,total_click)}</div>
-  </div>
-  <div class="kpi-card c5">
-    <div class="kpi-label">总 break</div>
-    <div class="kpi-val">{total_brk:,}</div>
-    <div class="kpi-sub">break率 {pct(total_brk,total_start)}</div>
-  </div>
-</div>
+@@kpi_grid_html@@
 <!-- Daily Traffic Trend -->
 <div class="section">
   <div class="section-title">每日流量趋势</div>
@@ -384,6 +1576,12 @@ tr:hover td{{background:var(--surface2)}}
 <!-- Funnel -->
 <div class="section">
   <div class="section-title">全周期汇总漏斗（排除灰测期）</div>
+  <div class="range-picker">
+    <span>统计区间</span>
+    <input type="date" id="range-start" onchange="applyRange()"> ~ <input type="date" id="range-end" onchange="applyRange()">
+    <button class="tab" onclick="resetRange()">全周期</button>
+    <span id="range-note"></span>
+  </div>
   <div class="chart-wrap"><svg id="chart-funnel" class="chart" viewBox="0 0 1200 340"></svg></div>
 </div>
 <!-- Close Behavior -->
@@ -391,10 +1589,21 @@ tr:hover td{{background:var(--surface2)}}
   <div class="section-title">弹窗关闭行为分布（排除灰测期）</div>
   <div class="chart-wrap"><svg id="chart-close" class="chart" viewBox="0 0 1200 220"></svg></div>
 </div>
+<!-- Latency Quantiles -->
+<div class="section" id="latency-section" style="display:none">
+  <div class="section-title">事件间隔时延分位（秒，t-digest）</div>
+  <div class="tbl-wrap">
+    <table>
+      <thead><tr><th>间隔</th><th>样本数</th><th>p50</th><th>p90</th><th>p99</th></tr></thead>
+      <tbody id="latency-body"></tbody>
+    </table>
+  </div>
+  <div class="chart-wrap"><svg id="chart-latency" class="chart" viewBox="0 0 1200 260"></svg></div>
+</div>
 <!-- Data Table -->
 <div class="section">
   <div class="section-title">每日明细数据</div>
-  <div class="tbl-wrap">
+  <div class="tbl-wrap" id="table-wrap">
     <table id="detail-table">
       <thead><tr>
         <th>日期</th><th>start</th><th>pop_show</th><th>展示率</th>
@@ -415,100 +1624,137 @@ tr:hover td{{background:var(--surface2)}}
 </div>
 </div><!-- /container -->
 <script>
-const ROWS = {rows_json};
-const INSIGHTS = {insights_json};
-const SUGGESTIONS = {suggestions_json};
+const VIEWS = @@views_json@@;
+let ROWS, INSIGHTS, SUGGESTIONS, FUNNEL, CLOSE, CHARTS, ORDERED, LATENCY;
 
-const PHASE_COLORS = {{
-  '灰测期':  {{badge:'#6b7280', bg:'#1f2937'}},
-  '灰度扩量':{{badge:'#3b82f6', bg:'#1e3a5f'}},
-  '稳定期':  {{badge:'#f59e0b', bg:'#3d2e00'}},
-  '正式放量':{{badge:'#10b981', bg:'#052e16'}},
-}};
+const PHASE_COLORS = {
+  '灰测期':  {badge:'#6b7280', bg:'#1f2937'},
+  '灰度扩量':{badge:'#3b82f6', bg:'#1e3a5f'},
+  '稳定期':  {badge:'#f59e0b', bg:'#3d2e00'},
+  '正式放量':{badge:'#10b981', bg:'#052e16'},
+};
 
 // ── helpers ──────────────────────────────────────────────
-function fmt(n){{ return n==null||n===''?'-':Number(n).toLocaleString(); }}
-function pct(a,b){{ return b?((a/b)*100).toFixed(1)+'%':'-'; }}
-function clamp(v,lo,hi){{ return Math.max(lo,Math.min(hi,v)); }}
+function fmt(n){ return n==null||n===''?'-':Number(n).toLocaleString(); }
+function pct(a,b){ return b?((a/b)*100).toFixed(1)+'%':'-'; }
+function clamp(v,lo,hi){ return Math.max(lo,Math.min(hi,v)); }
 
 // ── Table ─────────────────────────────────────────────────
-(function buildTable(){{
-  const tbody = document.getElementById('table-body');
-  ROWS.forEach(r=>{{
-    const pc = PHASE_COLORS[r.phase]||{{badge:'#6b7280',bg:'#1f2937'}};
-    const ctrVal = r.ctr;
-    const ctrCls = ctrVal>2?'ctr-blue':ctrVal>=1?'ctr-green':'ctr-amber';
-    const instVal = r.install_rate;
-    const instCls = instVal>=80?'inst-green':instVal>=60?'inst-amber':'inst-red';
-    const brkVal = r.brk_rate;
-    const brkCls = brkVal>20?'brk-red':brkVal>15?'brk-amber':'';
-    const isGray = r.phase==='灰测期';
-    tbody.innerHTML += `<tr style="${{isGray?'opacity:.55':''}}">
-      <td>${{r.date}}</td>
-      <td>${{fmt(r.start)}}</td>
-      <td>${{fmt(r.show)}}</td>
-      <td>${{r.show_rate}}%</td>
-      <td>${{fmt(r.click)}}</td>
-      <td class="${{ctrCls}}">${{r.ctr}}%${{isGray?' <span style="font-size:10px;color:#6b7280">[灰测]</span>':''}}</td>
-      <td>${{fmt(r.down_end_suc)}}</td>
-      <td class="${{instCls}}">${{r.click>0?r.install_rate+'%':'-'}}</td>
-      <td>${{fmt(r.break_count)}}</td>
-      <td class="${{brkCls}}">${{r.brk_rate}}%</td>
-      <td><span class="badge" style="background:${{pc.bg}};color:${{pc.badge}}">${{r.phase}}</span></td>
+// One parse per build: rows are joined into a single string. Past TABLE_VIRTUAL_ROWS
+// only the visible window (+overscan) is in the DOM; spacer rows keep the scrollbar honest.
+const TABLE_VIRTUAL_ROWS=@@table_virtual_rows@@, ROW_H=37, OVERSCAN=10;
+let tableFrame=0;
+function rowHtml(r){
+  const pc = PHASE_COLORS[r.phase]||{badge:'#6b7280',bg:'#1f2937'};
+  const ctrVal = r.ctr;
+  const ctrCls = ctrVal>2?'ctr-blue':ctrVal>=1?'ctr-green':'ctr-amber';
+  const instVal = r.install_rate;
+  const instCls = instVal>=80?'inst-green':instVal>=60?'inst-amber':'inst-red';
+  const brkVal = r.brk_rate;
+  const brkCls = brkVal>20?'brk-red':brkVal>15?'brk-amber':'';
+  const isGray = r.phase==='灰测期';
+  return `<tr style="${isGray?'opacity:.55':''}">
+      <td>${r.date}</td>
+      <td>${fmt(r.start)}</td>
+      <td>${fmt(r.show)}</td>
+      <td>${r.show_rate}%</td>
+      <td>${fmt(r.click)}</td>
+      <td class="${ctrCls}">${r.ctr}%${isGray?' <span style="font-size:10px;color:#6b7280">[灰测]</span>':''}</td>
+      <td>${fmt(r.down_end_suc)}</td>
+      <td class="${instCls}">${r.click>0?r.install_rate+'%':'-'}</td>
+      <td>${fmt(r.break_count)}</td>
+      <td class="${brkCls}">${r.brk_rate}%</td>
+      <td><span class="badge" style="background:${pc.bg};color:${pc.badge}">${r.phase}</span></td>
     </tr>`;
-  }});
-}})();
+}
+function renderTableWindow(){
+  tableFrame=0;
+  const wrap=document.getElementById('table-wrap'), tbody=document.getElementById('table-body');
+  const n=ROWS.length, h=wrap.clientHeight||640;
+  const first=Math.max(0, Math.floor((wrap.scrollTop||0)/ROW_H)-OVERSCAN);
+  const last=Math.min(n, first+Math.ceil(h/ROW_H)+2*OVERSCAN);
+  tbody.innerHTML = `<tr class="spacer" style="height:${first*ROW_H}px"></tr>`
+    + ROWS.slice(first,last).map(rowHtml).join('')
+    + `<tr class="spacer" style="height:${(n-last)*ROW_H}px"></tr>`;
+}
+function buildTable(){
+  const wrap=document.getElementById('table-wrap'), tbody=document.getElementById('table-body');
+  const virtual=ROWS.length>TABLE_VIRTUAL_ROWS;
+  wrap.classList.toggle('virtual', virtual);
+  wrap.onscroll = virtual ? ()=>{ if(!tableFrame) tableFrame=requestAnimationFrame(renderTableWindow); } : null;
+  if(!virtual){ tbody.innerHTML = ROWS.map(rowHtml).join(''); return; }
+  wrap.scrollTop=0;
+  renderTableWindow();
+}
 
 // ── Insights ──────────────────────────────────────────────
-(function buildInsights(){{
+function buildInsights(){
   const grid = document.getElementById('insights-grid');
-  if(!INSIGHTS.length){{ grid.innerHTML='<p style="color:var(--muted)">暂无洞察数据</p>'; return; }}
-  INSIGHTS.forEach(ins=>{{
-    grid.innerHTML += `<div class="insight-card" style="border-left-color:${{ins.color}}">
-      <div class="insight-tag" style="color:${{ins.color}}">${{ins.tag}}</div>
-      <div class="insight-metric" style="color:${{ins.color}}">${{ins.metric}}</div>
-      <div class="insight-title">${{ins.title}}</div>
-      <div class="insight-desc">${{ins.desc}}</div>
-    </div>`;
-  }});
-}})();
+  if(!INSIGHTS.length){ grid.innerHTML='<p style="color:var(--muted)">暂无洞察数据</p>'; return; }
+  grid.innerHTML = INSIGHTS.map(ins=>`<div class="insight-card" style="border-left-color:${ins.color}">
+      <div class="insight-tag" style="color:${ins.color}">${ins.tag}</div>
+      <div class="insight-metric" style="color:${ins.color}">${ins.metric}</div>
+      <div class="insight-title">${ins.title}</div>
+      <div class="insight-desc">${ins.desc}</div>
+    </div>`).join('');
+}
 
 // ── Suggestions ───────────────────────────────────────────
-(function buildSugg(){{
+function buildSugg(){
   const list = document.getElementById('sugg-list');
-  SUGGESTIONS.forEach(s=>{{
+  list.innerHTML = SUGGESTIONS.map(s=>{
     const cls = s.priority==='P0'?'p0':s.priority==='P1'?'p1':'p2';
-    list.innerHTML += `<div class="sugg-item">
-      <span class="sugg-priority ${{cls}}">${{s.priority}}</span>
+    return `<div class="sugg-item">
+      <span class="sugg-priority ${cls}">${s.priority}</span>
       <div class="sugg-body">
-        <div class="sugg-title">${{s.title}}</div>
-        <div class="sugg-desc">${{s.desc}}</div>
+        <div class="sugg-title">${s.title}</div>
+        <div class="sugg-desc">${s.desc}</div>
       </div>
     </div>`;
-  }});
-}})();
+  }).join('');
+}
 </script>
 <script>
 // ── SVG utils ─────────────────────────────────────────────
-function svgEl(tag, attrs){{
+function svgEl(tag, attrs){
   const el = document.createElementNS('http://www.w3.org/2000/svg', tag);
-  Object.entries(attrs||{{}}).forEach(([k,v])=>el.setAttribute(k,v));
+  Object.entries(attrs||{}).forEach(([k,v])=>el.setAttribute(k,v));
   return el;
-}}
-function svgText(svg, x, y, txt, attrs){{
-  const el = svgEl('text', Object.assign({{x,y,'text-anchor':'middle','dominant-baseline':'middle',fill:'#4b5563','font-size':'11','font-family':'IBM Plex Mono,monospace'}}, attrs));
+}
+function svgText(svg, x, y, txt, attrs){
+  const el = svgEl('text', Object.assign({x,y,'text-anchor':'middle','dominant-baseline':'middle',fill:'#4b5563','font-size':'11','font-family':'IBM Plex Mono,monospace'}, attrs));
   el.textContent = txt;
   svg.appendChild(el);
   return el;
-}}
-function svgLine(svg, x1,y1,x2,y2, attrs){{
-  svg.appendChild(svgEl('line', Object.assign({{x1,y1,x2,y2,stroke:'#1a1f2c'}}, attrs)));
-}}
+}
+function svgLine(svg, x1,y1,x2,y2, attrs){
+  svg.appendChild(svgEl('line', Object.assign({x1,y1,x2,y2,stroke:'#1a1f2c'}, attrs)));
+}
+
+// ── Dense series: server-side downsampled paths ─────────
+// Long ranges ship precomputed path data + thinned labels, so node count stays bounded
+function drawDense(svg, C){
+  const W=1200, PAD={l:60,r:20,t:20,b:50}, cH=C.h-PAD.t-PAD.b;
+  C.bands.forEach(([x,w,phase])=>svg.appendChild(svgEl('rect',{x,y:PAD.t,width:w,height:cH,
+    fill:(PHASE_COLORS[phase]||{bg:'#1f2937'}).bg,opacity:'0.35'})));
+  C.grid.forEach(([yv,label])=>{
+    svgLine(svg,PAD.l,yv,W-PAD.r,yv,{stroke:'#1a1f2c','stroke-dasharray':'3,3'});
+    svgText(svg,PAD.l-8,yv,label,{'text-anchor':'end','dominant-baseline':'middle',fill:'#4b5563','font-size':'10'});
+  });
+  (C.refs||[]).forEach(([yv,label,color])=>{
+    svgLine(svg,PAD.l,yv,W-PAD.r,yv,{stroke:color,'stroke-dasharray':'6,4','stroke-width':'1.5'});
+    svgText(svg,W-PAD.r+2,yv,label,{'text-anchor':'start',fill:color,'font-size':'10','dominant-baseline':'middle'});
+  });
+  C.paths.forEach(([d,attrs])=>svg.appendChild(svgEl('path',Object.assign({d},attrs))));
+  C.labels.forEach(([x,label])=>svgText(svg,x,C.h-PAD.b+16,label,{'font-size':'10',fill:'#4b5563'}));
+}
 
 // ── Chart 1: Daily Traffic (bar+line) ────────────────────
-(function drawTraffic(){{
+function drawTraffic(){
   const svg = document.getElementById('chart-traffic');
-  const W=1200, H=320, PAD={{l:60,r:20,t:20,b:50}};
+  svg.innerHTML='';
+  if(CHARTS) return drawDense(svg, CHARTS.traffic);
+  const W=1200, H=320, PAD={l:60,r:20,t:20,b:50};
   const cW=W-PAD.l-PAD.r, cH=H-PAD.t-PAD.b;
   const n=ROWS.length; if(!n) return;
 
@@ -524,64 +1770,66 @@ function svgLine(svg, x1,y1,x2,y2, attrs){{
 
   // Phase background bands
   let phaseStart=0, curPhase=ROWS[0].phase;
-  const drawBand=(from,to,phase)=>{{
-    const pc=PHASE_COLORS[phase]||{{bg:'#1f2937'}};
+  const drawBand=(from,to,phase)=>{
+    const pc=PHASE_COLORS[phase]||{bg:'#1f2937'};
     const rx=PAD.l+from*slotW, rw=(to-from)*slotW;
-    const rect=svgEl('rect',{{x:rx,y:PAD.t,width:rw,height:cH,fill:pc.bg,opacity:'0.35'}});
+    const rect=svgEl('rect',{x:rx,y:PAD.t,width:rw,height:cH,fill:pc.bg,opacity:'0.35'});
     svg.appendChild(rect);
-  }};
-  ROWS.forEach((r,i)=>{{
-    if(r.phase!==curPhase||i===n-1){{
+  };
+  ROWS.forEach((r,i)=>{
+    if(r.phase!==curPhase||i===n-1){
       drawBand(phaseStart, i===n-1?n:i, curPhase);
       phaseStart=i; curPhase=r.phase;
-    }}
-  }});
+    }
+  });
 
   // Y grid lines
-  for(let t=0;t<=4;t++){{
+  for(let t=0;t<=4;t++){
     const yv=PAD.t+cH*(1-t/4);
-    svgLine(svg,PAD.l,yv,W-PAD.r,yv,{{stroke:'#1a1f2c','stroke-dasharray':'3,3'}});
+    svgLine(svg,PAD.l,yv,W-PAD.r,yv,{stroke:'#1a1f2c','stroke-dasharray':'3,3'});
     const label=((yMax*t/4)/1000).toFixed(0)+'K';
-    svgText(svg,PAD.l-8,yv,label,{{'text-anchor':'end','dominant-baseline':'middle',fill:'#4b5563','font-size':'10'}});
-  }}
+    svgText(svg,PAD.l-8,yv,label,{'text-anchor':'end','dominant-baseline':'middle',fill:'#4b5563','font-size':'10'});
+  }
 
   // Bars: start (blue) + show (purple)
-  ROWS.forEach((r,i)=>{{
+  ROWS.forEach((r,i)=>{
     const cx=xMid(i);
     const isGray=r.phase==='灰测期';
     // start bar
     const sh=Math.max(1,(r.start/yMax)*cH);
-    const sb=svgEl('rect',{{x:cx-barW-1,y:y(r.start),width:barW,height:sh,fill:'#3b82f6',opacity:isGray?'0.4':'0.85',rx:'2'}});
+    const sb=svgEl('rect',{x:cx-barW-1,y:y(r.start),width:barW,height:sh,fill:'#3b82f6',opacity:isGray?'0.4':'0.85',rx:'2'});
     svg.appendChild(sb);
     // show bar
     const shh=Math.max(1,(r.show/yMax)*cH);
-    const shb=svgEl('rect',{{x:cx+1,y:y(r.show),width:barW,height:shh,fill:'#8b5cf6',opacity:isGray?'0.4':'0.85',rx:'2'}});
+    const shb=svgEl('rect',{x:cx+1,y:y(r.show),width:barW,height:shh,fill:'#8b5cf6',opacity:isGray?'0.4':'0.85',rx:'2'});
     svg.appendChild(shb);
-  }});
+  });
 
   // Click line (scaled)
-  const pts=ROWS.map((r,i)=>`${{xMid(i)}},${{y(r.click*clickScale)}}`).join(' ');
-  const polyline=svgEl('polyline',{{points:pts,fill:'none',stroke:'#10b981','stroke-width':'2','stroke-linejoin':'round'}});
+  const pts=ROWS.map((r,i)=>`${xMid(i)},${y(r.click*clickScale)}`).join(' ');
+  const polyline=svgEl('polyline',{points:pts,fill:'none',stroke:'#10b981','stroke-width':'2','stroke-linejoin':'round'});
   svg.appendChild(polyline);
-  ROWS.forEach((r,i)=>{{
+  ROWS.forEach((r,i)=>{
     const isGray=r.phase==='灰测期';
     const cx=xMid(i), cy=y(r.click*clickScale);
-    const dot=svgEl('circle',{{cx,cy,r:'3',fill:isGray?'none':'#10b981',stroke:'#10b981','stroke-width':'1.5'}});
+    const dot=svgEl('circle',{cx,cy,r:'3',fill:isGray?'none':'#10b981',stroke:'#10b981','stroke-width':'1.5'});
     svg.appendChild(dot);
-  }});
+  });
 
   // X axis labels
-  ROWS.forEach((r,i)=>{{
+  ROWS.forEach((r,i)=>{
     const cx=xMid(i);
     const lbl=r.date.slice(5); // MM-DD
-    svgText(svg,cx,H-PAD.b+16,lbl,{{'font-size':'10',fill:'#4b5563'}});
-  }});
-}})();
+    svgText(svg,cx,H-PAD.b+16,lbl,{'font-size':'10',fill:'#4b5563'});
+  });
+}
 
 // ── Chart 2: CTR trend (area line) ───────────────────────
-(function drawCTR(){{
+function drawCTR(){
   const svg = document.getElementById('chart-ctr');
-  const W=1200,H=280,PAD={{l:60,r:20,t:20,b:50}};
+  svg.innerHTML='';
+  if(CHARTS) return drawDense(svg, CHARTS.ctr);
+  const W=1200,H=280,PAD={l:60,r:20,t:20,b:50};
   const cW=W-PAD.l-PAD.r, cH=H-PAD.t-PAD.b;
   const n=ROWS.length; if(!n) return;
 
@@ -590,49 +1838,51 @@ function svgLine(svg, x1,y1,x2,y2, attrs){{
   const xMid=i=>PAD.l+(i+0.5)*(cW/n);
 
   // Y grid
-  for(let t=0;t<=4;t++){{
+  for(let t=0;t<=4;t++){
     const yv=PAD.t+cH*(1-t/4);
-    svgLine(svg,PAD.l,yv,W-PAD.r,yv,{{stroke:'#1a1f2c','stroke-dasharray':'3,3'}});
-    svgText(svg,PAD.l-8,yv,(maxCTR*t/4).toFixed(1)+'%',{{'text-anchor':'end','dominant-baseline':'middle',fill:'#4b5563','font-size':'10'}});
-  }}
+    svgLine(svg,PAD.l,yv,W-PAD.r,yv,{stroke:'#1a1f2c','stroke-dasharray':'3,3'});
+    svgText(svg,PAD.l-8,yv,(maxCTR*t/4).toFixed(1)+'%',{'text-anchor':'end','dominant-baseline':'middle',fill:'#4b5563','font-size':'10'});
+  }
 
   // 1% reference line
   const ref1y=y(1);
-  svgLine(svg,PAD.l,ref1y,W-PAD.r,ref1y,{{stroke:'#ef4444','stroke-dasharray':'6,4','stroke-width':'1.5'}});
-  svgText(svg,W-PAD.r+2,ref1y,'1%',{{'text-anchor':'start',fill:'#ef4444','font-size':'10','dominant-baseline':'middle'}});
+  svgLine(svg,PAD.l,ref1y,W-PAD.r,ref1y,{stroke:'#ef4444','stroke-dasharray':'6,4','stroke-width':'1.5'});
+  svgText(svg,W-PAD.r+2,ref1y,'1%',{'text-anchor':'start',fill:'#ef4444','font-size':'10','dominant-baseline':'middle'});
 
   // Area fill
-  const pts=ROWS.map((r,i)=>`${{xMid(i)}},${{y(r.ctr)}}`).join(' ');
-  const areaPath=`M${{xMid(0)}},${{PAD.t+cH}} L${{pts.split(' ').join(' L')}} L${{xMid(n-1)}},${{PAD.t+cH}} Z`;
-  const grad=svgEl('defs',{{}});
+  const pts=ROWS.map((r,i)=>`${xMid(i)},${y(r.ctr)}`).join(' ');
+  const areaPath=`M${xMid(0)},${PAD.t+cH} L${pts.split(' ').join(' L')} L${xMid(n-1)},${PAD.t+cH} Z`;
+  const grad=svgEl('defs',{});
   grad.innerHTML=`<linearGradient id="ctrGrad" x1="0" y1="0" x2="0" y2="1"><stop offset="0%" stop-color="#3b82f6" stop-opacity="0.3"/><stop offset="100%" stop-color="#3b82f6" stop-opacity="0.02"/></linearGradient>`;
   svg.appendChild(grad);
-  svg.appendChild(svgEl('path',{{d:areaPath,fill:'url(#ctrGrad)'}}));
+  svg.appendChild(svgEl('path',{d:areaPath,fill:'url(#ctrGrad)'}));
 
   // Line
   const isGrayArr=ROWS.map(r=>r.phase==='灰测期');
-  for(let i=0;i<n-1;i++){{
+  for(let i=0;i<n-1;i++){
     const x1=xMid(i),y1=y(ROWS[i].ctr),x2=xMid(i+1),y2=y(ROWS[i+1].ctr);
-    svg.appendChild(svgEl('line',{{x1,y1,x2,y2,stroke:'#3b82f6','stroke-width':'2',
-      'stroke-dasharray':isGrayArr[i]?'4,3':'none'}}));
-  }}
+    svg.appendChild(svgEl('line',{x1,y1,x2,y2,stroke:'#3b82f6','stroke-width':'2',
+      'stroke-dasharray':isGrayArr[i]?'4,3':'none'}));
+  }
 
   // Points + labels
-  ROWS.forEach((r,i)=>{{
+  ROWS.forEach((r,i)=>{
     const cx=xMid(i),cy=y(r.ctr);
     const isGray=r.phase==='灰测期';
-    svg.appendChild(svgEl('circle',{{cx,cy,r:'4',fill:isGray?'none':'#3b82f6',stroke:'#3b82f6','stroke-width':'2'}}));
-    svgText(svg,cx,cy-12,r.ctr+'%',{{'font-size':'10',fill:isGray?'#4b5563':'#93c5fd','font-weight':'600'}});
-  }});
+    svg.appendChild(svgEl('circle',{cx,cy,r:'4',fill:isGray?'none':'#3b82f6',stroke:'#3b82f6','stroke-width':'2'}));
+    svgText(svg,cx,cy-12,r.ctr+'%',{'font-size':'10',fill:isGray?'#4b5563':'#93c5fd','font-weight':'600'});
+  });
 
   // X labels
-  ROWS.forEach((r,i)=>svgText(svg,xMid(i),H-PAD.b+16,r.date.slice(5),{{'font-size':'10',fill:'#4b5563'}}));
-}})();
+  ROWS.forEach((r,i)=>svgText(svg,xMid(i),H-PAD.b+16,r.date.slice(5),{'font-size':'10',fill:'#4b5563'}));
+}
 
 // ── Chart 3: Install rate bars ────────────────────────────
-(function drawInstall(){{
+function drawInstall(){
   const svg=document.getElementById('chart-install');
-  const W=1200,H=280,PAD={{l:60,r:20,t:20,b:50}};
+  svg.innerHTML='';
+  if(CHARTS) return drawDense(svg, CHARTS.install);
+  const W=1200,H=280,PAD={l:60,r:20,t:20,b:50};
   const cW=W-PAD.l-PAD.r,cH=H-PAD.t-PAD.b;
   const data=ROWS.filter(r=>r.click>0);
   const n=data.length; if(!n) return;
@@ -641,99 +1891,484 @@ function svgLine(svg, x1,y1,x2,y2, attrs){{
   const xMid=i=>PAD.l+(i+0.5)*slotW;
 
   // Y grid
-  [0,25,50,75,100].forEach(t=>{{
+  [0,25,50,75,100].forEach(t=>{
     const yv=y(t);
-    svgLine(svg,PAD.l,yv,W-PAD.r,yv,{{stroke:'#1a1f2c','stroke-dasharray':'3,3'}});
-    svgText(svg,PAD.l-8,yv,t+'%',{{'text-anchor':'end','dominant-baseline':'middle',fill:'#4b5563','font-size':'10'}});
-  }});
+    svgLine(svg,PAD.l,yv,W-PAD.r,yv,{stroke:'#1a1f2c','stroke-dasharray':'3,3'});
+    svgText(svg,PAD.l-8,yv,t+'%',{'text-anchor':'end','dominant-baseline':'middle',fill:'#4b5563','font-size':'10'});
+  });
 
-  data.forEach((r,i)=>{{
+  data.forEach((r,i)=>{
     const v=r.install_rate;
     const color=v>=80?'#10b981':v>=60?'#f59e0b':'#ef4444';
     const bh=Math.max(2,(v/100)*cH);
     const cx=xMid(i);
-    svg.appendChild(svgEl('rect',{{x:cx-barW/2,y:y(v),width:barW,height:bh,fill:color,opacity:'0.85',rx:'2'}}));
-    svgText(svg,cx,y(v)-8,v+'%',{{'font-size':'10',fill:color,'font-weight':'600'}});
-    svgText(svg,cx,H-PAD.b+16,r.date.slice(5),{{'font-size':'10',fill:'#4b5563'}});
-  }});
-}})();
-</script>
+    svg.appendChild(svgEl('rect',{x:cx-barW/2,y:y(v),width:barW,height:bh,fill:color,opacity:'0.85',rx:'2'}));
+    svgText(svg,cx,y(v)-8,v+'%',{'font-size':'10',fill:color,'font-weight':'600'});
+    svgText(svg,cx,H-PAD.b+16,r.date.slice(5),{'font-size':'10',fill:'#4b5563'});
+  });
+}
+
 // ── Chart 4: Funnel (horizontal bars) ────────────────────
-(function drawFunnel(){{
+function drawFunnel(){
   const svg=document.getElementById('chart-funnel');
-  const W=1200,H=340,PAD={{l:120,r:160,t:20,b:20}};
+  svg.innerHTML='';
+  const W=1200,H=340,PAD={l:120,r:160,t:20,b:20};
   const cW=W-PAD.l-PAD.r, cH=H-PAD.t-PAD.b;
 
-  const steps=[
-    {{label:'start',       val:{f_start}}},
-    {{label:'trigger',     val:{f_trigger}}},
-    {{label:'pop_show',    val:{f_show}}},
-    {{label:'pop_click',   val:{f_click}}},
-    {{label:'down_start',  val:{f_ds}}},
-    {{label:'down_suc',    val:{f_dsuc}}},
-    {{label:'down_end_suc',val:{f_desuc}}},
-  ];
+  const steps=['start','trigger','pop_show','pop_click','down_start','down_suc','down_end_suc']
+    .map((label,i)=>({label,val:FUNNEL[i]}));
   const colors=['#3b82f6','#6366f1','#8b5cf6','#10b981','#f59e0b','#f97316','#ef4444'];
   const maxVal=steps[0].val||1;
   const rowH=cH/steps.length;
 
-  steps.forEach((s,i)=>{{
+  steps.forEach((s,i)=>{
     const barW=Math.max(2,(s.val/maxVal)*cW);
     const ry=PAD.t+i*rowH+rowH*0.15;
     const bh=rowH*0.55;
-    svg.appendChild(svgEl('rect',{{x:PAD.l,y:ry,width:barW,height:bh,fill:colors[i],rx:'3',opacity:'0.85'}}));
+    svg.appendChild(svgEl('rect',{x:PAD.l,y:ry,width:barW,height:bh,fill:colors[i],rx:'3',opacity:'0.85'}));
     // label left
-    svgText(svg,PAD.l-6,ry+bh/2,s.label,{{'text-anchor':'end','dominant-baseline':'middle',fill:'#e2e8f0','font-size':'12','font-family':'IBM Plex Mono,monospace'}});
+    svgText(svg,PAD.l-6,ry+bh/2,s.label,{'text-anchor':'end','dominant-baseline':'middle',fill:'#e2e8f0','font-size':'12','font-family':'IBM Plex Mono,monospace'});
     // value right
-    svgText(svg,PAD.l+barW+8,ry+bh/2,s.val.toLocaleString(),{{'text-anchor':'start','dominant-baseline':'middle',fill:'#e2e8f0','font-size':'12','font-family':'IBM Plex Mono,monospace'}});
+    svgText(svg,PAD.l+barW+8,ry+bh/2,s.val.toLocaleString(),{'text-anchor':'start','dominant-baseline':'middle',fill:'#e2e8f0','font-size':'12','font-family':'IBM Plex Mono,monospace'});
     // conversion rate between steps
-    if(i>0){{
+    if(i>0){
       const prev=steps[i-1].val;
       const rate=prev?((s.val/prev)*100).toFixed(1)+'%':'-';
       const isBottleneck=(i===3); // pop_click is biggest bottleneck
-      svgText(svg,W-PAD.r+60,ry-rowH*0.15,'↓ '+rate,{{'text-anchor':'middle','dominant-baseline':'middle',fill:isBottleneck?'#ef4444':'#4b5563','font-size':'11','font-weight':isBottleneck?'700':'400','font-family':'IBM Plex Mono,monospace'}});
-    }}
-  }});
-}})();
+      svgText(svg,W-PAD.r+60,ry-rowH*0.15,'↓ '+rate,{'text-anchor':'middle','dominant-baseline':'middle',fill:isBottleneck?'#ef4444':'#4b5563','font-size':'11','font-weight':isBottleneck?'700':'400','font-family':'IBM Plex Mono,monospace'});
+    }
+  });
+}
 
 // ── Chart 5: Close behavior (horizontal bars) ────────────
-(function drawClose(){{
+function drawClose(){
   const svg=document.getElementById('chart-close');
-  const W=1200,H=220,PAD={{l:140,r:160,t:20,b:20}};
+  svg.innerHTML='';
+  const W=1200,H=220,PAD={l:140,r:160,t:20,b:20};
   const cW=W-PAD.l-PAD.r, cH=H-PAD.t-PAD.b;
 
   const items=[
-    {{label:'pop_close（主动关闭）',  val:{f_close},  color:'#8b5cf6'}},
-    {{label:'kk_pop_timeout（超时）', val:{f_timeout}, color:'#f59e0b'}},
-    {{label:'pop_notips（不再提示）', val:{f_notips},  color:'#ef4444'}},
-    {{label:'pop_click（点击）',      val:{f_bclick},  color:'#10b981'}},
-  ];
+    {label:'pop_close（主动关闭）',  color:'#8b5cf6'},
+    {label:'kk_pop_timeout（超时）', color:'#f59e0b'},
+    {label:'pop_notips（不再提示）', color:'#ef4444'},
+    {label:'pop_click（点击）',      color:'#10b981'},
+  ].map((it,i)=>Object.assign(it,{val:CLOSE[i]}));
   const maxVal=Math.max(...items.map(it=>it.val))||1;
   const rowH=cH/items.length;
 
-  items.forEach((it,i)=>{{
+  items.forEach((it,i)=>{
     const barW=Math.max(2,(it.val/maxVal)*cW);
     const ry=PAD.t+i*rowH+rowH*0.15;
     const bh=rowH*0.55;
-    svg.appendChild(svgEl('rect',{{x:PAD.l,y:ry,width:barW,height:bh,fill:it.color,rx:'3',opacity:'0.85'}}));
-    svgText(svg,PAD.l-6,ry+bh/2,it.label,{{'text-anchor':'end','dominant-baseline':'middle',fill:'#e2e8f0','font-size':'12','font-family':'Noto Sans SC,sans-serif'}});
-    svgText(svg,PAD.l+barW+8,ry+bh/2,it.val.toLocaleString(),{{'text-anchor':'start','dominant-baseline':'middle',fill:'#e2e8f0','font-size':'12','font-family':'IBM Plex Mono,monospace'}});
-  }});
-}})();
+    svg.appendChild(svgEl('rect',{x:PAD.l,y:ry,width:barW,height:bh,fill:it.color,rx:'3',opacity:'0.85'}));
+    svgText(svg,PAD.l-6,ry+bh/2,it.label,{'text-anchor':'end','dominant-baseline':'middle',fill:'#e2e8f0','font-size':'12','font-family':'Noto Sans SC,sans-serif'});
+    svgText(svg,PAD.l+barW+8,ry+bh/2,it.val.toLocaleString(),{'text-anchor':'start','dominant-baseline':'middle',fill:'#e2e8f0','font-size':'12','font-family':'IBM Plex Mono,monospace'});
+  });
+}
+
+// ── Latency quantiles: full-period table + daily p90 per pair ─
+function drawLatency(){
+  const svg=document.getElementById('chart-latency');
+  svg.innerHTML='';
+  if(!LATENCY) return;
+  const sec=v=>v==null?'-':v<10?v.toFixed(2):v.toFixed(1);
+  document.getElementById('latency-body').innerHTML=LATENCY.pairs.map((p,i)=>{
+    const [n,p50,p90,p99]=LATENCY.total[i];
+    return `<tr><td>${p}</td><td>${fmt(n)}</td><td>${sec(p50)}</td><td>${sec(p90)}</td><td>${sec(p99)}</td></tr>`;
+  }).join('');
+  const W=1200,H=260,PAD={l:60,r:150,t:20,b:30};
+  const cW=W-PAD.l-PAD.r, cH=H-PAD.t-PAD.b, n=ROWS.length;
+  const maxV=Math.max(0,...LATENCY.p90.flat().filter(v=>v!=null))||1;
+  const colors=['#3b82f6','#10b981','#8b5cf6','#f59e0b','#06b6d4','#ef4444'];
+  const x=i=>PAD.l+(n>1?i/(n-1):0.5)*cW, y=v=>PAD.t+cH-v/maxV*cH;
+  [0,0.5,1].forEach(f=>{
+    svg.appendChild(svgEl('line',{x1:PAD.l,x2:PAD.l+cW,y1:y(maxV*f),y2:y(maxV*f),stroke:'#1a1f2c'}));
+    svgText(svg,PAD.l-6,y(maxV*f),sec(maxV*f),{'text-anchor':'end','dominant-baseline':'middle',fill:'#4b5563','font-size':'10'});
+  });
+  LATENCY.p90.forEach((series,k)=>{
+    let d='';
+    series.forEach((v,i)=>{ if(v!=null) d+=(d?'L':'M')+x(i).toFixed(1)+','+y(v).toFixed(1); });
+    if(!d) return;
+    svg.appendChild(svgEl('path',{d,fill:'none',stroke:colors[k%colors.length],'stroke-width':'1.5'}));
+    svgText(svg,PAD.l+cW+10,PAD.t+k*18+6,`${LATENCY.pairs[k]} p90`,{fill:colors[k%colors.length],'font-size':'11'});
+  });
+  const step=Math.max(1,Math.ceil(n/12));
+  for(let i=0;i<n;i+=step) svgText(svg,x(i),H-8,ROWS[i].date.slice(5),{'text-anchor':'middle',fill:'#4b5563','font-size':'10'});
+}
+
+// ── Type tabs ─────────────────────────────────────────────
+// Columnar ROWS ({n, phases, delta, cols}) are expanded to row objects on first use of each view
+function expandRows(v){
+  if(Array.isArray(v.rows)) return;
+  const {n, phases, delta, cols}=v.rows, keys=Object.keys(cols);
+  delta.forEach(k=>{ const c=cols[k]; for(let i=1;i<n;i++) c[i]+=c[i-1]; });
+  cols.phase=cols.phase.map(i=>phases[i]);
+  const rows=new Array(n);
+  for(let i=0;i<n;i++){ const r={}; for(const k of keys) r[k]=cols[k][i]; rows[i]=r; }
+  v.rows=rows;
+}
+// ── Date-range picker: prefix sums over non-gray days ───
+// Built once per view from ROWS; each [start, end] funnel / close query is two binary searches.
+const FUNNEL_FIELDS=@@funnel_fields_json@@, CLOSE_FIELDS=@@close_fields_json@@;
+let RANGE=null;
+function buildRangeIndex(rows){
+  const P={};
+  [...new Set(FUNNEL_FIELDS.concat(CLOSE_FIELDS))].forEach(f=>{
+    const p=P[f]=new Float64Array(rows.length+1);
+    rows.forEach((r,i)=>{ p[i+1]=p[i]+(r.phase==='灰测期'?0:r[f]); });
+  });
+  return {dates:rows.map(r=>r.date), P};
+}
+function bound(a, x, upper){
+  let lo=0, hi=a.length;
+  while(lo<hi){ const mid=(lo+hi)>>1; if(a[mid]<x||(upper&&a[mid]===x)) lo=mid+1; else hi=mid; }
+  return lo;
+}
+function rangeQuery(start, end){
+  const i=start?bound(RANGE.dates,start,false):0, j=end?bound(RANGE.dates,end,true):RANGE.dates.length;
+  const sums=fields=>fields.map(f=>RANGE.P[f][Math.max(i,j)]-RANGE.P[f][i]);
+  return {days:Math.max(0,j-i), funnel:sums(FUNNEL_FIELDS), close:sums(CLOSE_FIELDS)};
+}
+function applyRange(){
+  const s=document.getElementById('range-start').value, e=document.getElementById('range-end').value;
+  const q=rangeQuery(s, e);
+  const full=(!s||s<=RANGE.dates[0])&&(!e||e>=RANGE.dates[RANGE.dates.length-1]);
+  // The per-user ordered funnel only exists for the full period; sub-ranges fall back to daily sums.
+  FUNNEL=(full&&ORDERED)||q.funnel; CLOSE=q.close;
+  document.getElementById('range-note').textContent=
+    full?(ORDERED?'按用户有序漏斗':''):`已选 ${q.days} 天${ORDERED?'（按日汇总）':''}`;
+  ['chart-funnel','chart-close'].forEach(id=>{ STALE.add(id); if(!sectionObserver||VISIBLE.has(id)) drawSection(id); });
+}
+function resetRange(redraw){
+  const ds=RANGE.dates, a=document.getElementById('range-start'), b=document.getElementById('range-end');
+  a.min=b.min=a.value=ds[0]||''; a.max=b.max=b.value=ds[ds.length-1]||'';
+  document.getElementById('range-note').textContent=ORDERED?'按用户有序漏斗':'';
+  if(redraw!==false) applyRange();
+}
+
+// ── Deferred sections: drawn when scrolled into view ────
+// selectType only marks sections stale; visible ones redraw at once, the rest on first intersection.
+// DASHBOARD_PERF records time-to-first-chart and per-section draw cost.
+const SECTIONS={'chart-traffic':drawTraffic,'chart-ctr':drawCTR,'chart-install':drawInstall,
+  'chart-funnel':drawFunnel,'chart-close':drawClose,'chart-latency':drawLatency,'table-wrap':buildTable};
+const STALE=new Set(), VISIBLE=new Set();
+const DASHBOARD_PERF={firstChart:null, sections:{}};
+function drawSection(id){
+  if(!STALE.delete(id)) return;
+  const t0=performance.now();
+  SECTIONS[id]();
+  const t1=performance.now();
+  DASHBOARD_PERF.sections[id]=(DASHBOARD_PERF.sections[id]||0)+(t1-t0);
+  if(DASHBOARD_PERF.firstChart===null && id.startsWith('chart-')){
+    DASHBOARD_PERF.firstChart=t1;
+    if(performance.mark) performance.mark('first-chart');
+  }
+}
+const sectionObserver = window.IntersectionObserver ? new IntersectionObserver(entries=>{
+  entries.forEach(e=>{
+    if(e.isIntersecting){ VISIBLE.add(e.target.id); drawSection(e.target.id); }
+    else VISIBLE.delete(e.target.id);
+  });
+},{rootMargin:'200px 0px'}) : null;
+if(sectionObserver) Object.keys(SECTIONS).forEach(id=>sectionObserver.observe(document.getElementById(id)));
+
+function selectType(t){
+  expandRows(VIEWS[t]);
+  ({rows:ROWS, insights:INSIGHTS, suggestions:SUGGESTIONS, funnel:FUNNEL, close:CLOSE, charts:CHARTS} = VIEWS[t]);
+  ORDERED=VIEWS[t].ordered?FUNNEL:null; LATENCY=VIEWS[t].latency||null;
+  document.getElementById('latency-section').style.display=LATENCY?'':'none';
+  document.querySelectorAll('[data-type]').forEach(el=>{ el.style.display = el.dataset.type===t?'':'none'; });
+  document.querySelectorAll('.tab').forEach(el=>el.classList.toggle('active', el.dataset.tab===t));
+  RANGE=buildRangeIndex(ROWS); resetRange(false);
+  buildInsights(); buildSugg();
+  Object.keys(SECTIONS).forEach(id=>{ STALE.add(id); if(!sectionObserver||VISIBLE.has(id)) drawSection(id); });
+}
+selectType(@@first_json@@);
 </script>
 </body>
 </html>"""
-    return html
+SLOT_RE = re.compile(r'@@(\w+)@@')
+
+def compile_template(text, **fixed):
+    """模板 → (静态字节段, 槽名)；fixed 中的槽在编译期直接并入静态段"""
+    parts = SLOT_RE.split(text)
+    statics, names = [parts[0]], []
+    for name, seg in zip(parts[1::2], parts[2::2]):
+        if name in fixed:
+            statics[-1] += fixed[name] + seg
+        else:
+            names.append(name)
+            statics.append(seg)
+    return tuple(p.encode('utf-8') for p in statics), tuple(names)
+
+def render_template(compiled, slots):
+    """按槽填入数据，返回与静态段交错的字节片段列表（b''.join 或 writelines 输出）"""
+    statics, names = compiled
+    out = [statics[0]]
+    for name, seg in zip(names, statics[1:]):
+        v = slots[name]
+        out.append(v if isinstance(v, bytes) else v.encode('utf-8'))
+        out.append(seg)
+    return out
+
+_DASHBOARD = compile_template(DASHBOARD_TEMPLATE, table_virtual_rows=str(TABLE_VIRTUAL_ROWS),
+                              funnel_fields_json=json.dumps(FUNNEL_FIELDS), close_fields_json=json.dumps(CLOSE_FIELDS))
+
+def _payload_rest(m, insights, suggestions, summary=None):
+    """视图数据中 rows 以外的字段"""
+    s = summary or summarize(m)
+    rest = {'insights': insights, 'suggestions': suggestions, 'funnel': s['funnel'], 'close': s['close']}
+    if 'ordered_funnel' in m:
+        rest['ordered'] = True
+    if 'latency' in m:
+        rest['latency'] = m['latency']
+    charts = chart_specs(m)
+    if charts is not None:
+        rest['charts'] = charts
+    return rest
+
+def view_payload(m, insights, suggestions, summary=None):
+    """单个视图注入页面的数据：rows + _payload_rest"""
+    return {'rows': to_rows(m), **_payload_rest(m, insights, suggestions, summary)}
+
+def payload_json(m, insights, suggestions, summary=None, wire=ROWS_WIRE):
+    """view_payload 的 JSON 文本；rows 按 wire 走 rows_columnar_json / rows_json，其余小字段交给 json.dumps"""
+    rows = rows_columnar_json(m) if wire == 'columnar' else rows_json(m)
+    rest = _payload_rest(m, insights, suggestions, summary)
+    return '{"rows": ' + rows + ', ' + json.dumps(rest, ensure_ascii=False)[1:]
+
+def _script_json(text):
+    """内嵌到 <script> 的 JSON：'</' 转义为 '<\\/'，数据中的 </script> 不会提前结束脚本块"""
+    return text.replace('</', '<\\/')
+
+def render_dashboard(views, generated_at=None, wire=ROWS_WIRE):
+    """渲染单文件 HTML 看板（所有 CSS/JS 内联），返回字节片段列表"""
+    import json as _json
+
+    labels = list(views)
+    dates = views[labels[0]][0]['dates']  # 首个视图（全部 / 唯一 Type）覆盖全部日期
+    date_range = f"{dates[0]} ~ {dates[-1]}" if dates else '-'
 
+    def pct(a, b): return f"{a/b*100:.1f}%" if b else "-"
+
+    payload, header_kpis, kpi_grids = [], [], []
+    for i, (label, (m, insights, suggestions)) in enumerate(views.items()):
+        s = summarize(m)
+        attr = html.escape(label, quote=True)
+        total_start, total_show, total_click, total_install, total_brk = s['total'].values()
+        hidden = '' if i == 0 else ' style="display:none"'
+        start_note = (f"全周期去重用户 {s['unique']['start']:,}（HLL 估计）" if s['unique'] else
+                      '各日人数加总（跨日未去重）')
+        header_kpis.append(f"""  <div class="header-kpi" data-type="{attr}"{hidden}>
+    <div class="header-kpi-item"><span class="label">总启动</span><span class="val mono">{total_start:,}</span></div>
+    <div class="header-kpi-item"><span class="label">总展示</span><span class="val mono">{total_show:,}</span></div>
+    <div class="header-kpi-item"><span class="label">总点击</span><span class="val mono">{total_click:,}</span></div>
+    <div class="header-kpi-item"><span class="label">总安装</span><span class="val mono">{total_install:,}</span></div>
+    <div class="header-kpi-item"><span class="label">整体CTR</span><span class="val mono">{pct(total_click,total_show)}</span></div>
+    <div class="header-kpi-item"><span class="label">点击→安装</span><span class="val mono">{pct(total_install,total_click)}</span></div>
+  </div>""")
+        kpi_grids.append(f"""<div class="kpi-grid" data-type="{attr}"{hidden}>
+  <div class="kpi-card c1">
+    <div class="kpi-label">总启动 start</div>
+    <div class="kpi-val">{total_start:,}</div>
+    <div class="kpi-sub">{start_note}</div>
+  </div>
+  <div class="kpi-card c2">
+    <div class="kpi-label">总展示 pop_show</div>
+    <div class="kpi-val">{total_show:,}</div>
+    <div class="kpi-sub">展示率 {pct(total_show,total_start)}</div>
+  </div>
+  <div class="kpi-card c3">
+    <div class="kpi-label">总点击 pop_click</div>
+    <div class="kpi-val">{total_click:,}</div>
+    <div class="kpi-sub">CTR {pct(total_click,total_show)}</div>
+  </div>
+  <div class="kpi-card c4">
+    <div class="kpi-label">总安装 down_end_suc</div>
+    <div class="kpi-val">{total_install:,}</div>
+    <div class="kpi-sub">点击→安装 {pct(total_install,total_click)}</div>
+  </div>
+  <div class="kpi-card c5">
+    <div class="kpi-label">总 break</div>
+    <div class="kpi-val">{total_brk:,}</div>
+    <div class="kpi-sub">break率 {pct(total_brk,total_start)}</div>
+  </div>
+</div>""")
+        payload.append(f'{_json.dumps(label, ensure_ascii=False)}: {payload_json(m, insights, suggestions, s, wire)}')
+
+    tabs = ''
+    if len(labels) > 1:
+        tabs = '  <div class="tabs">' + ''.join(
+            f'<button class="tab{" active" if i == 0 else ""}" data-tab="{attr}" onclick="selectType(this.dataset.tab)">{attr}</button>'
+            for i, attr in enumerate(map(html.escape, labels))) + '</div>\n'
+    slots = {'date_range': date_range, 'generated_at': (generated_at or datetime.now()).strftime('%Y-%m-%d %H:%M'),
+             'tabs': tabs, 'header_kpi_html': '\n'.join(header_kpis), 'kpi_grid_html': '\n'.join(kpi_grids),
+             'views_json': _script_json('{' + ', '.join(payload) + '}'),
+             'first_json': _script_json(_json.dumps(labels[0], ensure_ascii=False))}
+    return render_template(_DASHBOARD, slots)
+
+def generate_html(views, generated_at=None):
+    """render_dashboard 的字符串形式"""
+    return b''.join(render_dashboard(views, generated_at)).decode('utf-8')
+
+_template_digest = None
+
+def template_digest():
+    """模板版本：本模块源码的哈希（CSS/JS 模板或渲染代码任何改动都会使渲染缓存失效）"""
+    global _template_digest
+    if _template_digest is None:
+        _template_digest = _file_digest(os.path.abspath(__file__))
+    return _template_digest
+
+def render_fingerprint(views, wire=ROWS_WIRE):
+    """渲染输入指纹（不含生成时间）"""
+    h = hashlib.blake2b(f'{template_digest()}\x00{wire}'.encode(), digest_size=16)
+    for label, (m, insights, suggestions) in views.items():
+        h.update(b'\x00view\x00' + label.encode('utf-8'))
+        h.update('\x00'.join(m['dates']).encode())
+        for plane in ('pv', 'uv'):
+            for action, col in sorted(m['matrix'][plane].items()):
+                h.update(f'\x00{plane}:{action}\x00'.encode() + col.tobytes())
+        h.update(json.dumps([insights, suggestions, summarize(m)['unique'], m.get('ordered_funnel'),
+                             m.get('latency')], ensure_ascii=False).encode('utf-8'))
+    return h.hexdigest()
+
+class RenderCache:
+    """按渲染指纹缓存 generate_html 的结果（内存 LRU，供常驻服务复用）；hits / misses 计数"""
+
+    def __init__(self, size=4):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    def render(self, views):
+        """→ (指纹, HTML 字节)；指纹命中时原样返回上次的字节"""
+        fp = render_fingerprint(views)
+        html = self.entries.get(fp)
+        if html is not None:
+            self.hits += 1
+            self.entries.move_to_end(fp)
+            return fp, html
+        self.misses += 1
+        html = self.entries[fp] = b''.join(render_dashboard(views))
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return fp, html
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries)}
+
+def write_dashboard(views, path, stats=None, wire=ROWS_WIRE):
+    """渲染并写出看板；指纹相同且输出文件未被改动时跳过"""
+    fp = render_fingerprint(views, wire)
+    meta_path = path + RENDER_SUFFIX
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        hit = (meta['fingerprint'] == fp and os.path.getsize(path) == meta['size']
+               and _file_digest(path) == meta['hash'])
+    except (OSError, ValueError, KeyError):
+        hit = False
+    if stats is not None:
+        stats['render'] = 'hit' if hit else 'miss'
+    if hit:
+        return False
+    parts = render_dashboard(views, wire=wire)
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part)
+    meta = {'fingerprint': fp, 'size': sum(map(len, parts)), 'hash': h.hexdigest()}
+    for target, payload in ((path, parts), (meta_path, [json.dumps(meta).encode()])):
+        tmp_path = f'{target}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.writelines(payload)
+        os.replace(tmp_path, target)
+    return True
 
 if __name__ == '__main__':
-    print(f"读取数据: {CSV_PATH}")
-    daily = parse_csv(CSV_PATH)
-    rows = compute_metrics(daily)
-    print(f"共 {len(rows)} 天数据，日期范围: {rows[0]['date']} ~ {rows[-1]['date']}" if rows else "无数据")
-    insights = gen_insights(rows)
-    suggestions = gen_suggestions(rows)
-    html = generate_html(rows, insights, suggestions)
-    with open(OUTPUT_PATH, 'w', encoding='utf-8') as f:
-        f.write(html)
-    print(f"看板已生成: {OUTPUT_PATH}")
+    from events_promotion import EVENT_COLUMNS, SKETCH_SUFFIX, event_header, is_event_log, user_event_pass
+
+    parser = argparse.ArgumentParser(description='推广模块放量数据看板生成器')
+    parser.add_argument('inputs', nargs='*', default=[CSV_PATH],
+                        help='CSV 文件、目录或 glob；多个分片时多进程并行解析。表头含用户 ID 列（用户ID / user_id / uid）的 '
+                             '单个 CSV 按原始事件日志处理，人数由 HyperLogLog 草图估计并跨日去重')
+    parser.add_argument('-o', '--output', default=OUTPUT_PATH, help='输出 HTML 路径')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='并行进程数（默认 CPU 核数）')
+    parser.add_argument('--append', action='store_true', help=f'增量模式：只解析文件尾追加或表头 / 合计行之后插入的新行（日期倒序的导出），'
+                             f'其余位置的改写会整体重建（状态存于 <csv>{STATE_SUFFIX}）')
+    parser.add_argument('--ranges', action='store_true',
+                        help='单个大 CSV 按行边界切成字节区间，多进程各自 mmap 并行解析（不经列式缓存，进程数见 -j）')
+    parser.add_argument('--export', metavar='PATH',
+                        help='另存每日 Type × Action 聚合与派生率为 Parquet（.parquet）或 Arrow IPC（.arrow / .feather），需要 pyarrow')
+    parser.add_argument('--store', metavar='DB',
+                        help='把解析结果按 (Type, 日期, Action) UPSERT 进 SQLite 聚合库；以 .db / .sqlite 文件为输入时直接读库')
+    parser.add_argument('--start', help='起始日期 YYYY-MM-DD（仅 Parquet / Arrow / SQLite 输入，过滤下推到读取）')
+    parser.add_argument('--end', help='结束日期 YYYY-MM-DD（同上，含当天）')
+    parser.add_argument('--rows-wire', choices=ROWS_WIRES, default=ROWS_WIRE,
+                        help='页面内嵌 ROWS 的编码：columnar 列式（默认，体积更小）/ rows 行字典数组')
+    parser.add_argument('--ordered-funnel', action='store_true',
+                        help='（仅事件日志）按用户计算严格有序漏斗替代按日加总的漏斗；外排序，有序段落盘到系统临时目录')
+    parser.add_argument('--latency', action='store_true',
+                        help='（仅带时间列的事件日志）按用户配对事件，计算各间隔时延的 t-digest 分位（p50 / p90 / p99）；'
+                             '与 --ordered-funnel 共用一次外排序')
+    add_render_args(parser)
+    add_profile_args(parser)
+    args = parser.parse_args()
+    OUTPUT_PATH = args.output
+    paths = expand_inputs(args.inputs)
+    agg = len(paths) == 1 and agg_format(paths[0]) is not None
+    store = len(paths) == 1 and is_store(paths[0])
+    events = len(paths) == 1 and is_event_log(paths[0])
+    if args.append and (len(paths) != 1 or agg or store or events):
+        parser.error(f'--append 仅支持单个导出 CSV 文件（事件日志总是按 {SKETCH_SUFFIX} 草图状态增量续读）')
+    if (args.ordered_funnel or args.latency) and not events:
+        parser.error('--ordered-funnel / --latency 仅支持单个原始事件日志输入')
+    if args.latency and event_header(paths[0])['time'] is None:
+        parser.error(f'--latency 需要事件日志带时间列（{" / ".join(EVENT_COLUMNS["time"])}）')
+    if args.ranges and (len(paths) != 1 or agg or store or events or args.append):
+        parser.error('--ranges 仅支持单个 CSV 文件，且不能与 --append 同用')
+    if (args.start or args.end) and not (agg or store):
+        parser.error('--start / --end 仅支持单个 Parquet / Arrow 聚合文件或 SQLite 聚合库输入')
+    if agg or args.export:
+        try:
+            _pyarrow()
+        except ImportError as e:
+            parser.error(str(e))
+    prof = profiler_from_args(args)
+    print(f"读取数据: {paths[0]}" if len(paths) == 1 else f"读取数据: {len(paths)} 个分片")
+    stats = {}
+    with prof.stage('parse') as rec:
+        metrics = load_inputs(paths, args.jobs, args.start, args.end, args.append, stats, args.ranges)
+        rec.update(rows=stats.get('rows', 0), io=stats.get('io_seconds', 0))
+    report_throughput(stats)
+    with prof.stage('metrics') as rec:
+        views = view_metrics(metrics)
+        rec['rows'] = sum(len(m['dates']) for m in views.values())
+    if args.ordered_funnel or args.latency:
+        users = {}
+        with prof.stage('users') as rec:
+            user_event_pass(paths[0], views, args.ordered_funnel, args.latency, stats=users)
+            rec['rows'] = users['rows']
+        done = '、'.join(name for name, on in (('有序漏斗', args.ordered_funnel), ('时延分位', args.latency)) if on)
+        print(f"{done}: {users['users']:,} 个用户，{users['runs']} 个有序段，耗时 {users['seconds']:.2f}s")
+    if args.store:
+        with prof.stage('store') as rec:
+            conn = open_store(args.store)
+            try:
+                rec['rows'] = store_upsert(conn, {t: matrix_to_daily(m['matrix']) for t, m in metrics.items()},
+                                           dates={t: m['dates'] for t, m in metrics.items()})
+            finally:
+                conn.close()
+        print(f"聚合库已更新: {args.store}（UPSERT {rec['rows']:,} 行）")
+    if args.export:
+        with prof.stage('export') as rec:
+            rec['rows'] = export_metrics(metrics, args.export)
+        print(f"聚合数据已导出: {args.export}（{rec['rows']:,} 行）")
+    dates = next(iter(views.values()))['dates']
+    print(f"共 {len(dates)} 天数据（{len(metrics)} 个 Type），日期范围: {dates[0]} ~ {dates[-1]}" if dates else "无数据")
+    render = {}
+    with prof.stage('render'):
+        write_analysis(views, OUTPUT_PATH, render, args.rows_wire)
+    print(f"看板未变化（渲染缓存命中），跳过写出: {OUTPUT_PATH}" if render['render'] == 'hit' else f"看板已生成: {OUTPUT_PATH}")
+    run_renderers(args.render, views, prof)
+    prof.finish()
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""推广数据看板基准测试 - 合成导出生成器 + 解析器微基准 + CSV→HTML 全流水线分阶段计时"""
+import argparse, json, os, platform, random, re, resource, shutil, subprocess, sys, tempfile, time, tracemalloc
+from datetime import date, datetime, timedelta
+from itertools import groupby
+
+from analyze_promotion import (BASE_DIR, CACHE_SUFFIX, TABLE_VIRTUAL_ROWS, _fold_records, _records_from_rows,
+                               build_views, compute_metrics, gen_insights, gen_suggestions, iter_batches, iter_records,
+                               iter_rows, parse_csv, parse_ranges, render_dashboard, segment_phases, view_metrics)
+
+HEADER = '"id","日期","Type","Action","名称","次数","人数"\n'
+BENCH_VERSION = 1
+START_DATE = date(2026, 1, 1)
+TYPES = ('smart_recommend', 'feed_banner', 'search_top', 'home_float', 'exit_retain', 'download_page')
+# Action → (上游 Action, 人数转化率区间, 当天缺失概率)；上游为 None 表示以 start 为基数
+ACTION_MIX = (
+    ('start', None, (1.0, 1.0), 0),
+    ('promotion_trigger', 'start', (0.72, 0.86), 0),
+    ('pop_show', 'promotion_trigger', (0.95, 0.99), 0),
+    ('pop_click', 'pop_show', (0.02, 0.08), 0),
+    ('pop_close', 'pop_show', (0.30, 0.50), 0),
+    ('pop_notips', 'pop_show', (0.02, 0.06), 0.05),
+    ('kk_pop_timeout', 'pop_show', (0.25, 0.40), 0.1),
+    ('down_start', 'pop_click', (0.85, 0.95), 0),
+    ('down_suc', 'down_start', (0.90, 0.98), 0.1),
+    ('down_end_suc', 'down_suc', (0.85, 0.95), 0.1),
+    ('down_fail', 'down_start', (0.01, 0.04), 0.6),
+    ('down_end_fail', 'down_suc', (0.01, 0.03), 0.6),
+    ('break', 'start', (0.01, 0.03), 0),
+)
+# 真实导出里见过的坏行：截断、非数字计数、空行、名称内含逗号、非日期汇总行
+BAD_ROWS = (
+    '"{id}","{date}","{type}"\n',
+    '"{id}","{date}","{type}","start","","n/a","-"\n',
+    '\n',
+    '"{id}","{date}","{type}","pop_show","弹窗,测试","12","10"\n',
+    '"","总计","{type}","","","0","0"\n',
+)
+
+def _split(total, parts, rnd):
+    """把 total 随机拆成 parts 份（和不变）"""
+    if parts == 1:
+        return [total]
+    cuts = sorted(rnd.randrange(total + 1) for _ in range(parts - 1))
+    return [b - a for a, b in zip([0] + cuts, cuts + [total])]
+
+def synth_cells(days, types, seed=0, start=None):
+    """生成 {type: [(日期, action, pv, uv), ...]}：start 人数按放量节奏逐日爬升（或取给定的每日 start 序列），其余按漏斗转化率派生"""
+    rnd = random.Random(seed)
+    cells = {}
+    for typ in types:
+        scale = rnd.uniform(0.3, 1.5)
+        out = cells[typ] = []
+        for d in range(days):
+            day = (START_DATE + timedelta(days=d)).isoformat()
+            uv = {'start': start[d] if start else max(1, int(min(200 * 1.6 ** min(d, 30), 80000) * scale * rnd.uniform(0.9, 1.1)))}
+            for action, base, (lo, hi), missing in ACTION_MIX:
+                if base is not None:
+                    uv[action] = int(uv[base] * rnd.uniform(lo, hi))
+                if rnd.random() >= missing:
+                    out.append((day, action, int(uv[action] * rnd.uniform(1.0, 1.2)), uv[action]))
+    return cells
+
+def write_export(path, days=30, types=1, splits=1, bad_rows=5, seed=0, newest_first=True):
+    """写出 gb18030 合成导出：每个 Type 一行“合计”，N 天 × M 个 Type × Action 明细，
+    每格拆成 splits 行（不同 id）以放大行数，并随机插入 bad_rows 行坏数据；
+    newest_first 时与真实导出一致，合计行在前、日期倒序。返回写出的数据行数"""
+    rnd = random.Random(seed)
+    names = [TYPES[i] if i < len(TYPES) else f'type_{i}' for i in range(types)]
+    cells = synth_cells(days, names, seed)
+    n_rows = sum(len(c) for c in cells.values()) * splits
+    bad_at = {rnd.randrange(n_rows) for _ in range(bad_rows)} if n_rows else set()
+    rid, n, buf = 10000000, 0, []
+    with open(path, 'w', encoding='gb18030', newline='') as f:
+        f.write(HEADER)
+        for typ, rows in cells.items():
+            buf.append(f'"","合计","{typ}","","","{sum(r[2] for r in rows)}","{sum(r[3] for r in rows)}"\n')
+            if newest_first:
+                rows = sorted(rows, key=lambda r: r[0], reverse=True)
+            for day, action, pv, uv in rows:
+                for p, u in zip(_split(pv, splits, rnd), _split(uv, splits, rnd)):
+                    rid += 1
+                    buf.append(f'"{rid}","{day}","{typ}","{action}","","{p}","{u}"\n')
+                    if n in bad_at:
+                        buf.append(rnd.choice(BAD_ROWS).format(id=rid, date=day, type=typ))
+                    n += 1
+                if len(buf) >= 10000:
+                    f.write(''.join(buf))
+                    buf.clear()
+        f.write(''.join(buf))
+    return n_rows + len(cells) + len(bad_at)
+
+def bench_parser(path):
+    """对比 csv 模块通用路径与按格式直切字节的快速路径：纯解析（列式批次，供缓存构建）与折叠为 Type 分桶累加器"""
+    def csv_columns():
+        return sum(1 for _ in _records_from_rows(iter_rows(path)))
+    def fast_columns():
+        return sum(len(b['id']) for b in iter_batches(path))
+    cases = (('parse', 'csv.reader', csv_columns), ('parse', 'fast bytes', fast_columns),
+             ('fold', 'csv.reader', lambda: _fold_records(_records_from_rows(iter_rows(path)))),
+             ('fold', 'fast bytes', lambda: _fold_records(iter_records(path))))
+    results = {}
+    for stage, name, run in cases:
+        t0 = time.perf_counter()
+        out = run()
+        results[stage, name] = (out, time.perf_counter() - t0)
+    for (stage, name), (out, sec) in results.items():
+        n = out if stage == 'parse' else out[1]
+        base = results[stage, 'csv.reader'][1]
+        print(f"{stage:<6}{name:<12} {n:>12,} 行  {sec:7.2f}s  {n / sec:>12,.0f} 行/秒  x{base / sec:.2f}")
+    assert results['fold', 'csv.reader'][0] == results['fold', 'fast bytes'][0], '两条解析路径结果不一致'
+    return results
+
+def bench_ranges(path, jobs):
+    """单文件字节区间并行：以 csv.reader 逐行折叠为基线，按进程数报告 parse_ranges 的加速比"""
+    t0 = time.perf_counter()
+    base, n = _fold_records(_records_from_rows(iter_rows(path)))
+    base_sec = time.perf_counter() - t0
+    print(f"{'csv.reader':<12} {n:>12,} 行  {base_sec:7.2f}s  {n / base_sec:>12,.0f} 行/秒  x1.00")
+    results = {}
+    for j in jobs:
+        stats = {}
+        by_type = parse_ranges(path, j, stats)
+        sec = stats['seconds']
+        results[j] = sec
+        print(f"{f'ranges -j{j}':<12} {stats['rows']:>12,} 行  {sec:7.2f}s  {stats['rows'] / sec:>12,.0f} 行/秒  "
+              f"x{base_sec / sec:.2f}（{stats['ranges']} 段）")
+        assert by_type == base, f'-j{j} 的结果与 csv.reader 不一致'
+    return results
+
+# 页面 JS 的最小 DOM 桩（node 执行）：可控的 IntersectionObserver，innerHTML 赋值计数；执行页面内全部 <script>
+DOM_STUB_JS = r"""
+const fs=require('fs'), vm=require('vm');
+const html=fs.readFileSync(process.argv[2],'utf8');
+const t0=process.hrtime.bigint(), now=()=>Number(process.hrtime.bigint()-t0)/1e6;
+class El{
+  constructor(){ this.children=[]; this.attrs={}; this.style={}; this.dataset={}; this.textContent=''; this._html='';
+    this.writes=0; this.classList={toggle(){}, add(){}, remove(){}}; }
+  set innerHTML(v){ this._html=v; this.children=[]; this.writes++; }
+  get innerHTML(){ return this._html; }
+  appendChild(c){ this.children.push(c); return c; }
+  setAttribute(k,v){ this.attrs[k]=v; }
+}
+const els={}, observed=[]; let onIntersect=null;
+global.window=global;
+global.performance={now, mark(){}};
+global.requestAnimationFrame=f=>setTimeout(f,0);
+global.document={getElementById:id=>els[id]||(els[id]=Object.assign(new El(),{id})),
+  createElementNS:()=>new El(), querySelectorAll:()=>[]};
+global.IntersectionObserver=class{ constructor(cb){ onIntersect=cb; } observe(el){ observed.push(el); } };
+vm.runInThisContext([...html.matchAll(/<script>([\s\S]*?)<\/script>/g)].map(m=>m[1]).join('\n;\n'));
+"""
+# 页面 JS 预算探针：先让前 fold 个区块进入视口（首屏），再让全部区块进入视口；时间相对脚本开始执行
+PAGE_PROBE_JS = DOM_STUB_JS + r"""
+const fold=+process.argv[3], script=now();
+onIntersect(observed.map((target,i)=>({target, isIntersecting:i<fold})));
+const visible=now();
+onIntersect(observed.map(target=>({target, isIntersecting:true})));
+const all=now();
+console.log(JSON.stringify({script_ms:script, first_chart_ms:DASHBOARD_PERF.firstChart, visible_ms:visible,
+  all_ms:all, sections:DASHBOARD_PERF.sections}));
+"""
+# 明细表标记探针：全部区块进入视口后输出表体的最终标记与赋值次数
+TABLE_PROBE_JS = DOM_STUB_JS + r"""
+onIntersect(observed.map(target=>({target, isIntersecting:true})));
+const body=els['table-body'];
+console.log(JSON.stringify({rows:ROWS.length, row_h:ROW_H, writes:body.writes, html:body.innerHTML}));
+"""
+PAGE_FOLD = 2  # 首屏可见的区块数（流量趋势 + CTR）
+PAGE_METRICS = ('script_ms', 'first_chart_ms', 'visible_ms', 'all_ms')
+
+def _run_probe(script, *args):
+    """用 node 执行探针脚本，返回其输出的 JSON；没有 node 时返回 None"""
+    node = shutil.which('node')
+    if node is None:
+        return None
+    with tempfile.NamedTemporaryFile('w', suffix='.js', delete=False) as f:
+        f.write(script)
+    try:
+        out = subprocess.run([node, f.name, *map(str, args)], capture_output=True, text=True, check=True)
+        return json.loads(out.stdout)
+    finally:
+        os.remove(f.name)
+
+def probe_page(html_path, repeat=1, fold=PAGE_FOLD):
+    """用 node 执行生成的看板脚本，返回 JS 预算指标（各项取 repeat 次最小值）；没有 node 时返回 None"""
+    best = None
+    for _ in range(repeat):
+        r = _run_probe(PAGE_PROBE_JS, html_path, fold)
+        if r is None:
+            return None
+        best = r if best is None else {k: min(best[k], r[k]) if k in PAGE_METRICS else best[k] for k in r}
+    return best
+
+def check_table_markup(seed=0):
+    """明细表标记检查（node + DOM 桩，无需浏览器）：不超过 TABLE_VIRTUAL_ROWS 天时整表一次 join 写入；
+    超过时只写可见窗口，上下两个占位行的高度补足其余行。返回各天数的探针结果；没有 node 时返回 None"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for days in (TABLE_VIRTUAL_ROWS, TABLE_VIRTUAL_ROWS * 3):
+            cells = synth_cells(days, TYPES[:1], seed)
+            metrics = {t: compute_metrics({(d, a): [pv, uv] for d, a, pv, uv in rows}) for t, rows in cells.items()}
+            path = os.path.join(tmp, f'table{days}.html')
+            with open(path, 'wb') as f:
+                f.writelines(render_dashboard(build_views(metrics)))
+            r = _run_probe(TABLE_PROBE_JS, path)
+            if r is None:
+                return None
+            body = r.pop('html')
+            spacers = [int(h) for h in re.findall(r'<tr class="spacer" style="height:(\d+)px">', body)]
+            shown = body.count('<tr') - len(spacers)
+            assert r['rows'] == days and r['writes'] == 1, f'{days} 天：表体应一次写入，实际 {r["writes"]} 次'
+            if days <= TABLE_VIRTUAL_ROWS:
+                assert not spacers and shown == days, f'{days} 天：应整表渲染 {days} 行，实际 {shown} 行'
+            else:
+                assert len(spacers) == 2 and 0 < shown < days, f'{days} 天：应为虚拟窗口，实际 {shown} 行'
+                assert sum(spacers) == (days - shown) * r['row_h'], f'{days} 天：占位高度与未渲染行数不符'
+            results[days] = dict(r, shown=shown, spacers=spacers)
+    return results
+
+# 名称 → (每日 start 人数, 期望的阶段分段 [(阶段, 天数)])
+PHASE_CASES = {
+    'ramp': ([30] * 5 + [5000] * 5 + [50000] * 10, [('灰测期', 5), ('灰度扩量', 5), ('正式放量', 10)]),
+    'twostep': ([30] * 5 + [5000] * 5 + [50000] * 10 + [30] * 5,
+                [('灰测期', 5), ('灰度扩量', 5), ('正式放量', 10), ('稳定期', 5)]),
+    'scaledown': ([50000] * 10 + [20000] * 10 + [5000] * 10, [('正式放量', 10), ('稳定期', 20)]),
+    'testspike': ([30] * 5 + [60000] + [30] * 9 + [60000] * 10,
+                  [('灰测期', 5), ('正式放量', 1), ('灰测期', 9), ('正式放量', 10)]),
+    'intermittent': ([0, 0, 0, 100, 60000, 0, 60000, 0, 5000], None),
+}
+
+def check_phases(fuzz=300, seed=0):
+    """阶段分段检查：PHASE_CASES 的分段符合预期；间歇 / 含 0 的随机序列走完 build_views 不报错"""
+    def metrics(start):
+        cells = synth_cells(len(start), TYPES[:1], seed, start)
+        return {t: compute_metrics({(d, a): [pv, uv] for d, a, pv, uv in rows}) for t, rows in cells.items()}
+    results = {}
+    for name, (start, expected) in PHASE_CASES.items():
+        runs = [(p, len(list(g))) for p, g in groupby(segment_phases(start))]
+        assert expected is None or runs == expected, f'{name}：期望 {expected}，实际 {runs}'
+        build_views(metrics(start))
+        results[name] = runs
+    rnd = random.Random(seed)
+    for _ in range(fuzz):
+        build_views(metrics([rnd.choice((0, 0, 100, 5000, 60000)) for _ in range(rnd.randint(1, 20))]))
+    return results
+
+def _drop_cache(path):
+    try:
+        os.remove(path + CACHE_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+def pipeline_stages(path, out_path):
+    """按看板生成器的顺序拆出各阶段 [(阶段名, 函数)]，后一阶段读取前一阶段写入 ctx 的结果"""
+    ctx = {}
+    def parse_cold():
+        _drop_cache(path)
+        ctx['stats'] = {}
+        ctx['by_type'] = parse_csv(path, ctx['stats'])
+    def parse_warm():
+        ctx['by_type'] = parse_csv(path)
+    def metrics():
+        ctx['views'] = view_metrics({t: compute_metrics(daily) for t, daily in ctx['by_type'].items()})
+    def insights():
+        ctx['views'] = {t: (m, gen_insights(m), gen_suggestions(m)) for t, m in ctx['views'].items()}
+    def html():
+        ctx['html'] = render_dashboard(ctx['views'])
+    def write():
+        with open(out_path, 'wb') as f:
+            f.writelines(ctx['html'])
+    return ctx, [('parse_cold', parse_cold), ('parse_warm', parse_warm), ('compute_metrics', metrics),
+                 ('insights', insights), ('generate_html', html), ('write', write)]
+
+def run_pipeline(path, repeat=1, trace_mem=True, page=True):
+    """逐阶段计时（重复 repeat 次取最小值）；trace_mem 时再单独跑一遍 tracemalloc 记录各阶段 Python 堆峰值；
+    page 时用 node 探针测生成页面的 JS 预算（首图时间等）。输入经临时目录中的符号链接读取，
+    列式缓存建在临时目录里，不会删除已有导出旁的缓存"""
+    stages = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, 'dashboard.html')
+        link = os.path.join(tmp, os.path.basename(path))
+        os.symlink(os.path.abspath(path), link)
+        path = link
+        for _ in range(repeat):
+            ctx, steps = pipeline_stages(path, out_path)
+            for name, step in steps:
+                w0, c0 = time.perf_counter(), time.process_time()
+                step()
+                wall, cpu = time.perf_counter() - w0, time.process_time() - c0
+                s = stages.setdefault(name, {'wall': wall, 'cpu': cpu})
+                s['wall'], s['cpu'] = min(s['wall'], wall), min(s['cpu'], cpu)
+        rows, html_bytes = ctx['stats'].get('rows', 0), sum(map(len, ctx['html']))
+        page_result = probe_page(out_path, repeat) if page else None
+        if trace_mem:
+            _, steps = pipeline_stages(path, out_path)
+            tracemalloc.start()
+            for name, step in steps:
+                tracemalloc.reset_peak()
+                step()
+                stages[name]['peak_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+    return {'rows': rows, 'html_bytes': html_bytes, 'stages': stages, 'page': page_result,
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+def _git_rev():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(result, base=None):
+    """打印各阶段耗时；给出基线结果时附上 wall 时间相对倍数"""
+    print(f"{'阶段':<16}{'wall':>9}{'cpu':>9}{'堆峰值':>13}" + ('  对比基线' if base else ''))
+    for name, s in result['stages'].items():
+        peak = f"{s['peak_kb']:,} KB" if 'peak_kb' in s else '-'
+        line = f"{name:<16}{s['wall']:8.3f}s{s['cpu']:8.3f}s{peak:>16}"
+        b = base and base['stages'].get(name)
+        if b:
+            line += f"  x{s['wall'] / max(b['wall'], 1e-9):.2f}"
+        print(line)
+    print(f"解析 {result['rows']:,} 行，HTML {result['html_bytes'] / 1e6:.2f} MB，"
+          f"进程峰值 RSS {result['max_rss_kb'] / 1024:.1f} MB")
+    page = result.get('page')
+    if page:
+        b = (base or {}).get('page') or {}
+        print('页面 JS（node 桩）: ' + '，'.join(
+            f"{label} {page[k]:.1f} ms" + (f" x{page[k] / max(b[k], 1e-9):.2f}" if k in b else '')
+            for k, label in zip(PAGE_METRICS, ('脚本', '首图', '首屏', '全部区块'))))
+
+def regressions(result, base, ratio):
+    """wall 时间超过基线 ratio 倍的阶段（含页面 JS 预算指标）"""
+    slow = [name for name, s in result['stages'].items()
+            if name in base['stages'] and s['wall'] > base['stages'][name]['wall'] * ratio]
+    page, base_page = result.get('page') or {}, base.get('page') or {}
+    return slow + [f'page.{k}' for k in PAGE_METRICS if k in page and k in base_page and page[k] > base_page[k] * ratio]
+
+def _with_export(args, run):
+    """--file 给出时直接使用，否则在临时目录生成合成导出"""
+    if args.file:
+        return run(args.file)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'export.csv')
+        n = write_export(path, args.days, args.types, args.splits, args.bad_rows, args.seed, not args.oldest_first)
+        print(f"生成合成数据: {args.days} 天 × {args.types} 个 Type，{n:,} 行 / {os.path.getsize(path) / 1e6:.1f} MB")
+        return run(path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='推广数据看板基准测试')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    for name, help_ in (('parser', '解析器微基准：csv.reader vs 快速字节解析'),
+                        ('ranges', '单文件字节区间并行：按核数对比 csv.reader'),
+                        ('pipeline', 'CSV→HTML 全流水线分阶段计时'), ('generate', '只生成合成导出文件')):
+        p = sub.add_parser(name, help=help_)
+        p.add_argument('--days', type=int, default=30, help='天数')
+        p.add_argument('--types', type=int, default=1, help='Type 个数')
+        p.add_argument('--splits', type=int, default=None, help='每个 (日期, Type, Action) 拆成的行数')
+        p.add_argument('--rows', type=int, default=None, help='目标行数（换算为 --splits）')
+        p.add_argument('--bad-rows', type=int, default=5, help='插入的坏行数')
+        p.add_argument('--seed', type=int, default=0, help='随机种子')
+        p.add_argument('--oldest-first', action='store_true', help='按日期升序写出（默认与真实导出一致：合计行在前、日期倒序）')
+        if name == 'generate':
+            p.add_argument('output', help='输出 CSV 路径')
+        else:
+            p.add_argument('--file', help='直接使用已有导出文件，不生成合成数据')
+    sub.add_parser('markup', help='明细表标记检查：整表一次写入 / 超过阈值时虚拟滚动（需要 node）')
+    sub.add_parser('phases', help='阶段分段检查：典型放量曲线的分段 + 间歇序列不报错')
+    sub.choices['ranges'].add_argument('--jobs', default=None,
+                                       help='逗号分隔的进程数列表（默认 1、2、4… 直到 CPU 核数）')
+    p = sub.choices['pipeline']
+    p.add_argument('--repeat', type=int, default=3, help='重复次数（各阶段取最小值）')
+    p.add_argument('--no-mem', action='store_true', help='跳过 tracemalloc 堆峰值统计')
+    p.add_argument('--no-page', action='store_true', help='跳过页面 JS 预算探针（需要 node）')
+    p.add_argument('--json', help='结果写入 JSON 文件')
+    p.add_argument('--compare', help='与之前保存的 JSON 结果对比')
+    p.add_argument('--fail-ratio', type=float, default=None, help='任一阶段慢于基线该倍数时以非零状态退出')
+    args = parser.parse_args()
+    if args.cmd not in ('markup', 'phases') and args.splits is None:
+        rows = args.rows or (10_000_000 if args.cmd in ('parser', 'ranges') else 0)
+        args.splits = max(1, -(-rows // (args.days * args.types * len(ACTION_MIX))))
+
+    if args.cmd == 'markup':
+        checked = check_table_markup()
+        if checked is None:
+            sys.exit('未找到 node，无法执行页面脚本')
+        for days, r in checked.items():
+            print(f"{days:>5} 天：表体写入 {r['writes']} 次，渲染 {r['shown']} 行，占位行 {r['spacers'] or '无'}")
+    elif args.cmd == 'phases':
+        for name, runs in check_phases().items():
+            print(f"{name:>12}：{'、'.join(f'{p}×{k}' for p, k in runs)}")
+    elif args.cmd == 'generate':
+        n = write_export(args.output, args.days, args.types, args.splits, args.bad_rows, args.seed, not args.oldest_first)
+        print(f"已生成 {n:,} 行: {args.output}")
+    elif args.cmd == 'parser':
+        _with_export(args, bench_parser)
+    elif args.cmd == 'ranges':
+        cores = os.cpu_count() or 1
+        jobs = ([int(j) for j in args.jobs.split(',')] if args.jobs else
+                sorted({1 << k for k in range(cores.bit_length()) if 1 << k <= cores} | {cores}))
+        print(f"CPU 核数: {cores}")
+        _with_export(args, lambda path: bench_ranges(path, jobs))
+    else:
+        result = _with_export(args, lambda path: run_pipeline(path, args.repeat, not args.no_mem, not args.no_page))
+        result.update(version=BENCH_VERSION, created=datetime.now().isoformat(timespec='seconds'), git=_git_rev(),
+                      python=platform.python_version(),
+                      params={k: getattr(args, k) for k in ('file', 'days', 'types', 'splits', 'bad_rows', 'seed',
+                                                            'oldest_first', 'repeat')})
+        base = None
+        if args.compare:
+            with open(args.compare, encoding='utf-8') as f:
+                base = json.load(f)
+        print_report(result, base)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f"结果已保存: {args.json}")
+        if base and args.fail_ratio:
+            slow = regressions(result, base, args.fail_ratio)
+            if slow:
+                print(f"性能回退（> x{args.fail_ratio}）: {', '.join(slow)}", file=sys.stderr)
+                sys.exit(1)
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""推广原始事件日志 - HyperLogLog 去重人数、按用户外排序的有序漏斗与 t-digest 事件时延"""
+import csv, hashlib, heapq, json, os, tempfile, time, zlib
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from math import inf, log
+
+from analyze_promotion import (ALL_TYPES, CHUNK_SIZE, FUNNEL_FIELDS, PHASES, ROW_FIELDS, _complete_end, _is_report_date,
+                               _tail_digest, compute_metrics, iter_lines)
+
+# 每行一次事件（日期、Type、Action、用户 ID），每个 (Type, 日期, Action) 格子保存次数 + 人数的 HyperLogLog 草图；
+# 跨日 / 跨阶段 / 跨 Type 的去重人数由草图并集估计，不再回扫事件
+SKETCH_P = 12  # 2^12 = 4096 个寄存器，每格 4 KB，标准误差约 1.04 / √4096 ≈ 1.6%
+SKETCH_SUFFIX = '.hll'  # 草图状态旁路文件后缀
+SKETCH_MAGIC = b'PHLL0001'
+EVENT_COLUMNS = {'date': ('日期', 'date'), 'type': ('Type', 'type'), 'action': ('Action', 'action'),
+                 'user': ('用户ID', '用户id', 'user_id', 'uid'), 'time': ('时间', 'time', 'ts', 'timestamp')}
+_HLL_INV = [2.0 ** -r for r in range(65)]
+
+class HyperLogLog:
+    """基数估计草图：寄存器为 bytearray，合并为逐寄存器取 max（可交换、可结合、幂等）"""
+    __slots__ = ('reg',)
+
+    def __init__(self, reg=None):
+        self.reg = bytearray(1 << SKETCH_P) if reg is None else reg
+
+    def add(self, user):
+        h = int.from_bytes(hashlib.blake2b(user.encode('utf-8'), digest_size=8).digest(), 'little')
+        i, w = h >> (64 - SKETCH_P), h & ((1 << (64 - SKETCH_P)) - 1)
+        rank = 64 - SKETCH_P - w.bit_length() + 1
+        if rank > self.reg[i]:
+            self.reg[i] = rank
+
+    @classmethod
+    def union(cls, sketches):
+        """多个草图的并集（新对象，不修改输入）"""
+        regs = [s.reg for s in sketches]
+        while len(regs) > 1:
+            regs = [bytearray(map(max, *regs[k:k + 256])) if len(regs[k:k + 256]) > 1 else regs[k]
+                    for k in range(0, len(regs), 256)]
+        return cls(bytearray(regs[0]) if regs else None)
+
+    def count(self):
+        m = len(self.reg)
+        est = 0.7213 / (1 + 1.079 / m) * m * m / sum(map(_HLL_INV.__getitem__, self.reg))
+        zeros = self.reg.count(0)
+        if est <= 2.5 * m and zeros:  # 小基数：线性计数
+            est = m * log(m / zeros)
+        return round(est)
+
+def event_header(path):
+    """事件日志表头 → EVENT_COLUMNS 各字段的列下标；没有用户列时返回 None"""
+    with open(path, 'rb') as f:
+        line = f.readline(CHUNK_SIZE).decode('gb18030', 'replace')
+    header = [h.strip().lstrip('\ufeff') for h in next(csv.reader([line]), [])]
+    cols = {k: next((header.index(n) for n in names if n in header), None) for k, names in EVENT_COLUMNS.items()}
+    return cols if cols['user'] is not None else None
+
+def is_event_log(path):
+    return path.lower().endswith('.csv') and os.path.isfile(path) and event_header(path) is not None
+
+def _fold_events(rows, cols, cells):
+    """逐事件折叠进 {(type, date, action): [次数, HyperLogLog]}，返回行数"""
+    di, ti, ai, ui = cols['date'], cols['type'], cols['action'], cols['user']
+    if di is None or ai is None:
+        raise ValueError('事件日志缺少 日期 / Action 列')
+    need = max(c for c in (di, ti, ai, ui) if c is not None)
+    n = 0
+    for row in rows:
+        n += 1
+        if len(row) <= need:
+            continue
+        date, action, user = row[di].strip(), row[ai].strip(), row[ui].strip()
+        if not action or not user or not _is_report_date(date):
+            continue
+        key = (ALL_TYPES if ti is None else row[ti].strip(), date, action)
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = [0, HyperLogLog()]
+        cell[0] += 1
+        cell[1].add(user)
+    return n
+
+def _load_sketches(sketch_path):
+    """读取草图旁路文件 → (meta, cells)"""
+    with open(sketch_path, 'rb') as f:
+        data = f.read()
+    if data[:8] != SKETCH_MAGIC:
+        raise ValueError(f'not a sketch file: {sketch_path}')
+    hlen = int.from_bytes(data[8:16], 'little')
+    meta = json.loads(data[16:16 + hlen].decode('utf-8'))
+    if meta['p'] != SKETCH_P:
+        raise ValueError(f'sketch precision mismatch: {meta["p"]}')
+    regs, size = zlib.decompress(data[16 + hlen:]), 1 << SKETCH_P
+    cells = {(t, d, a): [pv, HyperLogLog(bytearray(regs[i * size:(i + 1) * size]))]
+             for i, (t, d, a, pv) in enumerate(meta.pop('cells'))}
+    return meta, cells
+
+def _save_sketches(sketch_path, offset, tail, cells):
+    meta = {'p': SKETCH_P, 'offset': offset, 'tail': tail, 'cells': [[*key, pv] for key, (pv, _) in cells.items()]}
+    header = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+    tmp_path = f'{sketch_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(SKETCH_MAGIC + len(header).to_bytes(8, 'little') + header)
+        f.write(zlib.compress(b''.join(h.reg for _, h in cells.values()), 1))
+    os.replace(tmp_path, sketch_path)
+
+def parse_events(path, stats=None):
+    """解析事件日志为 {(type, date, action): [次数, HyperLogLog]}，草图状态存于 <log>.hll，按字节水位续读"""
+    t0 = time.perf_counter()
+    sketch_path = path + SKETCH_SUFFIX
+    try:
+        meta, cells = _load_sketches(sketch_path)
+        if os.path.getsize(path) < meta['offset'] or _tail_digest(path, meta['offset']) != meta['tail']:
+            raise ValueError('event log rewritten')
+        offset = meta['offset']
+    except (OSError, ValueError, KeyError, zlib.error):
+        offset, cells = 0, {}
+    end, n = _complete_end(path), 0
+    if end > offset:
+        reader = csv.reader(iter_lines(path, stats=stats, start=offset, end=end))
+        if offset == 0:
+            next(reader, None)
+        n = _fold_events(reader, event_header(path), cells)
+        try:
+            _save_sketches(sketch_path, end, _tail_digest(path, end), cells)
+        except OSError:  # 数据目录只读：本次不持久化
+            pass
+    if stats is not None:
+        stats.update(rows=n, append='resume' if offset else 'rebuild', seconds=time.perf_counter() - t0)
+    return cells
+
+def metrics_from_sketches(cells):
+    """{(date, action): [次数, HyperLogLog]} → metrics，m['sketches'] 保留草图供跨日去重"""
+    m = compute_metrics({key: [pv, h.count()] for key, (pv, h) in cells.items()})
+    m['sketches'] = {key: h for key, (_, h) in cells.items()}
+    return m
+
+def sketch_metrics(cells):
+    """parse_events 的结果 → {type: metrics}"""
+    by_type = {}
+    for (t, d, a), cell in cells.items():
+        by_type.setdefault(t, {})[(d, a)] = cell
+    return {t: metrics_from_sketches(c) for t, c in by_type.items()}
+
+def merge_sketch_views(metrics):
+    """“全部”视图：各 Type 草图按 (date, action) 取并集，次数相加"""
+    cells = {}
+    for m in metrics.values():
+        pv, pos = m['matrix']['pv'], {d: i for i, d in enumerate(m['dates'])}
+        for (d, a), h in m['sketches'].items():
+            cell = cells.setdefault((d, a), [0, []])
+            cell[0] += pv[a][pos[d]]
+            cell[1].append(h)
+    return metrics_from_sketches({key: [pv, HyperLogLog.union(hs)] for key, (pv, hs) in cells.items()})
+
+# 按用户的事件分析：外排序（有序段落盘 + 多路归并）把同一用户的事件按时间排到一起，内存只与段大小有关。
+# 一次归并同时算严格有序漏斗与事件间隔时延
+FUNNEL_RUN_ROWS = 1 << 20  # 每个有序段的事件数
+FUNNEL_MAX_RUNS = 256  # 同时归并的段数上限，超过时先分组归并成更大的段
+_EPOCH = datetime(1970, 1, 1)
+
+def _spill_run(lines):
+    """排序后写入系统临时目录的匿名文件（关闭即删除）"""
+    f = tempfile.TemporaryFile()
+    f.writelines(sorted(lines))
+    f.seek(0)
+    return f
+
+def _merge_runs(runs):
+    """段数过多时分组多路归并，直到不超过 FUNNEL_MAX_RUNS"""
+    while len(runs) > FUNNEL_MAX_RUNS:
+        merged = []
+        for k in range(0, len(runs), FUNNEL_MAX_RUNS):
+            group = runs[k:k + FUNNEL_MAX_RUNS]
+            f = tempfile.TemporaryFile()
+            f.writelines(heapq.merge(*group))
+            f.seek(0)
+            for g in group:
+                g.close()
+            merged.append(f)
+        runs = merged
+    return runs
+
+def _event_ms(date, t):
+    """事件时间（Unix 秒 / 毫秒或 ISO 时间，缺省为当天零点）→ 毫秒时间戳；无法解析时返回 None"""
+    try:
+        if t.isdigit():
+            v = int(t)
+            return v if v >= 10 ** 11 else v * 1000
+        dt = datetime.fromisoformat(t if '-' in t else f'{date}T{t}' if t else date)
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    ms = (dt - _EPOCH) // timedelta(milliseconds=1)
+    return ms if ms >= 0 else None
+
+def spill_event_runs(path, actions, run_rows=FUNNEL_RUN_ROWS, stats=None):
+    """外排序第一遍：actions 中的事件按 (用户, 时间, 原始顺序) 排序后分段落盘，返回 (段文件列表, 行数)"""
+    cols = event_header(path)
+    di, ti, ai, ui, tc = (cols[k] for k in ('date', 'type', 'action', 'user', 'time'))
+    if di is None or ai is None:
+        raise ValueError('事件日志缺少 日期 / Action 列')
+    need = max(c for c in (di, ti, ai, ui, tc) if c is not None)
+    step_of = {action: i for i, action in enumerate(actions)}
+    reader = csv.reader(iter_lines(path, stats=stats))
+    next(reader, None)
+    runs, buf, n = [], [], 0
+    try:
+        for n, row in enumerate(reader, 1):
+            if len(row) <= need:
+                continue
+            step, date, user = step_of.get(row[ai].strip()), row[di].strip(), row[ui].strip()
+            if step is None or not user or not _is_report_date(date):
+                continue
+            ms = _event_ms(date, '' if tc is None else row[tc].strip())
+            if ms is None:
+                continue
+            typ = ALL_TYPES if ti is None else row[ti].strip()
+            # 行格式 “用户\t毫秒\t文件内序号\t日期\tType\t下标”，字节序即排序键
+            buf.append('\t'.join((user.replace('\t', ' '), f'{ms:015d}', f'{n:012x}', date, typ, str(step)))
+                       .encode('utf-8') + b'\n')
+            if len(buf) >= run_rows:
+                runs.append(_spill_run(buf))
+                buf.clear()
+        if buf:
+            runs.append(_spill_run(buf))
+        return _merge_runs(runs), n
+    except BaseException:
+        for f in runs:
+            f.close()
+        raise
+
+def iter_user_events(runs):
+    """归并各有序段，逐用户产出按时间排好的 [(日期, 毫秒, Type, 下标)]"""
+    for _, lines in groupby(heapq.merge(*runs), key=lambda line: line[:line.index(b'\t')]):
+        yield [(date, int(ms), typ, int(step)) for _, ms, _, date, typ, step in
+               (line.rstrip(b'\n').split(b'\t') for line in lines)]
+
+# 事件间隔时延：每对 (起点 Action, 终点 Action) 取同一用户、同一 Type 下最近一次起点到其后第一次终点的间隔，
+# 按 (Type, 起点日期) 记入 t-digest；每格内存有上界，与样本数基本无关
+TDIGEST_DELTA = 25  # 压缩参数 δ：质心数只随样本数对数增长（100 万样本约 200 个），p50 / p90 / p99 误差 < 0.5%
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+LATENCY_PAIRS = (
+    ('trigger→show', 'promotion_trigger', 'pop_show'),
+    ('show→click', 'pop_show', 'pop_click'),
+    ('show→close', 'pop_show', 'pop_close'),
+    ('show→timeout', 'pop_show', 'kk_pop_timeout'),
+    ('下载→成功', 'down_start', 'down_end_suc'),
+    ('下载→失败', 'down_start', 'down_end_fail'),
+)
+
+class TDigest:
+    """合并式 t-digest：分位 q 处的质心权重不超过 4·N·q(1−q)/δ，两端趋于单点，尾部分位最准"""
+    __slots__ = ('cents', 'buf', 'lo', 'hi')
+
+    def __init__(self):
+        self.cents, self.buf = [], []  # [(均值, 权重)]
+        self.lo, self.hi = inf, -inf
+
+    def add(self, x, w=1):
+        self.buf.append((x, w))
+        self.lo, self.hi = min(self.lo, x), max(self.hi, x)
+        if len(self.buf) >= 5 * TDIGEST_DELTA:
+            self._compress()
+
+    @classmethod
+    def merged(cls, digests):
+        """多个草图一次合并：所有质心一起排序后最多压缩一次"""
+        out = cls()
+        for d in digests:
+            out.buf += d.cents + d.buf
+            out.lo, out.hi = min(out.lo, d.lo), max(out.hi, d.hi)
+        if len(out.buf) >= 5 * TDIGEST_DELTA:
+            out._compress()
+        return out
+
+    @property
+    def count(self):
+        return sum(w for _, w in self.cents) + sum(w for _, w in self.buf)
+
+    def _compress(self):
+        if not self.buf:
+            return
+        pts = sorted(self.cents + self.buf)
+        self.buf = []
+        total = sum(w for _, w in pts)
+        scale = 4 * total / TDIGEST_DELTA
+        out, done = [], 0
+        mean, weight = pts[0]
+        for x, w in pts[1:]:
+            q = (done + (weight + w) / 2) / total
+            if weight + w <= max(1, scale * q * (1 - q)):
+                weight += w
+                mean += (x - mean) * w / weight
+            else:
+                out.append((mean, weight))
+                done += weight
+                mean, weight = x, w
+        out.append((mean, weight))
+        self.cents = out
+
+    def quantile(self, q):
+        """分位数估计：质心中心之间线性插值，两端插值到最小 / 最大样本；空草图返回 None"""
+        self._compress()
+        c = self.cents
+        if not c:
+            return None
+        target = q * sum(w for _, w in c)
+        cum = 0
+        prev_x, prev_at = self.lo, 0
+        for mean, w in c:
+            at = cum + w / 2
+            if target <= at:
+                return prev_x + (mean - prev_x) * ((target - prev_at) / (at - prev_at) if at > prev_at else 1)
+            prev_x, prev_at = mean, at
+            cum += w
+        return prev_x + (self.hi - prev_x) * ((target - prev_at) / (cum - prev_at) if cum > prev_at else 1)
+
+def _funnel_level(events, fsteps, want, dates):
+    """单个用户在一个视图口径（Type、日期集合）下按时间顺序到达的漏斗步数"""
+    level, steps = 0, len(FUNNEL_FIELDS)
+    for date, _, typ, step in events:
+        if fsteps[step] == level and date in dates and (want is None or typ == want):
+            level += 1
+            if level == steps:
+                break
+    return level
+
+def _pair_latencies(events, starts, ends, cells):
+    """单个用户的事件间隔（秒）记入 {(Type, 起点日期, 时延对下标): TDigest}"""
+    pending = {}
+    for date, ms, typ, step in events:
+        for k in ends[step]:  # 同一 Action 先作终点再作起点
+            begin = pending.pop((typ, k), None)
+            if begin is not None:
+                key = (typ, begin[0], k)
+                digest = cells.get(key)
+                if digest is None:
+                    digest = cells[key] = TDigest()
+                digest.add((ms - begin[1]) / 1000)
+        for k in starts[step]:
+            pending[(typ, k)] = (date, ms)
+
+def latency_summary(by_pair, dates):
+    """{时延对下标: {日期: TDigest}} → {pairs, total: [[样本数, p50, p90, p99]], p90: [[逐日 p90]]}（秒）"""
+    total, daily = [], []
+    for k in range(len(LATENCY_PAIRS)):
+        by_day = by_pair.get(k, {})
+        merged = TDigest.merged(by_day.values())
+        qs = [merged.quantile(q) for q in LATENCY_QUANTILES]
+        total.append([merged.count] + [None if v is None else round(v, 2) for v in qs])
+        daily.append([round(by_day[d].quantile(0.9), 2) if d in by_day else None for d in dates])
+    return {'pairs': [label for label, _, _ in LATENCY_PAIRS], 'total': total, 'p90': daily}
+
+def user_event_pass(path, views, funnel=True, latency=True, run_rows=FUNNEL_RUN_ROWS, stats=None):
+    """一次外排序逐用户分析：有序漏斗存入 m['ordered_funnel']，时延分位（latency_summary）存入 m['latency']"""
+    t0 = time.perf_counter()
+    actions = dict(ROW_FIELDS)
+    names = list(dict.fromkeys([actions[f] for f in FUNNEL_FIELDS] + [a for _, s, e in LATENCY_PAIRS for a in (s, e)]))
+    fsteps = [next((i for i, f in enumerate(FUNNEL_FIELDS) if actions[f] == a), -1) for a in names]
+    starts = [[k for k, (_, s, _) in enumerate(LATENCY_PAIRS) if s == a] for a in names]
+    ends = [[k for k, (_, _, e) in enumerate(LATENCY_PAIRS) if e == a] for a in names]
+    # 口径与汇总漏斗一致：排除灰测期
+    scopes = {label: (None if label == ALL_TYPES else label.encode('utf-8'),
+                      {d.encode() for d, p in zip(m['dates'], m['phase']) if p != PHASES[0]})
+              for label, m in views.items()}
+    reach = {label: [0] * len(FUNNEL_FIELDS) for label in scopes}
+    cells, users = {}, 0
+    runs, n = spill_event_runs(path, names, run_rows, stats)
+    try:
+        for events in iter_user_events(runs):
+            users += 1
+            if funnel:
+                for label, (want, dates) in scopes.items():
+                    counts = reach[label]
+                    for k in range(_funnel_level(events, fsteps, want, dates)):
+                        counts[k] += 1
+            if latency:
+                _pair_latencies(events, starts, ends, cells)
+    finally:
+        for f in runs:
+            f.close()
+    for label, m in views.items():
+        if funnel:
+            m['ordered_funnel'] = reach[label]
+        if latency:
+            want = scopes[label][0]
+            parts = {}
+            for (typ, date, k), digest in cells.items():
+                if want is None or typ == want:
+                    parts.setdefault(k, {}).setdefault(date.decode(), []).append(digest)
+            by_pair = {k: {day: TDigest.merged(ds) for day, ds in by_day.items()} for k, by_day in parts.items()}
+            m['latency'] = latency_summary(by_pair, m['dates'])
+    if stats is not None:
+        stats.update(rows=n, users=users, runs=len(runs), seconds=time.perf_counter() - t0)
+    return views
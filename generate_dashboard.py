@@ -1,9 +1,13 @@
-import csv
-import json
+import argparse
 import os
 from collections import defaultdict
 from datetime import datetime
 
+from analyze_promotion import (CHART_MAX_POINTS, _pyarrow, add_profile_args, add_render_args, agg_format,
+                               compile_template, expand_inputs, is_store, load_inputs, lttb, profiler_from_args,
+                               render_template, report_throughput, run_renderers, svg_path, thin_labels,
+                               view_metrics)
+
 # Configuration
 INPUT_FILE = '/Users/jennifer/LDS/26-Q1/AI应用推广模块/夸克弹窗推广数据0224.csv'
 OUTPUT_FILE = '/Users/jennifer/LDS/26-Q1/AI应用推广模块/promotion_dashboard.html'
@@ -23,53 +27,13 @@ COLORS = {
     'muted': '#4b5563'
 }
 
-def parse_int(s):
-    if not s:
-        return 0
-    try:
-        return int(s)
-    except ValueError:
-        return 0
-
-def load_data(file_path):
-    data = []
-    try:
-        with open(file_path, 'r', encoding='gb18030', errors='replace') as f:
-            reader = csv.reader(f)
-            headers = next(reader)
-            for row in reader:
-                if len(row) < 7:
-                    continue
-                if row[3] == '' or row[1] == '总计' or '�ϼ�' in row[1]:
-                    continue
-                
-                record = {
-                    'date': row[1],
-                    'action': row[3],
-                    'pv': parse_int(row[5]),
-                    'uv': parse_int(row[6])
-                }
-                data.append(record)
-    except Exception as e:
-        print(f"Error reading file: {e}")
-        return []
-    return data
-
-def process_data(data):
-    daily_data = defaultdict(lambda: defaultdict(int))
-    all_dates = set()
-    
-    for item in data:
-        date = item['date']
-        action = item['action']
-        daily_data[date][action] += item['pv']
-        all_dates.add(date)
-    
-    sorted_dates = sorted(list(all_dates))
+def process_metrics(m):
+    """Per-day rows for the overview from one shared-core view (pv plane); stages come from the core's phases."""
+    pv = m['matrix']['pv']
     processed = []
     
-    for date in sorted_dates:
-        actions = daily_data[date]
+    for i, date in enumerate(m['dates']):
+        actions = {action: col[i] for action, col in pv.items()}
         start = actions.get('start', 0)
         pop_show = actions.get('pop_show', 0)
         pop_click = actions.get('pop_click', 0)
@@ -77,19 +41,10 @@ def process_data(data):
         down_suc = actions.get('down_suc', 0)
         down_end_suc = actions.get('down_end_suc', 0)
         break_count = actions.get('break', 0)
-        
-        # Determine Stage
-        stage = "Unknown"
-        if start < 1000:
-            stage = "灰测期"
-        elif start < 10000:
-            stage = "灰度扩量"
-        else:
-            stage = "正式放量"
             
         metrics = {
             'date': date,
-            'stage': stage,
+            'stage': m['phase'][i],
             'start': start,
             'pop_show': pop_show,
             'pop_click': pop_click,
@@ -111,9 +66,53 @@ def process_data(data):
         
     return processed
 
+def dense_series(values, max_val, width, height, padding):
+    """LTTB-downsampled (x, y) points for one series on the shared slot grid."""
+    x_step = (width - 2 * padding) / len(values)
+    return [(padding + i * x_step + x_step / 2, height - padding - values[i] / max_val * (height - 2 * padding))
+            for i in lttb(values, CHART_MAX_POINTS)]
+
+def dense_axis(dates, width, height, padding):
+    x_step = (width - 2 * padding) / len(dates)
+    return [f'<text x="{padding + i * x_step + x_step / 2:.1f}" y="{height-10}" text-anchor="middle" '
+            f'fill="{COLORS["muted"]}" font-size="10">{dates[i][5:]}</text>' for i in thin_labels(len(dates))]
+
+def generate_svg_trend_dense(data, width=1000, height=300, padding=40):
+    """Long ranges: start/show as area paths and clicks as one line, all downsampled,
+    with thinned x labels, so the node count no longer grows with the number of days."""
+    starts = [d['start'] for d in data]
+    shows = [d['pop_show'] for d in data]
+    clicks = [d['pop_click'] for d in data]
+    max_val = max(starts) or 100
+    max_click = max(clicks)
+    click_scale = (max_val / max_click) * 0.5 if max_click > 0 else 1
+    base = height - padding
+
+    svg = [f'<svg viewBox="0 0 {width} {height}" class="chart">']
+    for i in range(5):
+        y = height - padding - (i * (height - 2 * padding) / 4)
+        svg.append(f'<line x1="{padding}" y1="{y}" x2="{width-padding}" y2="{y}" stroke="{COLORS["border"]}" stroke-dasharray="4" />')
+        svg.append(f'<text x="{padding-5}" y="{y+5}" text-anchor="end" fill="{COLORS["muted"]}" font-size="10">{int(max_val * i / 4)}</text>')
+    svg.append(f'<path d="{svg_path(dense_series(starts, max_val, width, height, padding), base)}" fill="{COLORS["c1"]}" opacity="0.5" />')
+    svg.append(f'<path d="{svg_path(dense_series(shows, max_val, width, height, padding), base)}" fill="{COLORS["c2"]}" opacity="0.5" />')
+    scaled = [c * click_scale for c in clicks]
+    svg.append(f'<path d="{svg_path(dense_series(scaled, max_val, width, height, padding))}" fill="none" stroke="{COLORS["c3"]}" stroke-width="1.5" />')
+    svg.extend(dense_axis([d['date'] for d in data], width, height, padding))
+
+    svg.append(f'<rect x="{width-300}" y="10" width="10" height="10" fill="{COLORS["c1"]}" />')
+    svg.append(f'<text x="{width-285}" y="19" fill="{COLORS["text"]}" font-size="12">Start</text>')
+    svg.append(f'<rect x="{width-240}" y="10" width="10" height="10" fill="{COLORS["c2"]}" />')
+    svg.append(f'<text x="{width-225}" y="19" fill="{COLORS["text"]}" font-size="12">Show</text>')
+    svg.append(f'<line x1="{width-180}" y1="15" x2="{width-160}" y2="15" stroke="{COLORS["c3"]}" stroke-width="2" />')
+    svg.append(f'<text x="{width-155}" y="19" fill="{COLORS["text"]}" font-size="12">Click (x{click_scale:.1f})</text>')
+    svg.append('</svg>')
+    return "".join(svg)
+
 def generate_svg_trend(data):
     if not data:
         return ""
+    if len(data) > CHART_MAX_POINTS:
+        return generate_svg_trend_dense(data)
     
     width = 1000
     height = 300
@@ -187,9 +186,27 @@ def generate_svg_trend(data):
     svg.append('</svg>')
     return "".join(svg)
 
+def generate_svg_ctr_dense(data, width=1000, height=200, padding=40):
+    """Long ranges: downsampled CTR area + line with thinned x labels."""
+    ctrs = [d['ctr'] for d in data]
+    max_ctr = max(max(ctrs), 2)
+    y_ref = height - padding - (1.0 / max_ctr) * (height - 2 * padding)
+    points = dense_series(ctrs, max_ctr, width, height, padding)
+
+    svg = [f'<svg viewBox="0 0 {width} {height}" class="chart">']
+    svg.append(f'<line x1="{padding}" y1="{y_ref}" x2="{width-padding}" y2="{y_ref}" stroke="{COLORS["c4"]}" stroke-dasharray="4" opacity="0.5" />')
+    svg.append(f'<text x="{width-padding+5}" y="{y_ref+4}" fill="{COLORS["c4"]}" font-size="10">1% Target</text>')
+    svg.append(f'<path d="{svg_path(points, height - padding)}" fill="{COLORS["c3"]}" fill-opacity="0.1" />')
+    svg.append(f'<path d="{svg_path(points)}" fill="none" stroke="{COLORS["text"]}" stroke-width="1" opacity="0.5" />')
+    svg.extend(dense_axis([d['date'] for d in data], width, height, padding))
+    svg.append('</svg>')
+    return "".join(svg)
+
 def generate_svg_ctr(data):
     if not data:
         return ""
+    if len(data) > CHART_MAX_POINTS:
+        return generate_svg_ctr_dense(data)
     width = 1000
     height = 200
     padding = 40
@@ -270,116 +287,109 @@ def generate_svg_funnel(agg_data):
     svg.append('</svg>')
     return "".join(svg)
 
-def generate_html(processed_data):
-    # Aggregation
-    total_metrics = defaultdict(int)
-    for d in processed_data:
-        for k, v in d['actions'].items():
-            total_metrics[k] += v
-    
-    # HTML Template
-    html = f"""<!DOCTYPE html>
+# Static page shell: @@name@@ marks a data slot; COLORS are baked in when the template is compiled
+DASHBOARD_TEMPLATE = """<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>推广模块放量埋点分析看板</title>
     <style>
-        :root {{
-            --bg: {COLORS['bg']};
-            --surface: {COLORS['surface']};
-            --surface2: {COLORS['surface2']};
-            --border: {COLORS['border']};
-            --c1: {COLORS['c1']};
-            --c2: {COLORS['c2']};
-            --c3: {COLORS['c3']};
-            --c4: {COLORS['c4']};
-            --c5: {COLORS['c5']};
-            --text: {COLORS['text']};
-            --muted: {COLORS['muted']};
-        }}
-        body {{
+        :root {
+            --bg: @@color_bg@@;
+            --surface: @@color_surface@@;
+            --surface2: @@color_surface2@@;
+            --border: @@color_border@@;
+            --c1: @@color_c1@@;
+            --c2: @@color_c2@@;
+            --c3: @@color_c3@@;
+            --c4: @@color_c4@@;
+            --c5: @@color_c5@@;
+            --text: @@color_text@@;
+            --muted: @@color_muted@@;
+        }
+        body {
             background-color: var(--bg);
             color: var(--text);
             font-family: 'Segoe UI', Roboto, Helvetica, Arial, sans-serif;
             margin: 0;
             padding: 20px;
-        }}
-        .container {{
+        }
+        .container {
             max_width: 1200px;
             margin: 0 auto;
-        }}
-        .header {{
+        }
+        .header {
             margin-bottom: 30px;
             border-bottom: 1px solid var(--border);
             padding-bottom: 20px;
-        }}
-        .kpi-grid {{
+        }
+        .kpi-grid {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
             gap: 20px;
             margin-bottom: 30px;
-        }}
-        .card {{
+        }
+        .card {
             background-color: var(--surface);
             border: 1px solid var(--border);
             border-radius: 8px;
             padding: 20px;
-        }}
-        .kpi-card h3 {{
+        }
+        .kpi-card h3 {
             margin: 0;
             font-size: 14px;
             color: var(--muted);
-        }}
-        .kpi-card .value {{
+        }
+        .kpi-card .value {
             font-size: 28px;
             font-weight: bold;
             margin: 10px 0 0;
-        }}
-        .chart-section {{
+        }
+        .chart-section {
             margin-bottom: 30px;
-        }}
-        .chart-section h2 {{
+        }
+        .chart-section h2 {
             font-size: 18px;
             margin-bottom: 15px;
             border-left: 4px solid var(--c1);
             padding-left: 10px;
-        }}
-        table {{
+        }
+        table {
             width: 100%;
             border-collapse: collapse;
             font-size: 14px;
-        }}
-        th, td {{
+        }
+        th, td {
             text-align: left;
             padding: 12px;
             border-bottom: 1px solid var(--border);
-        }}
-        th {{
+        }
+        th {
             color: var(--muted);
-        }}
-        .badge {{
+        }
+        .badge {
             padding: 2px 6px;
             border-radius: 4px;
             font-size: 12px;
             background-color: var(--surface2);
-        }}
-        .text-green {{ color: var(--c3); }}
-        .text-amber {{ color: var(--c4); }}
-        .text-red {{ color: var(--c5); }}
+        }
+        .text-green { color: var(--c3); }
+        .text-amber { color: var(--c4); }
+        .text-red { color: var(--c5); }
         
-        .insights-grid {{
+        .insights-grid {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
             gap: 20px;
-        }}
-        .insight-card {{
+        }
+        .insight-card {
             border-left: 4px solid var(--border);
-        }}
-        .insight-card.red {{ border-left-color: var(--c5); }}
-        .insight-card.blue {{ border-left-color: var(--c1); }}
-        .insight-card.green {{ border-left-color: var(--c3); }}
-        .insight-card.amber {{ border-left-color: var(--c4); }}
+        }
+        .insight-card.red { border-left-color: var(--c5); }
+        .insight-card.blue { border-left-color: var(--c1); }
+        .insight-card.green { border-left-color: var(--c3); }
+        .insight-card.amber { border-left-color: var(--c4); }
         
     </style>
 </head>
@@ -387,58 +397,58 @@ def generate_html(processed_data):
     <div class="container">
         <div class="header">
             <h1>推广模块放量埋点分析看板</h1>
-            <p style="color: var(--muted)">数据周期: {processed_data[0]['date']} 至 {processed_data[-1]['date']} | 生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
+            <p style="color: var(--muted)">数据周期: @@date_start@@ 至 @@date_end@@ | 生成时间: @@generated_at@@</p>
         </div>
 
         <div class="kpi-grid">
             <div class="card kpi-card">
                 <h3>总启动 (Start)</h3>
-                <div class="value" style="color: var(--c1)">{total_metrics['start']:,}</div>
+                <div class="value" style="color: var(--c1)">@@total_start@@</div>
             </div>
             <div class="card kpi-card">
                 <h3>总曝光 (Show)</h3>
-                <div class="value" style="color: var(--c2)">{total_metrics['pop_show']:,}</div>
+                <div class="value" style="color: var(--c2)">@@total_show@@</div>
             </div>
             <div class="card kpi-card">
                 <h3>总点击 (Click)</h3>
-                <div class="value" style="color: var(--c3)">{total_metrics['pop_click']:,}</div>
+                <div class="value" style="color: var(--c3)">@@total_click@@</div>
             </div>
             <div class="card kpi-card">
                 <h3>总安装成功 (Install)</h3>
-                <div class="value" style="color: var(--c4)">{total_metrics['down_end_suc']:,}</div>
+                <div class="value" style="color: var(--c4)">@@total_install@@</div>
             </div>
             <div class="card kpi-card">
                 <h3>平均点击率 (CTR)</h3>
-                <div class="value" style="color: {(COLORS['c5'] if (total_metrics['pop_click']/total_metrics['pop_show'] < 0.01) else COLORS['c3'])}">
-                    {(total_metrics['pop_click'] / total_metrics['pop_show'] * 100 if total_metrics['pop_show'] > 0 else 0):.2f}%
+                <div class="value" style="color: @@ctr_color@@">
+                    @@ctr@@%
                 </div>
             </div>
         </div>
 
         <div class="chart-section card">
             <h2>每日流量趋势 (Show vs Click)</h2>
-            {generate_svg_trend(processed_data)}
+            @@svg_trend@@
         </div>
 
         <div class="chart-section card">
             <h2>点击率 (CTR) 趋势</h2>
-            {generate_svg_ctr(processed_data)}
+            @@svg_ctr@@
         </div>
         
         <div class="chart-section card">
             <h2>全周期漏斗分析</h2>
-            {generate_svg_funnel(total_metrics)}
+            @@svg_funnel@@
         </div>
 
         <div class="chart-section card">
             <h2>关键洞察</h2>
             <div class="insights-grid">
                 <div class="card insight-card red">
-                    <h3 class="text-red">核心瓶颈: CTR { (total_metrics['pop_click'] / total_metrics['pop_show'] * 100 if total_metrics['pop_show'] > 0 else 0):.2f}%</h3>
+                    <h3 class="text-red">核心瓶颈: CTR @@ctr@@%</h3>
                     <p>整体点击率持续低于 1%，远低于 3% 的健康基准。这是目前最大的流失环节，建议优先优化弹窗素材。</p>
                 </div>
                 <div class="card insight-card green">
-                    <h3 class="text-green">亮点: 安装转化率 {(total_metrics['down_end_suc'] / total_metrics['pop_click'] * 100 if total_metrics['pop_click'] > 0 else 0):.1f}%</h3>
+                    <h3 class="text-green">亮点: 安装转化率 @@install_rate@@%</h3>
                     <p>点击后的用户有极高的意愿完成下载和安装（>80%），说明技术链路稳定，且点击用户精准。</p>
                 </div>
                 <div class="card insight-card blue">
@@ -466,13 +476,39 @@ def generate_html(processed_data):
                     </tr>
                 </thead>
                 <tbody>
+@@table_rows@@
+                </tbody>
+            </table>
+        </div>
+        
+        <div class="chart-section card">
+            <h2>优化建议</h2>
+            <ol>
+                <li><strong>突破弹窗 CTR (P0):</strong> 当前 CTR 不足 1%，建议立即进行 A/B 测试，尝试更具吸引力的文案或利益点（如强调免费、新功能）。</li>
+                <li><strong>关注 Break 率:</strong> 部分日期 Break 率较高，需排查是否打扰用户体验。</li>
+                <li><strong>保持下载链路:</strong> 继续监控下载成功率，维持当前的高水平转化。</li>
+            </ol>
+        </div>
+    </div>
+</body>
+</html>
 """
-    
+_DASHBOARD = compile_template(DASHBOARD_TEMPLATE, **{f'color_{k}': v for k, v in COLORS.items()})
+
+def render_dashboard(processed_data):
+    """Render the page as a list of byte chunks: precompiled static segments interleaved with data slots."""
+    # Aggregation
+    total_metrics = defaultdict(int)
+    for d in processed_data:
+        for k, v in d['actions'].items():
+            total_metrics[k] += v
+
+    rows = []
     for d in processed_data:
         ctr_color = "text-green" if d['ctr'] > 1.5 else ("text-amber" if d['ctr'] > 1 else "text-red")
         install_rate_color = "text-green" if d['click_to_install_rate'] > 80 else "text-amber"
         
-        html += f"""
+        rows.append(f"""
                     <tr>
                         <td>{d['date']}</td>
                         <td>{d['start']}</td>
@@ -485,44 +521,90 @@ def generate_html(processed_data):
                         <td>{d['break_rate']:.1f}%</td>
                         <td><span class="badge">{d['stage']}</span></td>
                     </tr>
-        """
+        """)
 
-    html += """
-                </tbody>
-            </table>
-        </div>
-        
-        <div class="chart-section card">
-            <h2>优化建议</h2>
-            <ol>
-                <li><strong>突破弹窗 CTR (P0):</strong> 当前 CTR 不足 1%，建议立即进行 A/B 测试，尝试更具吸引力的文案或利益点（如强调免费、新功能）。</li>
-                <li><strong>关注 Break 率:</strong> 部分日期 Break 率较高，需排查是否打扰用户体验。</li>
-                <li><strong>保持下载链路:</strong> 继续监控下载成功率，维持当前的高水平转化。</li>
-            </ol>
-        </div>
-    </div>
-</body>
-</html>
-"""
-    return html
+    slots = {
+        'date_start': processed_data[0]['date'],
+        'date_end': processed_data[-1]['date'],
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M'),
+        'total_start': f"{total_metrics['start']:,}",
+        'total_show': f"{total_metrics['pop_show']:,}",
+        'total_click': f"{total_metrics['pop_click']:,}",
+        'total_install': f"{total_metrics['down_end_suc']:,}",
+        'ctr_color': COLORS['c5'] if total_metrics['pop_click'] / total_metrics['pop_show'] < 0.01 else COLORS['c3'],
+        'ctr': f"{(total_metrics['pop_click'] / total_metrics['pop_show'] * 100 if total_metrics['pop_show'] > 0 else 0):.2f}",
+        'install_rate': f"{(total_metrics['down_end_suc'] / total_metrics['pop_click'] * 100 if total_metrics['pop_click'] > 0 else 0):.1f}",
+        'svg_trend': generate_svg_trend(processed_data),
+        'svg_ctr': generate_svg_ctr(processed_data),
+        'svg_funnel': generate_svg_funnel(total_metrics),
+        'table_rows': ''.join(rows),
+    }
+    return render_template(_DASHBOARD, slots)
 
-def main():
-    print(f"Reading data from {INPUT_FILE}...")
-    data = load_data(INPUT_FILE)
-    if not data:
+def generate_html(processed_data):
+    return b''.join(render_dashboard(processed_data)).decode('utf-8')
+
+def write_overview(views, path, stats=None):
+    """Overview renderer for the shared core: draws the first view (all placements combined) and
+    replaces the output atomically. Returns False when there are no days to draw."""
+    processed_data = process_metrics(next(iter(views.values())))
+    if not processed_data:
+        return False
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.writelines(render_dashboard(processed_data))
+    os.replace(tmp_path, path)
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the promotion dashboard HTML.')
+    parser.add_argument('inputs', nargs='*', default=[INPUT_FILE], help='CSV file(s), directory or glob; shards are parsed in parallel')
+    parser.add_argument('-o', '--output', default=OUTPUT_FILE, help='output HTML path')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--start', help='first date YYYY-MM-DD (Parquet / Arrow / SQLite input only, pushed down to the reader)')
+    parser.add_argument('--end', help='last date YYYY-MM-DD, inclusive (Parquet / Arrow / SQLite input only)')
+    add_render_args(parser)
+    add_profile_args(parser)
+    args = parser.parse_args(argv)
+    paths = expand_inputs(args.inputs)
+    agg = len(paths) == 1 and agg_format(paths[0]) is not None
+    store = len(paths) == 1 and is_store(paths[0])
+    if (args.start or args.end) and not (agg or store):
+        parser.error('--start/--end require a single Parquet / Arrow aggregate or SQLite store input')
+    if agg:
+        try:
+            _pyarrow()
+        except ImportError as e:
+            parser.error(str(e))
+    prof = profiler_from_args(args)
+
+    print(f"Reading data from {paths[0] if len(paths) == 1 else f'{len(paths)} shards'}...")
+    stats = {}
+    with prof.stage('load') as rec:
+        metrics = load_inputs(paths, args.jobs, args.start, args.end, stats=stats)
+        rec.update(rows=stats.get('rows', 0), io=stats.get('io_seconds', 0))
+    views = view_metrics(metrics)
+    if not next(iter(views.values()))['dates']:
         print("No data found.")
         return
+    report_throughput(stats)
 
-    print(f"Processing {len(data)} records...")
-    processed_data = process_data(data)
+    with prof.stage('process') as rec:
+        processed_data = process_metrics(next(iter(views.values())))
+        rec['rows'] = len(processed_data)
+    print(f"Processing {len(processed_data)} days...")
     
     print("Generating HTML...")
-    html_content = generate_html(processed_data)
+    with prof.stage('html'):
+        html_parts = render_dashboard(processed_data)
     
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    with prof.stage('write'):
+        with open(args.output, 'wb') as f:
+            f.writelines(html_parts)
         
-    print(f"Dashboard generated at: {OUTPUT_FILE}")
+    print(f"Dashboard generated at: {args.output}")
+    run_renderers(args.render, views, prof)
+    prof.finish()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""推广数据看板服务 - 常驻内存聚合，监视导出文件变化增量刷新，提供看板页面与 JSON 接口"""
+import argparse, hashlib, json, os, sys, threading, time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from analyze_promotion import (CSV_PATH, RATE_FIELDS, ROW_FIELDS, RenderCache, append_state, build_views, compute_metrics, expand_inputs,
+                               fold_partials, iter_shard_parts, merge_partials, range_index, report_throughput,
+                               view_payload)
+from events_promotion import is_event_log, parse_events, sketch_metrics
+
+JSON_KINDS = ('rows', 'insights', 'suggestions')
+
+def _entry(body, content_type):
+    """预先编码好的响应：(body, Content-Type, ETag)"""
+    return body, content_type, '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+
+def _json_entry(obj):
+    return _entry(json.dumps(obj, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+
+def _copy_metrics(metrics):
+    """增量折叠会原地追加日期、计数列与派生率列；只浅复制这些容器（不含可重建的 RangeIndex 缓存）"""
+    out = {}
+    for t, m in metrics.items():
+        mx = m['matrix']
+        mx = {'dates': mx['dates'][:], 'pv': {a: col[:] for a, col in mx['pv'].items()},
+              'uv': {a: col[:] for a, col in mx['uv'].items()}}
+        c = out[t] = {k: v for k, v in m.items() if k != 'index'}
+        c.update(dates=mx['dates'], matrix=mx, phase=m['phase'][:])
+        for field, action in ROW_FIELDS:
+            c[field] = mx['uv'][action]
+        for field, _, _ in RATE_FIELDS:
+            c[field] = m[field][:]
+    return out
+
+class DashboardStore:
+    """内存中的各 Type 指标与渲染结果。单个文件时按字节水位增量折叠新增行；
+    多个分片时只重解析大小 / mtime 变化的分片，再与缓存的分片结果合并"""
+
+    def __init__(self, specs, jobs=None):
+        self.specs, self.jobs = specs, jobs
+        self.signature = None
+        self.state = None      # 单文件增量状态（append_state）
+        self.parts = {}        # 分片路径 → ((size, mtime_ns), partial)
+        self.snapshot = {}     # 路由 → _entry；整体替换，读者无需加锁
+        self.generation = 0
+        self.refreshed = None
+        self.render_cache = RenderCache()  # 文件被 touch / 重写但数据未变时复用页面字节，ETag 不变
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        sig = []
+        for path in expand_inputs(self.specs):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            sig.append((path, st.st_size, st.st_mtime_ns))
+        return tuple(sig)
+
+    def _load_single(self, path, stats):
+        if is_event_log(path):  # 原始事件日志：草图状态在 <log>.hll 中按水位续读
+            self.state = None
+            self.parts.clear()
+            return sketch_metrics(parse_events(path, stats))
+        if self.state is not None and self.state.get('path') != path:
+            self.state = None
+        # 线上快照（RangeIndex 等）仍引用上一版指标，在副本上折叠，读者不会看到半更新的数据
+        state = self.state and dict(self.state, metrics=_copy_metrics(self.state['metrics']))
+        self.state = dict(append_state(path, state, stats), path=path)
+        self.parts.clear()
+        return self.state['metrics']
+
+    def _load_shards(self, sig, stats):
+        self.state = None
+        current = {path: (size, mtime) for path, size, mtime in sig}
+        for path in set(self.parts) - set(current):
+            del self.parts[path]
+        changed = [p for p, key in current.items() if p not in self.parts or self.parts[p][0] != key]
+        n = 0
+        for path, part, rows, _ in iter_shard_parts(changed, self.jobs):
+            self.parts[path] = (current[path], part)
+            n += rows
+        acc = {}
+        for _, part in self.parts.values():
+            merge_partials(acc, part)
+        stats.update(rows=n, shards=len(changed))
+        return {t: compute_metrics(daily) for t, daily in fold_partials(acc).items()}
+
+    def refresh(self, force=False):
+        """输入有变化（或 force）时重新聚合、渲染并替换快照；返回是否刷新"""
+        with self._lock:
+            sig = self._signature()
+            if sig == self.signature and not force:
+                return False
+            t0 = time.perf_counter()
+            stats = {}
+            metrics = (self._load_single(sig[0][0], stats) if len(sig) == 1 else
+                       self._load_shards(sig, stats) if sig else {})
+            stats['seconds'] = time.perf_counter() - t0
+            views = build_views(metrics)
+            _, html = self.render_cache.render(views)
+            snapshot = {'/': _entry(html, 'text/html; charset=utf-8')}
+            snapshot['default'] = next(iter(views))
+            for label, (m, insights, suggestions) in views.items():
+                payload = view_payload(m, insights, suggestions)
+                for kind in JSON_KINDS:
+                    snapshot[kind, label] = _json_entry(payload[kind])
+                snapshot['range', label] = range_index(m)
+            self.generation += 1
+            self.refreshed = datetime.now().isoformat(timespec='seconds')
+            snapshot['/api/views'] = _json_entry({'views': list(views), 'generation': self.generation,
+                                                  'refreshed': self.refreshed, 'inputs': [p for p, _, _ in sig],
+                                                  'render_cache': self.render_cache.stats()})
+            self.snapshot, self.signature = snapshot, sig
+            report_throughput(stats)
+            print(f"[{self.refreshed}] 第 {self.generation} 版看板就绪（{len(views)} 个视图）", flush=True)
+            return True
+
+    def watch(self, interval, stop):
+        """轮询输入文件的大小 / mtime，变化时刷新；出错时保留上一版快照继续服务"""
+        while not stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"刷新失败，继续使用第 {self.generation} 版: {e!r}", file=sys.stderr, flush=True)
+
+    def lookup(self, url):
+        """URL → _entry；/api/{rows,insights,suggestions}?type=标签（缺省为首个视图）；
+        /api/range?type=&start=YYYY-MM-DD&end=YYYY-MM-DD 由前缀和索引即时回答区间漏斗 / 关闭行为 / 分阶段小计
+        （事件日志输入时另附草图并集得到的跨日去重人数）"""
+        parts = urlsplit(url)
+        snapshot = self.snapshot
+        if parts.path in ('/', '/index.html'):
+            return snapshot.get('/')
+        if parts.path == '/api/views':
+            return snapshot.get('/api/views')
+        kind = parts.path[len('/api/'):] if parts.path.startswith('/api/') else None
+        if kind not in JSON_KINDS + ('range',):
+            return None
+        query = parse_qs(parts.query)
+        label = query.get('type', [snapshot.get('default')])[0]
+        if kind == 'range':
+            idx = snapshot.get(('range', label))
+            return idx and _json_entry(idx.query(query.get('start', [None])[0], query.get('end', [None])[0]))
+        return snapshot.get((kind, label))
+
+def make_handler(store):
+    class Handler(BaseHTTPRequestHandler):
+        server_version = 'PromotionDashboard/1'
+
+        def _respond(self, send_body):
+            entry = store.lookup(self.path)
+            if entry is None:
+                self.send_error(404)
+                return
+            body, content_type, etag = entry
+            inm = self.headers.get('If-None-Match')
+            if inm and etag in (t.strip() for t in inm.split(',')):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            self._respond(True)
+
+        def do_HEAD(self):
+            self._respond(False)
+
+    return Handler
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='推广数据看板服务')
+    parser.add_argument('inputs', nargs='*', default=[CSV_PATH], help='CSV 文件、目录或 glob；目录中新增的分片会被自动纳入')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    parser.add_argument('--interval', type=float, default=2.0, help='检查输入文件变化的间隔（秒）')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='分片并行进程数（默认 CPU 核数）')
+    args = parser.parse_args()
+
+    store = DashboardStore(args.inputs, args.jobs)
+    store.refresh(force=True)
+    stop = threading.Event()
+    threading.Thread(target=store.watch, args=(args.interval, stop), daemon=True).start()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(store))
+    print(f"看板服务: http://{args.host}:{server.server_port}/  （JSON: /api/views, /api/rows?type=…, /api/range?start=…&end=…）",
+          flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()